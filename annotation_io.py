@@ -0,0 +1,296 @@
+"""
+Bulk import and export of labeled annotations.
+
+Imports read CSV, JSONL or Parquet files in chunks and write each chunk with
+executemany UPSERTs in its own transaction, so the write lock is released
+between chunks and annotation saves and job heartbeats are not held up for
+the whole file. Imports are therefore not atomic: if one fails part way, the
+chunks before it stay imported. Re-running the import is safe, since rows are
+upserted by sentence. The annotation_counts triggers keep the label counters
+exact either way. Rows need a text (text/sentence/utterance) and an intent
+(intent/label) field; entities are optional and may be a JSON object, the
+annotation page's "name:value, name:value" form or a list of spans
+({"entity", "value", "start", "end"}). Spans are kept as given; for the other
+forms the offsets are found by locating each value in the text.
+
+Exports stream the annotations out in batches through a cursor, as JSONL or as
+a columnar Parquet file (one row group per batch), without loading the whole
+set into memory:
+
+    python annotation_io.py import labeled.jsonl --workspace travel --user me@example.com
+    python annotation_io.py export travel.parquet --workspace travel --user me@example.com
+"""
+import argparse
+import json
+import os
+import sys
+from contextlib import contextmanager
+from io import TextIOWrapper
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import db
+import migrations
+import perf
+from annotation_store import UPSERT_ANNOTATION_SQL
+from entities import locate_spans, spans_to_entities
+from inference import TEXT_COLUMN_NAMES
+
+IMPORT_CHUNK_ROWS = 20_000
+EXPORT_BATCH_ROWS = 10_000
+INTENT_FIELD_NAMES = ["intent", "label"]
+ENTITY_FIELD_NAMES = ["entities", "entities_json"]
+SPAN_FIELD_NAMES = ["entity_spans", "entity_spans_json"]
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet"}
+
+EXPORT_COLUMNS = ("text", "intent", "entities", "entity_spans", "last_modified")
+PARQUET_SCHEMA = pa.schema([
+    ("text", pa.string()),
+    ("intent", pa.string()),
+    ("entities_json", pa.string()),
+    ("entity_spans_json", pa.string()),
+    ("last_modified", pa.string()),
+])
+
+def detect_format(filename):
+    """Returns "csv", "jsonl" or "parquet" from a file name, raising ValueError for anything else."""
+    file_format = FORMATS.get(os.path.splitext(str(filename))[1].lower())
+    if file_format is None:
+        raise ValueError(f"Unsupported file type: {filename} (use {', '.join(sorted(FORMATS))}).")
+    return file_format
+
+def parse_entities(value):
+    """Returns entities as a dict from a dict, a JSON object string or "name:value, name:value"; raises ValueError."""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return {}
+    if isinstance(value, dict):
+        return {str(k).strip(): str(v).strip() for k, v in value.items()}
+    text = str(value).strip()
+    if not text:
+        return {}
+    if text.startswith("{"):
+        try:
+            return parse_entities(json.loads(text))
+        except json.JSONDecodeError:
+            raise ValueError(f"Invalid entities JSON: {text[:50]}")
+    entities = {}
+    for part in text.split(","):
+        if ":" not in part:
+            raise ValueError(f"Entity format error: {part.strip()[:50]}")
+        name, entity_value = part.split(":", 1)
+        entities[name.strip()] = entity_value.strip()
+    return entities
+
+def parse_spans(value):
+    """Returns a list of span dicts from a list or a JSON array string (None when absent); raises ValueError."""
+    if value is None or (isinstance(value, float) and pd.isna(value)) or value == "":
+        return None
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            raise ValueError(f"Invalid entity spans JSON: {value[:50]}")
+    if not isinstance(value, list):
+        raise ValueError("Entity spans must be a list.")
+    spans = []
+    for span in value:
+        if not isinstance(span, dict) or "entity" not in span or "value" not in span:
+            raise ValueError("Each entity span needs an entity and a value.")
+        start, end = span.get("start"), span.get("end")
+        spans.append({
+            "entity": str(span["entity"]).strip(),
+            "value": str(span["value"]).strip(),
+            "start": int(start) if start is not None else None,
+            "end": int(end) if end is not None else None,
+        })
+    return spans
+
+def _entities_and_spans(record, text):
+    """Returns (entities dict, spans list) for a record; raises ValueError for malformed entities."""
+    entities_value = _field(record, ENTITY_FIELD_NAMES)
+    spans = parse_spans(_field(record, SPAN_FIELD_NAMES))
+    if spans is None and isinstance(entities_value, list):
+        spans = parse_spans(entities_value)
+        entities_value = None
+    if spans is not None and entities_value is None:
+        return spans_to_entities(spans), spans
+    entities = parse_entities(entities_value)
+    return entities, spans if spans is not None else locate_spans(text, entities)
+
+def _field(record, names):
+    for key in record:
+        if str(key).lower() in names:
+            return record[key]
+    return None
+
+# ==============================
+# IMPORT
+# ==============================
+
+def _read_records(source, file_format, chunksize):
+    """Yields lists of dict records, chunksize at a time."""
+    if file_format == "csv":
+        for chunk in pd.read_csv(source, chunksize=chunksize, dtype=str, keep_default_na=False):
+            yield chunk.to_dict("records")
+    elif file_format == "parquet":
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunksize):
+            yield batch.to_pylist()
+    else:
+        with _open_text(source) as lines:
+            records = []
+            for line in lines:
+                if line.strip():
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        records.append(None)  # counted as skipped
+                if len(records) >= chunksize:
+                    yield records
+                    records = []
+            if records:
+                yield records
+
+@contextmanager
+def _open_text(source):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, encoding="utf-8") as f:
+            yield f
+    else:
+        # Uploaded files are binary streams; detach so closing the wrapper leaves them open
+        wrapper = TextIOWrapper(source, encoding="utf-8")
+        try:
+            yield wrapper
+        finally:
+            wrapper.detach()
+
+@perf.timed("annotation_import")
+def import_annotations(source, filename, workspace_name, user_email, chunksize=IMPORT_CHUNK_ROWS):
+    """
+    Imports labeled rows from a CSV/JSONL/Parquet path or file-like object into the workspace.
+    Rows without text or intent, malformed JSON lines and rows with malformed entities are skipped.
+    Each chunk is committed on its own, so a failed import keeps the chunks written before the error.
+    Returns {"imported": rows written, "skipped": rows skipped}.
+    """
+    file_format = detect_format(filename)
+    imported = skipped = 0
+    for records in _read_records(source, file_format, chunksize):
+        rows = []
+        for record in records:
+            if not isinstance(record, dict):
+                skipped += 1
+                continue
+            text = str(_field(record, TEXT_COLUMN_NAMES) or "").strip()
+            intent = str(_field(record, INTENT_FIELD_NAMES) or "").strip()
+            try:
+                entities, spans = _entities_and_spans(record, text)
+            except (ValueError, TypeError):
+                entities = None
+            if not text or not intent or entities is None:
+                skipped += 1
+                continue
+            rows.append((workspace_name, user_email, text, intent, json.dumps(entities), json.dumps(spans)))
+        # One transaction per chunk, so other writers get the lock in between
+        with db.transaction() as conn:
+            conn.executemany(UPSERT_ANNOTATION_SQL, rows)
+            conn.execute(
+                "UPDATE workspaces SET last_modified=CURRENT_TIMESTAMP WHERE user_email=? AND workspace_name=?",
+                (user_email, workspace_name)
+            )
+        imported += len(rows)
+    return {"imported": imported, "skipped": skipped}
+
+# ==============================
+# EXPORT
+# ==============================
+
+def iter_annotation_batches(workspace_name, user_email, batch_size=EXPORT_BATCH_ROWS):
+    """Yields lists of (sentence, intent, entities_json, entity_spans_json, last_modified) rows without loading the whole set."""
+    cursor = db.get_connection().execute(
+        """SELECT sentence, intent, entities_json, entity_spans_json, last_modified FROM annotations
+           WHERE workspace_name=? AND user_email=? AND sentence IS NOT NULL ORDER BY rowid""",
+        (workspace_name, user_email)
+    )
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows
+    finally:
+        cursor.close()
+
+@contextmanager
+def _open_output(target):
+    if isinstance(target, (str, os.PathLike)):
+        with open(target, "wb") as f:
+            yield f
+    else:
+        yield target
+
+def _json_value(value, expected_type):
+    try:
+        parsed = json.loads(value) if value else expected_type()
+    except ValueError:
+        return expected_type()
+    return parsed if isinstance(parsed, expected_type) else expected_type()
+
+@perf.timed("annotation_export", format="jsonl")
+def export_jsonl(target, workspace_name, user_email, batch_size=EXPORT_BATCH_ROWS):
+    """Writes one JSON object per annotation to a path or binary file-like object. Returns the row count."""
+    count = 0
+    with _open_output(target) as out:
+        for rows in iter_annotation_batches(workspace_name, user_email, batch_size):
+            lines = []
+            for sentence, intent, entities_json, entity_spans_json, last_modified in rows:
+                record = dict(zip(EXPORT_COLUMNS, (
+                    sentence, intent, _json_value(entities_json, dict), _json_value(entity_spans_json, list), last_modified
+                )))
+                lines.append(json.dumps(record, ensure_ascii=False))
+            out.write(("\n".join(lines) + "\n").encode("utf-8"))
+            count += len(rows)
+    return count
+
+@perf.timed("annotation_export", format="parquet")
+def export_parquet(target, workspace_name, user_email, batch_size=EXPORT_BATCH_ROWS):
+    """Writes annotations as a Parquet file (one row group per batch). Returns the row count."""
+    count = 0
+    with _open_output(target) as out, pq.ParquetWriter(out, PARQUET_SCHEMA, compression="zstd") as writer:
+        for rows in iter_annotation_batches(workspace_name, user_email, batch_size):
+            columns = [list(column) for column in zip(*rows)]
+            columns[4] = [str(value) if value is not None else None for value in columns[4]]
+            writer.write_table(pa.Table.from_arrays(columns, schema=PARQUET_SCHEMA))
+            count += len(rows)
+    return count
+
+EXPORTERS = {"jsonl": export_jsonl, "parquet": export_parquet}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import or export BuddyBot annotations.")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("path", help="CSV/JSONL/Parquet file to import, or .jsonl/.parquet file to export to")
+    parser.add_argument("--workspace", required=True, help="Workspace name")
+    parser.add_argument("--user", required=True, help="Annotator email the annotations belong to")
+    parser.add_argument("--db", default="users.db", help="Path to the BuddyBot database")
+    args = parser.parse_args(argv)
+
+    db.configure(args.db)
+    migrations.ensure_schema()
+    try:
+        file_format = detect_format(args.path)
+        if args.command == "import":
+            stats = import_annotations(args.path, args.path, args.workspace, args.user)
+            print(f"Imported {stats['imported']} annotations ({stats['skipped']} rows skipped).")
+        else:
+            if file_format not in EXPORTERS:
+                raise ValueError("Export to a .jsonl or .parquet file.")
+            count = EXPORTERS[file_format](args.path, args.workspace, args.user)
+            print(f"Exported {count} annotations to {args.path}.")
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Per-session state for the annotation loop: a prefetch window and a write-behind buffer.
+
+AnnotationWindow loads a block of PREFETCH_WINDOW sentences, their existing
+labels and the model's suggestions (see prelabeling.py) with one query each,
+so moving through the block renders from session state instead of querying
+per sentence. Blocks are consecutive positions in dataset order, or the next
+PREFETCH_WINDOW entries of the least-confident-first queue.
+
+WriteBehindBuffer collects "Save & Next" labels and commits them together with
+one executemany UPSERT once FLUSH_EVERY_ITEMS are pending or the oldest is
+FLUSH_EVERY_SECONDS old (checked on each rerun). The annotation page also
+flushes when the annotator navigates away. If a session ends with labels still
+pending, they are written when the buffer is garbage-collected or the process
+exits.
+"""
+import threading
+import time
+import weakref
+
+import annotation_store
+import ingestion
+import prelabeling
+
+PREFETCH_WINDOW = 50
+FLUSH_EVERY_ITEMS = 20
+FLUSH_EVERY_SECONDS = 10.0
+
+class AnnotationWindow:
+    """A block of sentences of one dataset with their current labels and model suggestions."""
+
+    def __init__(self, dataset_id, workspace_name, user_email, positions, model_version=None):
+        self.dataset_id = dataset_id
+        self.workspace_name = workspace_name
+        self.user_email = user_email
+        self.model_version = model_version
+        if isinstance(positions, range):
+            self.sentences = dict(ingestion.get_sentence_window(dataset_id, positions.start, len(positions)))
+        else:
+            self.sentences = ingestion.get_sentences(dataset_id, positions)
+        self.positions = set(positions)
+        self.labels = annotation_store.get_annotations(user_email, workspace_name, self.sentences.values())
+        self.suggestions = (
+            prelabeling.get_prelabels(dataset_id, model_version, positions) if model_version is not None else {}
+        )
+
+    @classmethod
+    def around(cls, dataset_id, workspace_name, user_email, position, size=PREFETCH_WINDOW, model_version=None):
+        """Loads the aligned block of dataset order containing position, so stepping backwards reuses it too."""
+        start = position - position % size
+        return cls(dataset_id, workspace_name, user_email, range(start, start + size), model_version)
+
+    @classmethod
+    def from_queue(cls, dataset_id, workspace_name, user_email, queue, index, size=PREFETCH_WINDOW, model_version=None):
+        """Loads the aligned block of queue entries containing queue[index]."""
+        start = index - index % size
+        return cls(dataset_id, workspace_name, user_email, queue[start:start + size], model_version)
+
+    def covers(self, dataset_id, workspace_name, user_email, position, model_version=None):
+        return (
+            (self.dataset_id, self.workspace_name, self.user_email, self.model_version)
+            == (dataset_id, workspace_name, user_email, model_version)
+            and position in self.positions
+        )
+
+    def sentence(self, position):
+        return self.sentences.get(position)
+
+    def label(self, sentence):
+        """Returns (intent, entities_json) for a sentence, or (None, None)."""
+        return self.labels.get(sentence, (None, None))
+
+    def suggestion(self, position):
+        """Returns the model's (intent, confidence, entities_json) for a position, or None."""
+        return self.suggestions.get(position)
+
+    def set_label(self, sentence, intent, entities_json):
+        self.labels[sentence] = (intent, entities_json)
+
+def _write_rows(pending, lock):
+    with lock:
+        rows = list(pending.values())
+        if rows:
+            annotation_store.upsert_annotations(rows)
+        pending.clear()
+
+class WriteBehindBuffer:
+    """Pending annotation UPSERTs, committed in batches."""
+
+    def __init__(self, max_items=FLUSH_EVERY_ITEMS, max_age_seconds=FLUSH_EVERY_SECONDS):
+        self.max_items = max_items
+        self.max_age_seconds = max_age_seconds
+        self._pending = {}  # (workspace_name, user_email, sentence) -> row; a re-save replaces the earlier one
+        self._lock = threading.Lock()
+        self._oldest = None
+        # Writes whatever is still pending when the session's buffer is collected or the process exits
+        weakref.finalize(self, _write_rows, self._pending, self._lock)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, workspace_name, user_email, sentence, intent, entities_json, entity_spans_json=None):
+        with self._lock:
+            self._pending[(workspace_name, user_email, sentence)] = (
+                workspace_name, user_email, sentence, intent, entities_json, entity_spans_json
+            )
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+
+    def pending_count(self, workspace_name, user_email):
+        return sum(1 for key in list(self._pending) if key[:2] == (workspace_name, user_email))
+
+    def is_due(self):
+        if not self._pending:
+            return False
+        return len(self._pending) >= self.max_items or time.monotonic() - self._oldest >= self.max_age_seconds
+
+    def flush(self):
+        """Commits every pending row in one transaction. On failure the rows stay pending and the error propagates."""
+        _write_rows(self._pending, self._lock)
+        self._oldest = None
+
+    def flush_if_due(self):
+        if self.is_due():
+            self.flush()
+            return True
+        return False
@@ -0,0 +1,91 @@
+"""
+Annotation reads and writes.
+
+Label counts come from the annotation_counts summary table, which triggers on
+annotations keep exact inside every write transaction (see migrations.py), so
+pages never need COUNT(*) scans or to load the full annotation set just to
+show how many examples exist.
+"""
+import pandas as pd
+
+import db
+import perf
+from entities import spans_json_for
+
+UPSERT_ANNOTATION_SQL = """
+    INSERT INTO annotations (workspace_name, user_email, sentence, intent, entities_json, entity_spans_json, last_modified)
+    VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(workspace_name, user_email, sentence) DO UPDATE SET
+    intent = excluded.intent,
+    entities_json = excluded.entities_json,
+    entity_spans_json = excluded.entity_spans_json,
+    last_modified = CURRENT_TIMESTAMP
+"""
+# Stays well under SQLite's bound-parameter limit (999 on older builds) with the two fixed parameters
+MAX_IN_PARAMS = 500
+
+def get_annotation(user_email, workspace_name, sentence):
+    """Returns (intent, entities_json) for a sentence, or (None, None)."""
+    result = db.fetch_one(
+        "SELECT intent, entities_json FROM annotations WHERE user_email=? AND workspace_name=? AND sentence=?",
+        (user_email, workspace_name, sentence)
+    )
+    return result if result else (None, None)
+
+def get_annotations(user_email, workspace_name, sentences):
+    """Returns {sentence: (intent, entities_json)} for the sentences that are annotated, in one IN (...) query per 500."""
+    sentences = list(dict.fromkeys(sentences))
+    found = {}
+    for start in range(0, len(sentences), MAX_IN_PARAMS):
+        chunk = sentences[start:start + MAX_IN_PARAMS]
+        rows = db.fetch_all(
+            f"""SELECT sentence, intent, entities_json FROM annotations
+                WHERE user_email=? AND workspace_name=? AND sentence IN ({", ".join("?" * len(chunk))})""",
+            (user_email, workspace_name, *chunk)
+        )
+        found.update((sentence, (intent, entities_json)) for sentence, intent, entities_json in rows)
+    return found
+
+def _with_spans(row):
+    # Rows without explicit spans get them by locating each entity value in the sentence
+    if len(row) == 6 and row[5] is not None:
+        return row
+    workspace_name, user_email, sentence, intent, entities_json = row[:5]
+    return (workspace_name, user_email, sentence, intent, entities_json, spans_json_for(sentence, entities_json))
+
+def upsert_annotation(workspace_name, user_email, sentence, intent, entities_json, entity_spans_json=None):
+    """Saves or updates one annotation; its label counter is updated in the same transaction."""
+    db.execute(UPSERT_ANNOTATION_SQL, _with_spans((workspace_name, user_email, sentence, intent, entities_json, entity_spans_json)))
+
+def upsert_annotations(rows):
+    """
+    Saves or updates many (workspace_name, user_email, sentence, intent, entities_json[, entity_spans_json])
+    rows in one transaction.
+    """
+    db.execute_many(UPSERT_ANNOTATION_SQL, [_with_spans(row) for row in rows])
+
+def get_label_counts(workspace_name, user_email=None):
+    """Returns {intent: count} for a workspace (optionally one annotator), from the summary table."""
+    if user_email is None:
+        rows = db.fetch_all(
+            "SELECT intent, SUM(label_count) FROM annotation_counts WHERE workspace_name=? GROUP BY intent",
+            (workspace_name,)
+        )
+    else:
+        rows = db.fetch_all(
+            "SELECT intent, label_count FROM annotation_counts WHERE workspace_name=? AND user_email=?",
+            (workspace_name, user_email)
+        )
+    return {intent: count for intent, count in rows if count}
+
+def count_annotations(workspace_name, user_email=None):
+    """Total labeled examples for a workspace (optionally one annotator)."""
+    return sum(get_label_counts(workspace_name, user_email).values())
+
+def load_annotations(workspace_name, user_email):
+    """Loads the full annotation set as a DataFrame. Only call this when it is really needed (training)."""
+    with perf.span("db_query", op="read_sql"):
+        return pd.read_sql(
+            "SELECT * FROM annotations WHERE user_email=? AND workspace_name=?",
+            db.get_connection(), params=(user_email, workspace_name)
+        )
@@ -0,0 +1,214 @@
+"""
+Password hashing and login throttling.
+
+bcrypt is deliberately slow, so hashing and checking run on a small shared
+thread pool (bcrypt releases the GIL) instead of inline in the Streamlit
+script thread: at most MAX_HASH_WORKERS hashes use the CPU at once, and when
+MAX_PENDING_HASHES are already waiting new attempts are turned away with
+AuthBusy rather than queueing behind a login spike. Only the session that is
+signing in waits for its result.
+
+The cost factor comes from BUDDYBOT_BCRYPT_ROUNDS (bcrypt's default of 12
+otherwise). Stored hashes with a lower cost are upgraded in the background
+on the next successful login.
+
+Attempts are throttled per email and per client IP by in-memory token
+buckets, checked before any hashing, so a credential-stuffing burst costs a
+dictionary lookup per rejected attempt. The buckets are per process. Attempts
+with no known client IP (Streamlit reports none for localhost, and behind a
+reverse proxy every client looks like the proxy) only use the email bucket, so
+one client cannot lock everyone out; list the proxy addresses in
+BUDDYBOT_TRUSTED_PROXIES to throttle by the X-Forwarded-For client instead.
+"""
+import atexit
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+import db
+import perf
+
+BCRYPT_ROUNDS = int(os.environ.get("BUDDYBOT_BCRYPT_ROUNDS", 12))
+MAX_HASH_WORKERS = max(1, min(4, os.cpu_count() or 1))
+MAX_PENDING_HASHES = 4 * MAX_HASH_WORKERS
+HASH_TIMEOUT_SECONDS = 30
+
+# (burst capacity, tokens refilled per second)
+EMAIL_BUCKET = (5, 1 / 60)   # 5 attempts, then one a minute
+IP_BUCKET = (30, 1 / 6)      # 30 attempts, then ten a minute
+MAX_TRACKED_KEYS = 100_000
+
+# Comma-separated reverse proxy addresses whose X-Forwarded-For header is trusted
+TRUSTED_PROXIES = {ip.strip() for ip in os.environ.get("BUDDYBOT_TRUSTED_PROXIES", "").split(",") if ip.strip()}
+LOOPBACK_ADDRESSES = {"127.0.0.1", "::1"}
+
+class AuthBusy(Exception):
+    """Raised when too many password hashes are already pending."""
+
+class AuthThrottled(Exception):
+    """Raised when an email or IP has run out of attempts; retry_after is in seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many attempts. Try again in {retry_after:.0f} seconds.")
+        self.retry_after = retry_after
+
+# ==============================
+# TOKEN BUCKETS
+# ==============================
+
+class TokenBucketThrottle:
+    """One token bucket per key, refilled continuously; full buckets are forgotten when the table grows too large."""
+
+    def __init__(self, capacity, refill_per_second, max_keys=MAX_TRACKED_KEYS):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.max_keys = max_keys
+        self._buckets = {}  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def _tokens(self, key, now):
+        tokens, updated_at = self._buckets.get(key, (self.capacity, now))
+        return min(self.capacity, tokens + (now - updated_at) * self.refill_per_second)
+
+    def retry_after(self, key, now=None):
+        """Seconds until key has a token (0 if it has one now)."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens = self._tokens(key, now)
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.refill_per_second
+
+    def consume(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._buckets[key] = (self._tokens(key, now) - 1, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+
+    def _prune(self, now):
+        for key in [key for key in self._buckets if self._tokens(key, now) >= self.capacity]:
+            del self._buckets[key]
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+EMAIL_THROTTLE = TokenBucketThrottle(*EMAIL_BUCKET)
+IP_THROTTLE = TokenBucketThrottle(*IP_BUCKET)
+_throttle_lock = threading.Lock()
+
+def client_ip(ip_address, forwarded_for=None, trusted_proxies=None):
+    """
+    The address to throttle by: the connecting address, or the nearest X-Forwarded-For hop that is not a
+    trusted proxy when it connected through one. None when that is unknown or a loopback address.
+    """
+    trusted = TRUSTED_PROXIES if trusted_proxies is None else trusted_proxies
+    peer = ip_address or "127.0.0.1"  # Streamlit reports no address for localhost connections
+    hops = [hop.strip() for hop in (forwarded_for or "").split(",") if hop.strip()]
+    while peer in trusted and hops:
+        peer = hops.pop()
+    return None if peer in trusted or peer in LOOPBACK_ADDRESSES else peer
+
+def check_attempt(email, ip_address):
+    """
+    Takes one attempt from the email's and the IP's buckets, or raises AuthThrottled (taking from neither).
+    With no ip_address only the email's bucket is used.
+    """
+    email_key = (email or "").strip().lower()
+    now = time.monotonic()
+    with _throttle_lock:
+        retry_after = EMAIL_THROTTLE.retry_after(email_key, now)
+        if ip_address:
+            retry_after = max(retry_after, IP_THROTTLE.retry_after(ip_address, now))
+        if retry_after > 0:
+            raise AuthThrottled(retry_after)
+        EMAIL_THROTTLE.consume(email_key, now)
+        if ip_address:
+            IP_THROTTLE.consume(ip_address, now)
+
+def clear_attempts(email):
+    """Refills an email's bucket after a successful login."""
+    EMAIL_THROTTLE.reset((email or "").strip().lower())
+
+# ==============================
+# HASHING POOL
+# ==============================
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(MAX_PENDING_HASHES)
+
+def get_hash_pool():
+    """Returns the shared hashing pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=MAX_HASH_WORKERS, thread_name_prefix="bcrypt")
+        return _pool
+
+@atexit.register
+def shutdown_hash_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def _submit(fn, *args):
+    if not _pending.acquire(blocking=False):
+        raise AuthBusy("The server is busy signing other users in. Please try again in a moment.")
+    try:
+        future = get_hash_pool().submit(fn, *args)
+    except BaseException:
+        _pending.release()
+        raise
+    future.add_done_callback(lambda _: _pending.release())
+    return future
+
+def _run(fn, *args):
+    return _submit(fn, *args).result(timeout=HASH_TIMEOUT_SECONDS)
+
+def hash_password(password, rounds=None):
+    """Returns the bcrypt hash of password, computed on the hashing pool."""
+    salt = bcrypt.gensalt(rounds or BCRYPT_ROUNDS)
+    with perf.span("auth", op="hashpw"):
+        return _run(bcrypt.hashpw, password.encode("utf-8"), salt)
+
+def check_password(password, hashed):
+    """Checks password against a stored bcrypt hash on the hashing pool."""
+    with perf.span("auth", op="checkpw"):
+        return _run(bcrypt.checkpw, password.encode("utf-8"), hashed)
+
+def hash_rounds(hashed):
+    """The cost factor of a bcrypt hash ($2b$12$... -> 12)."""
+    return int(hashed.split(b"$")[2])
+
+def _store_upgraded_hash(email, password):
+    db.execute(
+        "UPDATE users SET password=? WHERE email=?",
+        (bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(BCRYPT_ROUNDS)), email)
+    )
+
+def upgrade_hash_if_weak(email, password, hashed):
+    """Re-hashes a password stored with a lower cost than BCRYPT_ROUNDS, in the background."""
+    if hash_rounds(hashed) >= BCRYPT_ROUNDS:
+        return
+    try:
+        _submit(_store_upgraded_hash, email, password)
+    except AuthBusy:
+        pass  # upgraded on a later login
+
+def authenticate(email, password, ip_address):
+    """
+    Returns the user's stored email if the password matches, else None.
+    Raises AuthThrottled when the email or IP is out of attempts and AuthBusy when the hashing pool is saturated.
+    """
+    check_attempt(email, ip_address)
+    user_data = db.fetch_one("SELECT password, email FROM users WHERE email=?", (email,))
+    if not user_data or not check_password(password, user_data[0]):
+        return None
+    clear_attempts(email)
+    upgrade_hash_if_weak(user_data[1], password, user_data[0])
+    return user_data[1]
@@ -0,0 +1,295 @@
+"""
+Reproducible latency/throughput benchmarks for BuddyBot's hot paths.
+
+A seeded synthetic corpus is generated from the DOMAINS intents and their
+trigger phrases, then each benchmark runs against a throwaway database at
+several corpus sizes:
+
+    predict_single    inference.predict_intent_and_entities, one utterance per call
+    predict_repeat    the same calls again, answered from the prediction cache
+    predict_batch     inference.predict_batch, BATCH_ROWS utterances per call
+    predict_batch_repeat  each predict_batch call again right after it, answered from the prediction cache
+    segmentation      SentenceSegmenter.split over multi-sentence rows, BATCH_ROWS rows per timing
+    ingestion         ingestion.ingest_csv of the whole corpus as a CSV upload
+    sentence_read     ingestion.get_sentence at random positions (the annotation page's read)
+    annotation_write  annotation_store.upsert_annotation, one committed write per call
+
+Two more measure whole Streamlit reruns of the login page (via AppTest), once per run:
+
+    rerun             the app as it is: schema setup and static styling happen once per process
+    rerun_with_ddl    the same rerun preceded by the five base-table CREATE TABLE statements the
+                      script used to execute on every rerun, for comparison
+
+predict_single and predict_batch start every call with an empty prediction cache,
+so they measure scoring rather than cache hits, however often the benchmark is
+rerun; cached throughput is only reported under the *_repeat names.
+
+Each result reports p50/p95/p99/mean latency per operation and rows/sec (rerun results
+also report SQLite write-lock acquisitions per rerun). Results go to a JSON file; pass
+--compare with an earlier file to flag regressions:
+
+    python benchmark.py --sizes 1000 10000 --output bench.json
+    python benchmark.py --output new.json --compare bench.json --tolerance 0.2
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import annotation_store
+import db
+import inference
+import ingestion
+import migrations
+import perf
+from domains import DOMAIN_TRIGGER_PHRASES, DOMAINS, GLOBAL_TRIGGER_PHRASES
+from model_store import save_model_artifact
+from nlu_engine import HashedIntentClassifier
+from prediction_cache import PREDICTION_CACHE
+from segmenter import SentenceSegmenter
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+DEFAULT_SEED = 7
+BATCH_ROWS = 1_000
+MAX_SINGLE_OPS = 2_000      # per-call benchmarks are capped so large sizes still finish quickly
+MAX_WRITE_OPS = 2_000
+INGESTION_REPEATS = 3
+RERUN_OPS = 50
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chatbot_login_app.py")
+BENCH_USER = "bench@example.com"
+
+# ==============================
+# SYNTHETIC CORPUS
+# ==============================
+
+_FILLERS = ["please", "can you", "i need to", "could you help me", "quickly", "today", "for my team", "right now"]
+_EXTRA_SENTENCES = ["Thanks.", "It is urgent!", "Is that possible?", "Dr. Smith asked about it.", "See you at 3.30 p.m. today."]
+
+def intent_phrases(domain):
+    """{intent: [phrases]} for a domain: the intent name itself plus its trigger phrases."""
+    phrases = {}
+    for intent in DOMAINS[domain]["intents"]:
+        phrases[intent] = [intent.replace("_", " ")]
+        phrases[intent] += GLOBAL_TRIGGER_PHRASES.get(intent, [])
+        phrases[intent] += DOMAIN_TRIGGER_PHRASES.get(domain, {}).get(intent, [])
+    return phrases
+
+def generate_corpus(size, domain, seed=DEFAULT_SEED, multi_sentence_rate=0.3):
+    """Returns [(utterance, intent)] with intents drawn uniformly from the domain's DOMAINS entry."""
+    rng = random.Random(seed)
+    phrases = intent_phrases(domain)
+    intents = sorted(phrases)
+    corpus = []
+    for i in range(size):
+        intent = rng.choice(intents)
+        words = [rng.choice(_FILLERS), rng.choice(phrases[intent]), rng.choice(_FILLERS)]
+        rng.shuffle(words)
+        # A unique suffix keeps every utterance distinct, like real annotation data
+        text = " ".join(words).capitalize() + f" ref {i}."
+        if rng.random() < multi_sentence_rate:
+            text += " " + rng.choice(_EXTRA_SENTENCES)
+        corpus.append((text, intent))
+    return corpus
+
+# ==============================
+# MEASUREMENT
+# ==============================
+
+def summarize(name, size, latencies, rows_per_op):
+    """Builds one result record from per-operation latencies (seconds)."""
+    samples = np.asarray(latencies, dtype=np.float64)
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1000
+    return {
+        "name": name,
+        "size": size,
+        "ops": len(samples),
+        "rows": int(rows_per_op * len(samples)),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "mean_ms": round(float(samples.mean() * 1000), 4),
+        "rows_per_sec": round(rows_per_op * len(samples) / samples.sum(), 1) if samples.sum() else None,
+    }
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+def timed_uncached(fn, *args):
+    PREDICTION_CACHE.clear()
+    return timed(fn, *args)
+
+def timed_cached(fn, *args):
+    # Warmed right before timing: the whole corpus can be larger than the prediction cache
+    fn(*args)
+    return timed(fn, *args)
+
+def run_size(size, domain, seed, workdir):
+    """Runs every benchmark for one corpus size against a fresh database in workdir."""
+    db.configure(os.path.join(workdir, f"bench_{size}.db"))
+    migrations.ensure_schema()
+    conn = db.get_connection()
+    workspace_name = f"bench_{size}"
+    db.execute("INSERT INTO workspaces (user_email, workspace_name, domain) VALUES (?, ?, ?)", (BENCH_USER, workspace_name, domain))
+
+    corpus = generate_corpus(size, domain, seed)
+    texts = [text for text, _ in corpus]
+    save_model_artifact(workspace_name, HashedIntentClassifier().fit(texts, [intent for _, intent in corpus]))
+    rng = random.Random(seed)
+    results = []
+
+    single = rng.sample(texts, min(size, MAX_SINGLE_OPS))
+    inference.predict_intent_and_entities(conn, single[0], domain, workspace_name)  # warm the model/matcher caches
+    results.append(summarize("predict_single", size, [
+        timed_uncached(inference.predict_intent_and_entities, conn, text, domain, workspace_name) for text in single
+    ], 1))
+    for text in single:
+        inference.predict_intent_and_entities(conn, text, domain, workspace_name)
+    results.append(summarize("predict_repeat", size, [
+        timed(inference.predict_intent_and_entities, conn, text, domain, workspace_name) for text in single
+    ], 1))
+
+    batches = [texts[i:i + BATCH_ROWS] for i in range(0, size, BATCH_ROWS)]
+    rows_per_batch = size / len(batches)  # the last batch may be short
+    results.append(summarize("predict_batch", size, [
+        timed_uncached(inference.predict_batch, conn, workspace_name, domain, batch) for batch in batches
+    ], rows_per_batch))
+    results.append(summarize("predict_batch_repeat", size, [
+        timed_cached(inference.predict_batch, conn, workspace_name, domain, batch) for batch in batches
+    ], rows_per_batch))
+    PREDICTION_CACHE.clear()
+
+    segmenter = SentenceSegmenter()
+    results.append(summarize("segmentation", size, [
+        timed(lambda rows: [segmenter.split(row) for row in rows], batch) for batch in batches
+    ], rows_per_batch))
+
+    csv_path = os.path.join(workdir, f"bench_{size}.csv")
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["text", "intent"])
+        writer.writerows(corpus)
+    results.append(summarize("ingestion", size, [
+        timed(ingestion.ingest_csv, csv_path, "bench.csv", workspace_name, BENCH_USER) for _ in range(INGESTION_REPEATS)
+    ], size))
+
+    dataset = ingestion.find_dataset(workspace_name, BENCH_USER)
+    positions = [rng.randrange(dataset["sentence_count"]) for _ in range(min(size, MAX_SINGLE_OPS))]
+    results.append(summarize("sentence_read", size, [
+        timed(ingestion.get_sentence, dataset["id"], position) for position in positions
+    ], 1))
+
+    writes = rng.sample(corpus, min(size, MAX_WRITE_OPS))
+    results.append(summarize("annotation_write", size, [
+        timed(annotation_store.upsert_annotation, workspace_name, BENCH_USER, text, intent, "{}") for text, intent in writes
+    ], 1))
+    return results
+
+def write_locks():
+    # Every write goes through db.transaction(), which records a span per BEGIN IMMEDIATE
+    return perf.count("db_query", op="begin_immediate")
+
+def run_reruns(workdir, reruns):
+    """Times full reruns of the login page with and without the old per-rerun DDL."""
+    from streamlit.testing.v1 import AppTest  # only this benchmark needs the Streamlit test harness
+
+    db.configure(os.path.join(workdir, "bench_reruns.db"))
+    _, _, base_tables = migrations.MIGRATIONS[0]
+    app = AppTest.from_file(APP_SCRIPT, default_timeout=60)
+    app.session_state["page"] = "login"
+    app.run()  # the first run imports the app's modules and applies the schema
+    if app.exception:
+        raise RuntimeError(f"The app failed to render: {app.exception[0].message}")
+
+    results = []
+    for name, per_rerun_ddl in (("rerun", ()), ("rerun_with_ddl", base_tables)):
+        latencies = []
+        locks_before = write_locks()
+        for _ in range(reruns):
+            start = time.perf_counter()
+            for statement in per_rerun_ddl:
+                db.execute(statement)
+            app.run()
+            latencies.append(time.perf_counter() - start)
+        result = summarize(name, 0, latencies, 1)
+        result["write_locks_per_op"] = round((write_locks() - locks_before) / reruns, 2)
+        results.append(result)
+    return results
+
+# ==============================
+# REPORTING
+# ==============================
+
+def compare(results, baseline, tolerance):
+    """Returns human-readable regressions: rows/sec down or p95 up by more than tolerance."""
+    previous = {(r["name"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get((result["name"], result["size"]))
+        if before is None:
+            continue
+        if before["rows_per_sec"] and result["rows_per_sec"] < before["rows_per_sec"] * (1 - tolerance):
+            regressions.append(f"{result['name']} @ {result['size']}: rows/sec {before['rows_per_sec']} -> {result['rows_per_sec']}")
+        if result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{result['name']} @ {result['size']}: p95 {before['p95_ms']}ms -> {result['p95_ms']}ms")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark BuddyBot prediction, segmentation, ingestion and annotation writes.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Corpus sizes to run")
+    parser.add_argument("--domain", default="Travel & Booking", choices=sorted(DOMAINS), help="Domain whose intents drive the corpus")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Corpus generator seed")
+    parser.add_argument("--reruns", type=int, default=RERUN_OPS, help="Streamlit reruns to time (0 skips the rerun benchmarks)")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Earlier results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown before flagging a regression")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="buddybot_bench_") as workdir:
+        for size in args.sizes:
+            for result in run_size(size, args.domain, args.seed, workdir):
+                print(f"{result['name']:<20} {size:>8}  p50 {result['p50_ms']:>9.3f}ms  p95 {result['p95_ms']:>9.3f}ms  "
+                      f"p99 {result['p99_ms']:>9.3f}ms  {result['rows_per_sec'] or 0:>12,.0f} rows/s")
+                results.append(result)
+        if args.reruns:
+            for result in run_reruns(workdir, args.reruns):
+                print(f"{result['name']:<20} {args.reruns:>8}  p50 {result['p50_ms']:>9.3f}ms  p95 {result['p95_ms']:>9.3f}ms  "
+                      f"p99 {result['p99_ms']:>9.3f}ms  {result['write_locks_per_op']:>8} write locks/rerun")
+                results.append(result)
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "domain": args.domain,
+            "seed": args.seed,
+            "sizes": args.sizes,
+            "reruns": args.reruns,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Thread-safe, bounded in-process caches shared by every Streamlit session.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+class BoundedLRUCache:
+    """
+    LRU cache capped by entry count and, optionally, by total size in bytes.
+    sizeof(value) reports an entry's size; entries larger than max_bytes are never stored.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or (lambda value: 0)
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._lock = threading.RLock()
+        self._load_locks = {}  # key -> [lock, threads using it]; removed by the last one
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = self._sizeof(value)
+        with self._lock:
+            self._discard(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self.total_bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes is not None and self.total_bytes > self.max_bytes)
+            ):
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        """
+        Returns the cached value, calling loader() on a miss.
+        Concurrent misses on the same key wait for a single load instead of each running loader().
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is not sentinel:
+            return value
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, [threading.Lock(), 0])
+            load_lock[1] += 1
+        try:
+            with load_lock[0]:
+                # Loaded by the thread that held the lock before us
+                with self._lock:
+                    entry = self._live_entry(key)
+                if entry is not None:
+                    return entry[0]
+                value = loader()
+                if value is not None:
+                    self.put(key, value)
+                return value
+        finally:
+            # Only the last waiter drops the lock, so a late miss cannot start a second load with a fresh one
+            with self._lock:
+                load_lock[1] -= 1
+                if load_lock[1] == 0 and self._load_locks.get(key) is load_lock:
+                    del self._load_locks[key]
+
+    def _live_entry(self, key):
+        return self._entries.get(key)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+
+    def discard(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def discard_where(self, predicate):
+        """Removes every entry whose key satisfies predicate(key)."""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+class TTLCache(BoundedLRUCache):
+    """
+    BoundedLRUCache whose entries also expire ttl_seconds after they were stored.
+    Expired entries count as misses and are dropped when they are next looked up (or evicted as least recent).
+    """
+
+    def __init__(self, ttl_seconds, max_entries=128, max_bytes=None, sizeof=None):
+        super().__init__(max_entries, max_bytes, sizeof)
+        self.ttl_seconds = ttl_seconds
+        self._expires_at = {}
+        self.expirations = 0
+
+    def put(self, key, value):
+        with self._lock:
+            super().put(key, value)
+            if key in self._entries:
+                self._expires_at[key] = time.monotonic() + self.ttl_seconds
+
+    def _live_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and self._expires_at[key] <= time.monotonic():
+            self._discard(key)
+            self.expirations += 1
+            return None
+        return entry
+
+    def _discard(self, key):
+        super()._discard(key)
+        self._expires_at.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            super().clear()
+            self._expires_at.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = super().stats()
+            stats["expirations"] = self.expirations
+            return stats
@@ -0,0 +1,72 @@
+"""
+Durable chat transcripts with windowed reads.
+
+Every message of a Test-page conversation is appended to chat_messages; a
+chat turn (the user's message and the bot's reply) is written together with
+one executemany. Sessions keep only a ChatWindow of the most recent
+CHAT_PAGE_SIZE messages; older pages are read on demand, newest first
+through the (user_email, workspace_name, id) index, so a rerun costs the
+same however long the conversation has grown.
+"""
+import db
+
+CHAT_PAGE_SIZE = 20
+SIDEBAR_MESSAGES = 10
+
+def append_messages(user_email, workspace_name, messages):
+    """Appends (role, content) pairs in one transaction. Returns their ids, in order."""
+    with db.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO chat_messages (user_email, workspace_name, role, content) VALUES (?, ?, ?, ?)",
+            [(user_email, workspace_name, role, content) for role, content in messages]
+        )
+        # The write lock is held, so the batch's ids are consecutive
+        last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+    return list(range(last_id - len(messages) + 1, last_id + 1))
+
+def get_messages(user_email, workspace_name, before_id=None, limit=CHAT_PAGE_SIZE):
+    """Returns up to limit (id, role, content) rows older than before_id (or the newest ones), oldest first."""
+    rows = db.fetch_all(
+        """SELECT id, role, content FROM chat_messages
+           WHERE user_email=? AND workspace_name=? AND id < ? ORDER BY id DESC LIMIT ?""",
+        (user_email, workspace_name, before_id if before_id is not None else 2 ** 63 - 1, limit)
+    )
+    return rows[::-1]
+
+class ChatWindow:
+    """The newest messages of one workspace's transcript: CHAT_PAGE_SIZE per page the user has opened."""
+
+    def __init__(self, user_email, workspace_name, page_size=CHAT_PAGE_SIZE):
+        self.user_email = user_email
+        self.workspace_name = workspace_name
+        self.page_size = page_size
+        self.limit = page_size
+        # One extra row tells whether an older page exists
+        rows = get_messages(user_email, workspace_name, limit=page_size + 1)
+        self.has_older = len(rows) > page_size
+        self.messages = [{"id": id_, "role": role, "content": content} for id_, role, content in rows[-page_size:]]
+
+    def covers(self, user_email, workspace_name):
+        return (self.user_email, self.workspace_name) == (user_email, workspace_name)
+
+    def append(self, *messages):
+        """Stores (role, content) pairs as one batch and shows them, dropping messages beyond the open pages."""
+        ids = append_messages(self.user_email, self.workspace_name, messages)
+        self.messages.extend({"id": id_, "role": role, "content": content} for id_, (role, content) in zip(ids, messages))
+        if len(self.messages) > self.limit:
+            del self.messages[:len(self.messages) - self.limit]
+            self.has_older = True
+
+    def load_older(self):
+        """Opens the next older page."""
+        before_id = self.messages[0]["id"] if self.messages else None
+        rows = get_messages(self.user_email, self.workspace_name, before_id, self.page_size + 1)
+        self.has_older = len(rows) > self.page_size
+        rows = rows[-self.page_size:]
+        self.messages[:0] = [{"id": id_, "role": role, "content": content} for id_, role, content in rows]
+        self.limit += self.page_size
+
+    def recent(self, role=None, count=SIDEBAR_MESSAGES):
+        """The last count messages (of one role, if given) that are loaded."""
+        messages = [m for m in self.messages if role is None or m["role"] == role]
+        return messages[-count:]
@@ -1,12 +1,37 @@
 import streamlit as st
+import logging
 import sqlite3
-import bcrypt
 import time
+import os
 import pandas as pd
-import sqlite3.dbapi2 as sqlite
-from io import BytesIO
 import json
-from sqlite3 import Binary # <<< IMPORTANT: Ensure Binary is imported for saving BLOBs
+from io import BytesIO
+from nlu_engine import ENGINE_NAME
+from domains import DOMAINS
+from cache import TTLCache
+from intent_rules import invalidate_intent_matcher
+from model_store import format_version, parse_version
+from styles import APP_CSS
+from annotation_session import AnnotationWindow, WriteBehindBuffer
+import inference
+import db
+import migrations
+import annotation_store
+import annotation_io
+import auth
+import chat_store
+import prelabeling
+import sessions
+import ingestion
+import training_jobs
+import evaluation
+import entities
+import perf
+
+logger = logging.getLogger(__name__)
+
+# Wall-clock start of this script run, recorded as the "rerun" span at the bottom of the file
+_rerun_started = time.perf_counter()
 
 # ==============================
 # DATA UTILITY FUNCTIONS
@@ -26,41 +51,73 @@ def json_to_simple_entities(entities_json):
     except (json.JSONDecodeError, TypeError):
         return ""
 
-# FILE: chatbot_login_app.py
+def get_annotation_window(dataset_id, workspace_name, user_email, index, queue=None, model_version=None):
+    """
+    Returns (window, position) for the index-th sentence to annotate, in dataset order or in queue order.
+    The next block is prefetched when the annotator leaves the current one.
+    """
+    position = queue[index] if queue is not None else index
+    window = st.session_state.annotation_window
+    if window is None or not window.covers(dataset_id, workspace_name, user_email, position, model_version):
+        with perf.span("annotation_prefetch"):
+            if queue is None:
+                window = AnnotationWindow.around(dataset_id, workspace_name, user_email, position, model_version=model_version)
+            else:
+                window = AnnotationWindow.from_queue(dataset_id, workspace_name, user_email, queue, index, model_version=model_version)
+        st.session_state.annotation_window = window
+    return window, position
+
+def get_uncertainty_queue(dataset_id, workspace_name, user_email, model_version):
+    """The unlabeled sentences' positions, least confident first; built once per dataset and model version."""
+    key = (dataset_id, workspace_name, user_email, model_version)
+    cached = st.session_state.annotation_queue
+    if cached is None or cached[0] != key:
+        cached = (key, prelabeling.uncertainty_queue(dataset_id, model_version, workspace_name, user_email))
+        st.session_state.annotation_queue = cached
+        st.session_state.annotation_index = 0
+    return cached[1]
+
+def get_chat_window(workspace_name):
+    """The current workspace's latest transcript page, read once per session and workspace."""
+    user_email = st.session_state.logged_in_email
+    window = st.session_state.chat_window
+    if window is None or not window.covers(user_email, workspace_name):
+        window = chat_store.ChatWindow(user_email, workspace_name)
+        st.session_state.chat_window = window
+    return window
+
+def get_user_workspaces(user_email):
+    """The user's (workspace_name, domain, last_modified) rows, cached for the session."""
+    return st.session_state.session_cache.get_or_load(
+        ("workspaces", user_email),
+        lambda: db.fetch_all("SELECT workspace_name, domain, last_modified FROM workspaces WHERE user_email=?", (user_email,))
+    )
 
-def get_existing_annotation(user_email, workspace_name, sentence):
-    """Retrieves existing intent and entities for a given sentence from the DB."""
-    local_cursor = conn.cursor()
-    local_cursor.execute(
-        """SELECT intent, entities_json FROM annotations  
-           WHERE user_email=? AND workspace_name=? AND sentence=?""",
-        (user_email, workspace_name, sentence)
+def get_model_meta(workspace_name):
+    """The workspace's current (model_engine, model_version, training_date), or None; cached for the session."""
+    meta = st.session_state.session_cache.get_or_load(
+        ("model", workspace_name),
+        lambda: db.fetch_one("SELECT model_engine, model_version, training_date FROM models WHERE workspace_name=?", (workspace_name,)) or ()
     )
-    result = local_cursor.fetchone()
-    # Returns (intent, entities_json_string) or (None, None)
-    return result if result else (None, None)
+    return meta or None
+
+def reset_annotation_order():
+    st.session_state.annotation_index = 0
+    st.session_state.annotation_queue = None
 
-def save_annotation_to_db(workspace_name, user_email, sentence, intent, entities_json):
-    """Saves or updates the annotation using UPSERT (ON CONFLICT)."""
+def flush_annotation_buffer(only_if_due=False):
+    """Commits buffered annotations (one UPSERT batch); label counters update in the same transaction."""
+    buffer = st.session_state.annotation_buffer
+    if not len(buffer):
+        return True
     try:
-        local_cursor = conn.cursor()
-        # The ON CONFLICT clause handles the UPDATE if the row already exists
-        local_cursor.execute(
-            """
-            INSERT INTO annotations (workspace_name, user_email, sentence, intent, entities_json, last_modified) 
-            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            ON CONFLICT(workspace_name, user_email, sentence) DO UPDATE SET
-            intent = excluded.intent, 
-            entities_json = excluded.entities_json,
-            last_modified = CURRENT_TIMESTAMP
-            """, 
-            (workspace_name, user_email, sentence, intent, entities_json)
-        )
-        conn.commit()
+        if only_if_due:
+            buffer.flush_if_due()
+        else:
+            buffer.flush()
         return True
     except Exception as e:
-        # Assuming st is defined globally
-        st.error(f"Failed to save annotation to database: {e}") 
+        st.error(f"Failed to save annotations to database: {e}")
         return False
 
 # ==============================
@@ -69,280 +126,27 @@ def save_annotation_to_db(workspace_name, user_email, sentence, intent, entities
 st.set_page_config(page_title="BuddyBot", page_icon="🤖", layout="wide")
 
 # ==============================
-# DATABASE SETUP (THREAD-SAFE CONNECTION & MIGRATION)
-# ==============================
-@st.cache_resource
-def get_db_connection():
-    """Creates and caches the SQLite connection object."""
-    # Use check_same_thread=False for Streamlit's multithreaded environment
-    conn = sqlite3.connect("users.db", check_same_thread=False)
-    return conn
-
-conn = get_db_connection()
-
-# Initialize tables and handle schema migration
-cursor = conn.cursor()
-
-# 1. Users Table
-cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT,
-        email TEXT UNIQUE,
-        password TEXT
-    )
-""")
-
-# 2. Workspaces Table
-cursor.execute("""
-    CREATE TABLE IF NOT EXISTS workspaces (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_email TEXT,
-        workspace_name TEXT UNIQUE, 
-        domain TEXT,
-        last_modified TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-""")
-
-# 3. Datasets Table (Stores original CSV BLOB)
-cursor.execute("""
-    CREATE TABLE IF NOT EXISTS datasets (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        workspace_name TEXT, 
-        user_email TEXT,
-        filename TEXT,
-        data BLOB
-    )
-""")
-
-# FILE: chatbot_login_app.py
-
-# ... (inside DATABASE SETUP section) ...
-
-# 4. Annotations Table (Stores labeled data) - FIX: Added last_modified
-cursor.execute("""
-    CREATE TABLE IF NOT EXISTS annotations (
-        user_email TEXT,
-        workspace_name TEXT,
-        sentence TEXT,
-        intent TEXT,
-        entities_json TEXT,  
-        last_modified TIMESTAMP DEFAULT CURRENT_TIMESTAMP, 
-        PRIMARY KEY (user_email, workspace_name, sentence)
-    )
-""")
-# ...
-
-# 5. Models Table (NEW: Stores metadata about trained models)
-cursor.execute("""
-    CREATE TABLE IF NOT EXISTS models (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        workspace_name TEXT UNIQUE,
-        model_engine TEXT, -- e.g., 'spaCy', 'Rasa', 'HuggingFace'
-        model_version TEXT,
-        training_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-""")
-
-# Commit all table creations/migrations
-conn.commit()
-
-
-# ==============================
-# DOMAIN DATA & NLU INTENTS
+# DATABASE SETUP (POOLED PER-THREAD CONNECTIONS & MIGRATIONS)
 # ==============================
-DOMAINS = {
-    "Sports": {
-        "icon": "⚽",
-        "description": "Analyze team stats, game history, and player performance.",
-        "intents": ["request_score", "query_player_stat", "book_ticket", "greeting"]
-    },
-    "Education": {
-        "icon": "📚",
-        "description": "Create learning assistants from textbooks, notes, or research papers.",
-        "intents": ["query_definition", "request_summary", "schedule_study", "greeting"]
-    },
-    "Art & Design": {
-        "icon": "🎨",
-        "description": "Interpret artistic styles, history, or design principles.",
-        "intents": ["query_artist", "describe_style", "find_gallery", "greeting"]
-    },
-    "Entertainment": {
-        "icon": "🎬",
-        "description": "Discuss movies, music, celebrities, and pop culture trends.",
-        "intents": ["recommend_movie", "query_actor", "buy_merch", "greeting"]
-    },
-    "Finance": {
-        "icon": "💰",
-        "description": "Manage bank account queries, fund transfers, and fraud reporting.",
-        "intents": ["query_balance", "transfer_funds", "report_fraud", "greeting"]
-    },
-    "Travel & Booking": {
-        "icon": "✈️",
-        "description": "Handle flight, hotel, and general ticket reservations and inquiries.",
-        "intents": ["book_flight", "check_inquiry", "cancel_reservation", "greeting"]
-    },
-    "Business": {
-        "icon": "💼",
-        "description": "Handle general customer FAQs, submit help desk tickets, or analyze operations.",
-        "intents": ["query_hours", "submit_complaint", "request_report", "greeting"]
-    },
-    "Healthcare": {
-        "icon": "🏥",
-        "description": "Provide information on symptoms, book appointments, or answer medical FAQs.",
-        "intents": ["book_appointment", "query_symptom", "refill_prescription", "greeting"]
-    },
-    "IT Support": {
-        "icon": "💻",
-        "description": "Assist with troubleshooting, password resets, and software installation guides.",
-        "intents": ["reset_password", "troubleshoot_login", "request_software", "greeting"]
-    },
-    "Real Estate": {
-        "icon": "🏠",
-        "description": "Search property listings, schedule viewings, and answer mortgage questions.",
-        "intents": ["search_property", "schedule_viewing", "query_mortgage", "greeting"]
-    },
-    "E-commerce": {
-        "icon": "🛒",
-        "description": "Track orders, process returns, and handle product inventory questions.",
-        "intents": ["track_order", "process_return", "query_inventory", "greeting"]
-    }
-}
+# db.get_connection() hands each script thread its own pooled WAL-mode connection;
+# functions below always fetch it at call time (callbacks run on the next rerun's thread).
+# Tables and indexes are created by versioned migrations, applied once per process.
+with perf.span("setup", stage="schema"):
+    migrations.ensure_schema()
+# Training runs on background worker threads fed by the training_jobs table (also started once per process)
+with perf.span("setup", stage="workers"):
+    training_jobs.start_workers()
+TRAINING_JOB_POLL_SECONDS = 2
+# Cached workspace lists and model metadata are dropped on this session's writes, or after this long
+SESSION_CACHE_SECONDS = 60
+# Comma-separated emails allowed to open the Performance page
+ADMIN_EMAILS = {e.strip().lower() for e in os.environ.get("BUDDYBOT_ADMIN_EMAILS", "").split(",") if e.strip()}
 
 # ==============================
-# PAGE STYLING (Embedded CSS)
+# PAGE STYLING (CSS in styles.py)
 # ==============================
-st.markdown("""
-    <style>
-        /* Base Styling */
-        [data-testid="stAppViewContainer"] {
-            background: linear-gradient(135deg, #0b1a37 0%, #1c2b4d 100%);
-            color: white;
-            animation: fadeIn 1s ease-in-out;
-        }
-        .title {
-            text-align: center;
-            font-size: 36px;
-            font-weight: 800;
-            color: #6EC6FF;
-            margin-bottom: 20px;
-        }
-        
-        /* Sidebar Bot Avatar */
-        .sidebar-bot-avatar {
-            text-align: center;
-            margin-bottom: 20px;
-        }
-        .sidebar-bot-avatar img {
-            width: 80px;
-            height: 80px;
-            border-radius: 50%;
-            background-color: #6EC6FF;
-            padding: 5px;
-            box-shadow: 0 0 10px rgba(110, 198, 255, 0.5);
-        }
-        .sidebar-bot-avatar p {
-            font-size: 18px;
-            font-weight: bold;
-            color: white;
-            margin-top: 10px;
-        }
-            
-        /* Logo & Chat Bubbles */
-        .logo-container {
-            text-align: center;
-            margin-top: 30px;
-            animation: slideUp 1s ease-in-out;
-        }
-        @keyframes slideUp {
-            from { opacity: 0; transform: translateY(40px); }
-            to { opacity: 1; transform: translateY(0); }
-        }
-        .chat-bubble {
-            background-color: #2b70f0;
-            border-radius: 15px;
-            padding: 10px 15px;
-            display: inline-block;
-            margin: 10px 0;
-            color: white;
-            max-width: 90%;
-            text-align: left;
-        }
-        .chat-bubble-container {
-            margin-top: 20px;
-            width: 100%;
-            text-align: center;
-        }
-
-        /* Input & Auth Button Styles */
-        .stTextInput > div > div > input, .stSelectbox > div > div > div > input {
-            background-color: #1c2b4d;
-            border: 1px solid #334466;
-            color: white;
-            transition: all 0.2s ease;
-        }
-        .stTextInput > div > div > input:focus, .stTextInput > div > div > input:hover {
-            border-color: #6EC6FF !important;
-            box-shadow: 0 0 0 1px #6EC6FF;
-        }
-        div.stButton button[kind="primary"] {
-            background-color: white !important;
-            color: #2b70f0 !important;
-            border: 1px solid #2b70f0;
-            font-weight: bold;
-            box-shadow: 0 4px 10px rgba(0,0,0,0.3);
-            transition: all 0.3s ease-in-out;
-        }
-        div.stButton button[kind="primary"]:hover {
-            background-color: #f0f0f0 !important;
-            transform: scale(1.02);
-            border-color: #1748b0;
-        }
-        
-        /* Custom Styling for Simple Domain Cards/Buttons */
-        .domain-card {
-            background-color: #1c2b4d;
-            border: 2px solid #334466;
-            border-radius: 10px;
-            padding: 20px;
-            margin-bottom: 15px;
-            transition: all 0.3s ease;
-            box-shadow: 0 4px 8px rgba(0, 0, 0, 0.3);
-            text-align: center;
-        }
-        .domain-card:hover {
-            border-color: #6EC6FF;
-            box-shadow: 0 6px 12px rgba(0, 0, 0, 0.5);
-            transform: translateY(-3px);
-        }
-        .domain-card h3 {
-            color: #6EC6FF;
-            margin-top: 0;
-            font-size: 20px;
-        }
-        .domain-card p {
-            font-size: 14px;
-            color: #ccc;
-        }
-        
-        /* Sidebar styling for better appearance */
-        [data-testid="stSidebar"] {
-            background-color: #1c2b4d !important;
-            color: white;
-        }
-        
-        /* New: Entity Tagging Style Simulation */
-        .sentence-display {
-            font-size: 1.2em;
-            padding: 15px;
-            margin: 10px 0;
-            background-color: #1c2b4d;
-            border-radius: 8px;
-            border: 1px solid #334466;
-            min-height: 50px;
-        }
-    </style>
-""", unsafe_allow_html=True)
+with perf.span("setup", stage="styles"):
+    st.markdown(APP_CSS, unsafe_allow_html=True)
 
 # ==============================
 # SESSION STATE & NAVIGATION HELPERS
@@ -351,27 +155,42 @@ if 'page' not in st.session_state:
     st.session_state.page = 'register'
 if 'logged_in_email' not in st.session_state:
     st.session_state.logged_in_email = None
-if 'messages' not in st.session_state:
-    st.session_state.messages = []
+if 'chat_window' not in st.session_state:
+    st.session_state.chat_window = None
 if 'current_workspace' not in st.session_state:
     st.session_state.current_workspace = None
 if 'current_domain' not in st.session_state:
     st.session_state.current_domain = None
-if 'chat_history' not in st.session_state:
-    st.session_state.chat_history = {}
 if 'temp_workspace_name' not in st.session_state:
     st.session_state.temp_workspace_name = ""
 if 'workspace_action' not in st.session_state:
     st.session_state.workspace_action = None
-if 'sentences_df' not in st.session_state: 
-    st.session_state.sentences_df = None
+if 'annotation_dataset' not in st.session_state: 
+    st.session_state.annotation_dataset = None
 if 'annotation_index' not in st.session_state: 
     st.session_state.annotation_index = 0
+if 'annotation_window' not in st.session_state:
+    st.session_state.annotation_window = None
+if 'annotation_queue' not in st.session_state:
+    st.session_state.annotation_queue = None
+if 'annotation_buffer' not in st.session_state:
+    st.session_state.annotation_buffer = WriteBehindBuffer()
+if 'session_cache' not in st.session_state:
+    st.session_state.session_cache = TTLCache(ttl_seconds=SESSION_CACHE_SECONDS, max_entries=64)
 
 # Check query parameters for initial navigation
 if 'page' in st.query_params:
     st.session_state.page = st.query_params['page']
 
+# A browser reload starts a new session: the signed token in the URL restores the login without a password check.
+# The token is single-use, so a copy of an older URL (history, logs, a shared link) no longer signs anyone in.
+if st.session_state.logged_in_email is None and sessions.SESSION_QUERY_PARAM in st.query_params:
+    st.session_state.logged_in_email, rotated_token = sessions.rotate_session(st.query_params[sessions.SESSION_QUERY_PARAM])
+    if rotated_token is None:
+        del st.query_params[sessions.SESSION_QUERY_PARAM]
+    else:
+        st.query_params[sessions.SESSION_QUERY_PARAM] = rotated_token
+
 # Navigation Functions
 def navigate_to_login():
     st.session_state.page = 'login'
@@ -404,22 +223,54 @@ def navigate_to_annotate():
 def navigate_to_policy():
     st.session_state.page = 'policy'
     st.query_params['page'] = 'policy'
+
+def navigate_to_performance():
+    st.session_state.page = 'performance'
+    st.query_params['page'] = 'performance'
+
+def client_ip():
+    """The signing-in client's address for throttling (None on localhost or behind an untrusted proxy)."""
+    return auth.client_ip(st.context.ip_address, st.context.headers.get("X-Forwarded-For"))
+
+def reset_user_state():
+    """Puts every per-user session key back to its initial value, so nothing carries over to the next login."""
+    st.session_state.logged_in_email = None
+    st.session_state.chat_window = None
+    st.session_state.current_workspace = None
+    st.session_state.current_domain = None
+    st.session_state.temp_workspace_name = ""
+    st.session_state.workspace_action = None
+    st.session_state.annotation_dataset = None
+    st.session_state.annotation_index = 0
+    st.session_state.annotation_window = None
+    st.session_state.annotation_queue = None
+    st.session_state.annotation_buffer = WriteBehindBuffer()
+    st.session_state.session_cache = TTLCache(ttl_seconds=SESSION_CACHE_SECONDS, max_entries=64)
+    st.session_state.pop('annotation_export', None)
+    st.session_state.pop('polling_job_id', None)
+    st.session_state.pop('prelabel_job', None)
+
+def logout():
+    # Labels still in the write-behind buffer are saved for the user who made them
+    flush_annotation_buffer()
+    sessions.revoke_session(st.query_params.get(sessions.SESSION_QUERY_PARAM))
+    st.query_params.pop(sessions.SESSION_QUERY_PARAM, None)
+    reset_user_state()
+    navigate_to_login()
     
 # Callback function for domain selection
 def finalize_workspace_creation(workspace_name, domain_name):
     """Callback for creating and activating a new workspace."""
-    local_cursor = conn.cursor() 
-    
     try:
-        local_cursor.execute(
+        db.execute(
             "INSERT INTO workspaces (user_email, workspace_name, domain) VALUES (?, ?, ?)",
             (st.session_state.logged_in_email, workspace_name, domain_name)
         )
-        conn.commit()
+        st.session_state.session_cache.discard(("workspaces", st.session_state.logged_in_email))
         
         st.session_state.current_workspace = workspace_name
         st.session_state.current_domain = domain_name
-        st.session_state.messages.clear()
+        st.session_state.chat_window = None
         st.session_state.temp_workspace_name = "" 
         
         navigate_to_action_choice()
@@ -431,11 +282,7 @@ def activate_existing_workspace(workspace_name, domain_name):
     """Callback for setting an existing workspace as active."""
     st.session_state.current_workspace = workspace_name
     st.session_state.current_domain = domain_name
-    
-    if workspace_name not in st.session_state.chat_history:
-        st.session_state.chat_history[workspace_name] = []
-        
-    st.session_state.messages = st.session_state.chat_history.get(workspace_name, [])
+    st.session_state.chat_window = None
     
     navigate_to_action_choice()
 
@@ -474,14 +321,7 @@ def show_sidebar_content():
         st.sidebar.markdown(f"**User:** `{user_email}`")
         
         # Logout button 
-        st.sidebar.button("Logout", key="logout_sidebar", use_container_width=True, on_click=lambda: (
-            st.session_state.pop('logged_in_email', None), 
-            st.session_state.pop('current_workspace', None), 
-            st.session_state.pop('current_domain', None), 
-            st.session_state.messages.clear(), 
-            st.session_state.chat_history.clear(),
-            navigate_to_login()
-        ))
+        st.sidebar.button("Logout", key="logout_sidebar", use_container_width=True, on_click=logout)
         st.sidebar.markdown("---")
 
         with st.sidebar.expander("❓ **Help Section**"):
@@ -491,14 +331,19 @@ def show_sidebar_content():
             st.markdown("4. **Train** the model then **Chat**.") 
         st.sidebar.markdown("---")
 
+        if is_admin(user_email):
+            st.sidebar.button("📊 Performance", key="performance_sidebar", use_container_width=True, on_click=navigate_to_performance)
+            st.sidebar.markdown("---")
+
         if workspace:
             st.sidebar.markdown(f"**Chat History: {workspace}**") 
-            if st.session_state.chat_history.get(workspace):
+            # Only the newest user messages of the loaded transcript page
+            recent_messages = get_chat_window(workspace).recent("user")
+            if recent_messages:
                 with st.sidebar.container(height=200):
-                    for i, msg in enumerate(st.session_state.chat_history[workspace]):
-                        if msg["role"] == "user":
-                            summary = msg["content"][:30] + "..." if len(msg["content"]) > 30 else msg["content"]
-                            st.sidebar.markdown(f"*{i+1}. {summary}*")
+                    for msg in recent_messages:
+                        summary = msg["content"][:30] + "..." if len(msg["content"]) > 30 else msg["content"]
+                        st.sidebar.markdown(f"*{summary}*")
             else:
                 st.sidebar.markdown("No history for this workspace yet.")
         else:
@@ -515,141 +360,112 @@ def show_sidebar_content():
 # DATA LOADERS/HANDLERS
 # ==============================
 
-@st.cache_data
-def load_dataset_blob(user_email, workspace_name):
-    """Retrieves the dataset BLOB and converts it to a DataFrame."""
-    local_cursor = conn.cursor()
-    local_cursor.execute(
-        "SELECT data FROM datasets WHERE user_email=? AND workspace_name=?", 
-        (user_email, workspace_name)
-    )
-    result = local_cursor.fetchone()
-    
-    if result:
-        data_blob = result[0]
-        try:
-            # Convert BLOB to BytesIO object, then read as CSV
-            df = pd.read_csv(BytesIO(data_blob))
-            return df
-        except Exception as e:
-            # Print error to console/logs for better debugging if loading fails
-            print(f"Error reading data from DB: {e}") 
-            st.error("Error reading data from DB. File format might be corrupted.")
-            return None
-    return None
-
-def split_dataframe_to_sentences(df):
-    """
-    Splits the content of the primary text column into a list of sentences.
-    """
-    text_col = None
-    
-    # 1. Search for a preferred column name (case-insensitive for robustness)
-    for col in df.columns:
-        if col.lower() in ['text', 'sentence', 'utterance']:
-            text_col = col
-            break
-    
-    if text_col:
-        # Simple splitting for demonstration
-        # Ensure only string data is used for splitting
-        all_text = " ".join(df[text_col].astype(str).tolist())
-        # Basic sentence splitting by period
-        sentences = [s.strip() for s in all_text.split('.') if s.strip()]
-        return pd.DataFrame(sentences, columns=['sentence'])
-    
-    st.warning("Could not find a 'text', 'sentence', or 'utterance' column in the uploaded dataset. Using all columns as one string.")
-    
-    # Fallback: concatenate all columns for a simple string split
-    all_text = df.astype(str).agg(' '.join, axis=1).str.cat(sep=' ')
-    sentences = [s.strip() for s in all_text.split('.') if s.strip()]
-    return pd.DataFrame(sentences, columns=['sentence'])
-
+# Datasets are streamed into the sentences table at upload time (see ingestion.py);
+# the annotation page reads sentences by position and never reparses the raw CSV.
 
 # ==============================
-# NLU MODEL INTEGRATION (STUBS)
+# NLU MODEL INTEGRATION
 # ==============================
 
-def train_nlu_model(workspace_name, annotated_data):
+def train_nlu_model(workspace_name, user_email, full_retrain=False):
     """
-    Placeholder function for NLU model training.
+    Queues a training run for the workspace; a background worker trains and saves the model.
+    By default only annotations changed since the last run are applied to the current model.
     """
     # Check for actual data to prevent empty training
-    if annotated_data is None or annotated_data.empty or len(annotated_data) == 0:
+    if annotation_store.count_annotations(workspace_name, user_email) == 0:
         st.error("Cannot train: No annotated data found in the database for this workspace.")
         return False
 
-    # 1. Simulate Training Time
-    with st.spinner("⏳ Training NLU Model..."):
-        time.sleep(3) 
+    mode = training_jobs.FULL if full_retrain else training_jobs.INCREMENTAL
+    job_id = training_jobs.enqueue_job(workspace_name, user_email, mode)
+    st.session_state.session_cache.discard(("model", workspace_name))
+    st.toast(f"Training job #{job_id} queued.", icon="⏳")
+    return True
 
-    # 2. Simulate Model Saving/Metadata Update
-    local_cursor = conn.cursor()
-    
-    # Store/Update model metadata
-    local_cursor.execute("DELETE FROM models WHERE workspace_name=?", (workspace_name,))
-    local_cursor.execute(
-        "INSERT INTO models (workspace_name, model_engine, model_version) VALUES (?, ?, ?)",
-        (workspace_name, "spaCy_Simulated", "v1.0")
-    )
-    conn.commit()
+def show_training_job_status(workspace_name):
+    """Shows the workspace's latest training job, re-polling the job table while it is queued or running."""
+    job = training_jobs.get_latest_job(workspace_name)
+    if job is None:
+        return
+    if job["status"] in training_jobs.ACTIVE_STATUSES:
+        st.fragment(_render_training_job, run_every=TRAINING_JOB_POLL_SECONDS)(workspace_name, job["id"])
+    else:
+        _render_training_job(workspace_name, job["id"])
+
+def _render_training_job(workspace_name, job_id):
+    job = training_jobs.get_job(job_id)
+    status = job["status"]
+    if status == training_jobs.QUEUED:
+        st.info(f"⏳ Training job #{job_id} is queued...")
+        if st.button("Cancel Training", key=f"cancel_job_{job_id}"):
+            training_jobs.request_cancel(job_id)
+            st.rerun()
+    elif status == training_jobs.RUNNING:
+        st.progress(job["progress"] or 0.0, text=f"⏳ Training NLU Model... (job #{job_id}, {job['progress'] or 0:.0%})")
+        if job["cancel_requested"]:
+            st.caption("Cancelling...")
+        elif st.button("Cancel Training", key=f"cancel_job_{job_id}"):
+            training_jobs.request_cancel(job_id)
+            st.rerun()
+    elif status == training_jobs.SUCCEEDED:
+        st.success(
+            f"✅ NLU Model ready. {job['message']} Engine: {ENGINE_NAME}, Version: {job['model_version']} "
+            f"(finished {job['finished_at']}). Now ready to **Test**."
+        )
+    elif status == training_jobs.CANCELLED:
+        st.warning(f"Training job #{job_id} was cancelled.")
+    else:
+        st.error(f"Training job #{job_id} failed: {job['message']}")
 
-    st.success(f"✅ NLU Model trained and saved! Engine: spaCy_Simulated, Version: v1.0. Now ready to **Test**.")
-    return True
+    # The job finished while this fragment was polling: refresh the whole page (metrics, counts)
+    if status not in training_jobs.ACTIVE_STATUSES and st.session_state.get("polling_job_id") == job_id:
+        st.session_state.polling_job_id = None
+        st.session_state.session_cache.discard(("model", workspace_name))
+        st.rerun()
+    if status in training_jobs.ACTIVE_STATUSES:
+        st.session_state.polling_job_id = job_id
 
 # ==============================
-# CHAT LOGIC (UPDATED WITH SIMULATED NLU)
+# CHAT LOGIC
 # ==============================
-def display_chat_messages():
-    """Displays all messages stored in the current session state chat history."""
-    for message in st.session_state.messages:
+def display_chat_messages(workspace_name):
+    """Displays the loaded pages of the workspace's transcript; older pages are read on demand."""
+    window = get_chat_window(workspace_name)
+    if window.has_older and st.button("⬆️ Load earlier messages", key="load_older_messages_btn"):
+        window.load_older()
+    for message in window.messages:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
 
-def predict_intent_and_entities(prompt, domain):
+def predict_intent_and_entities(prompt, domain, workspace_name=None):
     """
-    Simulates NLU prediction using keyword matching.
+    Predicts (intent, entities_json, confidence) for a prompt.
+    Uses the workspace's trained model when one exists; otherwise falls back to keyword rules.
     """
-    
-    # Normalize prompt for matching
-    p = prompt.lower()
-    
-    # Check for specific intents based on the active domain
-    if domain == "Travel & Booking":
-        if "book" in p or "tickets" in p or "reservation" in p:
-            intent = "book_flight" if "flight" in p or "plane" in p else "book_ticket"
-            
-            # Simple entity extraction simulation
-            destination = "an unknown destination"
-            if "to paris" in p:
-                destination = "Paris"
-            elif "to london" in p:
-                destination = "London"
-                
-            entities = f"{{\"destination\":\"{destination}\", \"type\":\"{intent.split('_')[1]}\"}}"
-            return intent, entities
-
-    elif domain == "Finance":
-        if "balance" in p or "how much" in p:
-            return "query_balance", "{\"account\":\"checking\"}"
-        elif "transfer" in p or "send money" in p:
-            return "transfer_funds", "{\"amount\":\"unknown\"}"
-            
-    elif domain == "IT Support":
-        if "password" in p or "reset" in p:
-            return "reset_password", "{}"
-        elif "login" in p or "troubleshoot" in p:
-            return "troubleshoot_login", "{}"
-
-    # General Intent checks (low confidence fallback in a real system)
-    if "hello" in p or "hi" in p:
-        return "greeting", "{}"
-    if "trained the model" in p:
-        # A specific response for the user's meta-query
-        return "meta_query_training", "{}"
-
-    # Default Fallback Intent
-    return "default_fallback", "{}"
+    return inference.predict_intent_and_entities(db.get_connection(), prompt, domain, workspace_name)
+
+def show_batch_scoring(workspace_name, domain):
+    """Scores an uploaded CSV of utterances in one batch call and offers the results for download."""
+    with st.expander("📄 Upload CSV to score"):
+        score_file = st.file_uploader("CSV with a 'text', 'sentence' or 'utterance' column", type=["csv"], key="score_uploader")
+        if score_file is not None and st.button("Score Utterances", use_container_width=True, key="score_csv_btn"):
+            try:
+                utterances_df = pd.read_csv(score_file)
+                with st.spinner("Scoring utterances..."):
+                    scored = inference.predict_batch(db.get_connection(), workspace_name, domain, utterances_df)
+            except (ValueError, pd.errors.ParserError) as e:
+                st.error(f"Could not score file: {e}")
+                return
+            st.success(f"Scored **{len(scored)}** utterances.")
+            st.dataframe(scored.head(100), use_container_width=True)
+            st.download_button(
+                "Download Scored CSV",
+                scored.to_csv(index=False).encode("utf-8"),
+                file_name=f"{workspace_name}_scored.csv",
+                mime="text/csv",
+                key="download_scored_csv"
+            )
 
 # The main chat handler, which now calls the new prediction stub
 def handle_chat_input(workspace_name):
@@ -658,15 +474,13 @@ def handle_chat_input(workspace_name):
     domain_display = domain_data.get("icon", "") + " " + domain
     
     if prompt := st.chat_input(f"Chat with your '{workspace_name}' Bot..."):
-        st.session_state.messages.append({"role": "user", "content": prompt})
-        st.session_state.chat_history[workspace_name] = st.session_state.messages
-        
         # --- NEW LOGIC: PREDICT & RESPOND ---
-        intent, entities_json = predict_intent_and_entities(prompt, domain)
+        intent, entities_json, confidence = predict_intent_and_entities(prompt, domain, workspace_name)
         entities_dict = json.loads(entities_json)
         
+        prediction_source = f"{ENGINE_NAME} model, confidence {confidence:.0%}" if confidence is not None else "Keyword rules"
         response_lines = [
-            f"**Prediction Successful!** (Simulated NLU)",
+            f"**Prediction Successful!** ({prediction_source})",
             "---",
             f"**Predicted Domain:** `{domain_display}`",
             f"**Predicted Intent:** `{intent}`",
@@ -675,7 +489,7 @@ def handle_chat_input(workspace_name):
         
         # Add a conditional response for better simulation
         if intent in ["book_ticket", "book_flight"]:
-            response_lines.append(f"\n*Simulated Response:* Okay, I'm finding tickets to **{entities_dict.get('destination', 'your destination')}** now in the **{domain}** domain.")
+            response_lines.append(f"\n*Simulated Response:* Okay, I'm finding tickets to **{entities_dict.get('destination') or entities_dict.get('city', 'your destination')}** now in the **{domain}** domain.")
         elif intent == "meta_query_training":
              response_lines.append(f"\n*Simulated Response:* That's great! My NLU component is ready. This chat window is now reflecting the *simulated* prediction results based on your trained domain.")
         elif intent == "default_fallback":
@@ -689,8 +503,8 @@ def handle_chat_input(workspace_name):
         with st.chat_message("assistant"):
             st.markdown(response)
             
-            st.session_state.messages.append({"role": "assistant", "content": response})
-            st.session_state.chat_history[workspace_name] = st.session_state.messages
+        # The turn's two messages are written as one batch
+        get_chat_window(workspace_name).append(("user", prompt), ("assistant", response))
             
         st.rerun() 
 
@@ -709,18 +523,11 @@ def show_home_page():
     st.markdown("---")
     
     user_email = st.session_state.logged_in_email
-    local_cursor = conn.cursor()
-    
-    local_cursor.execute("SELECT workspace_name, domain, last_modified FROM workspaces WHERE user_email=?", (user_email,))
-    existing_workspaces = local_cursor.fetchall()
+    existing_workspaces = get_user_workspaces(user_email)
     
     # 1. Determine the number of existing workspaces and the column index for the "Create New Project" card
     num_workspaces = len(existing_workspaces)
     
-    # Calculate how many columns are needed (including the new project card)
-    # Since we display 3 items per row, we calculate the total columns needed
-    total_items = num_workspaces + 1
-    
     # Create the columns
     cols = st.columns(3)
     
@@ -891,6 +698,39 @@ def show_action_choice_page():
 # ==============================
 # ANNOTATION PAGE (FINAL CORRECTED VERSION)
 # ==============================
+def prelabels_ready(dataset, workspace_name, user_email, model_version):
+    """
+    True when the model's suggestions for the dataset are stored. Otherwise queues one pre-labeling job per
+    dataset and model version on the background workers (see training_jobs.py) and shows its state; a failed
+    job is reported, not queued again.
+    """
+    if prelabeling.has_prelabels(dataset["id"], model_version, dataset["sentence_count"]):
+        return True
+    key = (dataset["id"], model_version)
+    tracked = st.session_state.get("prelabel_job")
+    if tracked and tracked[0] == key:
+        job = training_jobs.get_job(tracked[1])
+    else:
+        # A failed or still open job for this version (e.g. from an earlier session) is shown instead of re-queued
+        job = training_jobs.get_latest_job(workspace_name, (training_jobs.PRELABEL,))
+        if job is None or job["model_version"] != format_version(model_version) or job["status"] == training_jobs.SUCCEEDED:
+            job = training_jobs.get_job(training_jobs.enqueue_job(
+                workspace_name, user_email, training_jobs.PRELABEL, format_version(model_version)
+            ))
+        st.session_state.prelabel_job = (key, job["id"])
+
+    if job["status"] in training_jobs.ACTIVE_STATUSES:
+        st.info("⏳ Pre-labeling sentences with the current model in the background...")
+    elif job["status"] == training_jobs.FAILED:
+        st.error(f"Pre-labeling job #{job['id']} failed: {job['message']}")
+        if st.button("Retry Pre-labeling", key="retry_prelabel_btn"):
+            job_id = training_jobs.enqueue_job(workspace_name, user_email, training_jobs.PRELABEL, format_version(model_version))
+            st.session_state.prelabel_job = (key, job_id)
+            st.rerun()
+    else:
+        st.warning("Pre-labeling finished without suggestions for this dataset; annotate in dataset order for now.")
+    return False
+
 def show_annotation_page():
     if not st.session_state.logged_in_email or not st.session_state.current_workspace:
         navigate_to_home()
@@ -905,41 +745,67 @@ def show_annotation_page():
     st.markdown(f"**Domain:** {DOMAINS.get(domain, {}).get('icon', '')} {domain}", unsafe_allow_html=True)
     st.markdown("---")
     
-    # 1. DEBUG/LOAD THE DATASET
-    if st.session_state.sentences_df is None:
+    # 1. LOAD THE DATASET (sentence rows were extracted when the CSV was saved)
+    if st.session_state.annotation_dataset is None:
         st.warning("Attempting to load dataset from database...")
-        df = load_dataset_blob(user_email, workspace_name)
+        try:
+            dataset = ingestion.ensure_sentences(workspace_name, user_email)
+        except Exception:
+            logger.exception("Error reading dataset for workspace %r", workspace_name)
+            st.error("Error reading data from DB. File format might be corrupted.")
+            return
         
-        if df is None or df.empty:
+        if dataset is None:
             st.error("Dataset not found in DB. Please go to **Upload & Train** to upload and *SAVE* a CSV first.")
             if st.button("Go to Train Page", key="go_to_train_from_annotate_fail"):
                 set_workspace_action("Train")
             return
         
-        # Split the loaded DataFrame into individual sentences/utterances
-        st.session_state.sentences_df = split_dataframe_to_sentences(df)
+        st.session_state.annotation_dataset = dataset
         st.session_state.annotation_index = 0 
         
-        if st.session_state.sentences_df.empty:
+        if not dataset["sentence_count"]:
             st.error("The dataset was loaded but contains zero sentences after processing.")
             return
 
-        st.success(f"Successfully loaded and split **{len(st.session_state.sentences_df)}** sentences!")
+        st.success(f"Successfully loaded **{dataset['sentence_count']}** sentences!")
         st.rerun()
 
 
-    # Continue with annotation process only if sentences_df is available
-    sentences_df = st.session_state.sentences_df
-    total_sentences = len(sentences_df)
+    # Continue with annotation process only if the dataset is available
+    dataset = st.session_state.annotation_dataset
+    total_sentences = dataset["sentence_count"] or 0
 
     if total_sentences == 0:
         st.error("The uploaded CSV could not be processed into individual sentences/utterances (zero sentences found).")
         return
 
+    # Model suggestions (computed once per dataset and model version) pre-fill the fields and drive the queue order
+    model_meta = get_model_meta(workspace_name)
+    model_version = parse_version(model_meta[1]) if model_meta else None
+    if model_version is not None and not prelabels_ready(dataset, workspace_name, user_email, model_version):
+        model_version = None
+    order = st.radio(
+        "Annotation order", ["Dataset order", "Least confident first"], horizontal=True, key="annotation_order",
+        on_change=reset_annotation_order, disabled=model_version is None,
+        help="Least confident first shows the unlabeled sentences the current model is most unsure about first."
+    )
+    queue = None
+    if order == "Least confident first" and model_version is not None:
+        queue = get_uncertainty_queue(dataset["id"], workspace_name, user_email, model_version)
+        total_sentences = len(queue)
+
+    # Commit buffered labels once enough are pending or the oldest has waited long enough
+    flush_annotation_buffer(only_if_due=True)
+
     # Check if annotation is complete
     if st.session_state.annotation_index >= total_sentences:
+        flush_annotation_buffer()
         st.balloons()
-        st.success(f"🎉 Annotation Complete! You have labeled **{total_sentences}** sentences.")
+        if queue is not None:
+            st.success(f"🎉 Queue Complete! You have gone through all **{total_sentences}** unlabeled sentences.")
+        else:
+            st.success(f"🎉 Annotation Complete! You have labeled **{total_sentences}** sentences.")
         st.markdown("You can now go to **Upload & Train** to train your custom NLU model!")
         if st.button("Go to Train Data"):
             set_workspace_action("Train")
@@ -952,18 +818,26 @@ def show_annotation_page():
 
     # 2. Display the current sentence & Pre-load existing data
     current_index = st.session_state.annotation_index
-    current_sentence = sentences_df.loc[current_index, 'sentence']
+    # Sentences, existing labels and suggestions come from the prefetched window (buffered saves included)
+    window, current_position = get_annotation_window(dataset["id"], workspace_name, user_email, current_index, queue, model_version)
+    current_sentence = window.sentence(current_position)
     
     # --- START PRE-POPULATION LOGIC (NEW/CORRECTED) ---
-    # Fetch existing data from the database using the helper function
-    existing_intent, existing_entities_json = get_existing_annotation(user_email, workspace_name, current_sentence)
-    
-    # Convert JSON entities back to the simple string format for the UI
-    pre_populated_entities = json_to_simple_entities(existing_entities_json)
+    existing_intent, existing_entities_json = window.label(current_sentence)
     
     # Prepare intent options
     intents = DOMAINS.get(domain, {}).get("intents", ["greeting", "inform", "request", "default"])
     intent_options_with_none = ["-- Select Intent --"] + intents
+
+    # Unlabeled sentences start from the model's suggestion
+    suggestion = window.suggestion(current_position)
+    if existing_intent is None and suggestion is not None and suggestion[0] in intents:
+        existing_intent, _, existing_entities_json = suggestion
+    elif existing_intent is None:
+        existing_entities_json = inference.get_workspace_extractor(domain, workspace_name).extract_json(current_sentence)[0]
+    
+    # Convert JSON entities back to the simple string format for the UI
+    pre_populated_entities = json_to_simple_entities(existing_entities_json)
     
     # Determine the initial selection index
     initial_intent_value = existing_intent if existing_intent else "-- Select Intent --"
@@ -974,18 +848,20 @@ def show_annotation_page():
     
     st.markdown("### Sentence to Annotate:")
     st.markdown(f'<div class="sentence-display" id="sentence-to-annotate">{current_sentence}</div>', unsafe_allow_html=True)
+    if suggestion is not None and window.label(current_sentence)[0] is None:
+        st.caption(f"🤖 Model suggestion: **{suggestion[0]}** ({suggestion[1]:.0%} confidence). Check it before saving.")
 
     st.markdown("---")
     st.markdown("### Annotation Tools")
 
     # 3. Intent Tagging (Dropdown) - Uses initial_index for pre-population
-    intent_key = f"intent_select_{current_index}"
+    intent_key = f"intent_select_{current_position}"
     selected_intent = st.selectbox("1. Select Intent:", intent_options_with_none, index=initial_index, key=intent_key)
 
     # 4. Entity Span Tagging (Simulation) - Uses pre_populated_entities for pre-population
     st.markdown("2. Highlight Entities (Simulated):")
     st.info("💡 **Enter Entities:** Use the format `entity_name:value, another_entity:value`. E.g., `artist:Monet, date:1872`")
-    entity_key = f"entity_input_{current_index}"
+    entity_key = f"entity_input_{current_position}"
     entity_input = st.text_input("Enter Entities (name:value, name:value...)", value=pre_populated_entities, key=entity_key)
 
     # 5. Save Labeled Data
@@ -1027,14 +903,17 @@ def show_annotation_page():
 
             if valid_entity_format:
                 entities_json = json.dumps(entities_dict)
+                entity_spans_json = json.dumps(entities.locate_spans(current_sentence, entities_dict))
 
-                # --- NEW/FIXED: USE THE UPSERT HELPER FUNCTION ---
-                if save_annotation_to_db(workspace_name, user_email, current_sentence, selected_intent, entities_json):
-                    # Only advance index if save was successful
+                # Buffered: committed in batches by flush_annotation_buffer()
+                st.session_state.annotation_buffer.add(
+                    workspace_name, user_email, current_sentence, selected_intent, entities_json, entity_spans_json
+                )
+                window.set_label(current_sentence, selected_intent, entities_json)
+                if flush_annotation_buffer(only_if_due=True):
                     st.session_state.annotation_index += 1 
                     st.toast(f"Saved: Intent='{selected_intent}'", icon='📝')
                     st.rerun()
-                # --- END FIXED LOGIC ---
 
 
     with col_skip:
@@ -1044,10 +923,10 @@ def show_annotation_page():
             st.rerun()
             
     st.markdown("---")
-    local_cursor = conn.cursor()
-    local_cursor.execute("SELECT COUNT(*) FROM annotations WHERE workspace_name=?", (workspace_name,))
-    total_labeled = local_cursor.fetchone()[0]
-    st.info(f"**Total Labeled Examples Saved in DB:** {total_labeled}")
+    total_labeled = annotation_store.count_annotations(workspace_name)
+    pending = st.session_state.annotation_buffer.pending_count(workspace_name, user_email)
+    pending_note = f" ({pending} more waiting to be saved)" if pending else ""
+    st.info(f"**Total Labeled Examples Saved in DB:** {total_labeled}{pending_note}")
     
     if st.button("← Change Action", key="back_from_annotate"):
         st.session_state.workspace_action = None
@@ -1088,64 +967,62 @@ def show_workspace_page():
         
         st.subheader("1. Upload/Prepare Data")
         
-        local_cursor = conn.cursor()
-        local_cursor.execute("SELECT filename FROM datasets WHERE user_email=? AND workspace_name=?", (user_email, workspace_name))
-        existing_file = local_cursor.fetchone()
-        dataset_is_saved = existing_file is not None # <--- New flag for conditional display
+        existing_dataset = ingestion.find_dataset(workspace_name, user_email)
+        dataset_is_saved = existing_dataset is not None # <--- New flag for conditional display
         
-        if existing_file:
-            st.info(f"Existing Dataset: **{existing_file[0]}** is saved. Uploading a new file will overwrite it.")
+        if existing_dataset:
+            sentence_info = f" ({existing_dataset['sentence_count']} sentences)" if existing_dataset["sentence_count"] is not None else ""
+            st.info(f"Existing Dataset: **{existing_dataset['filename']}**{sentence_info} is saved. Uploading a new file will overwrite it.")
 
         file = st.file_uploader("Upload a CSV dataset", type=["csv"], key="dataset_uploader")
         
         if file is not None:
             try:
-                df = pd.read_csv(file)
+                # Only the first rows are parsed for the preview; saving streams the file in chunks
+                preview_df = pd.read_csv(file, nrows=5)
                 st.subheader("Dataset Preview")
-                st.dataframe(df.head())
-                
-                file_data_bytes = file.getvalue()
+                st.dataframe(preview_df)
                 
                 if st.button(f"Save Data to Workspace", use_container_width=True, type="primary", key="save_data_btn"):
-                    local_cursor_train = conn.cursor()
-                    # Use a proper transaction for DELETE and INSERT
-                    local_cursor_train.execute("DELETE FROM datasets WHERE user_email=? AND workspace_name=?", (user_email, workspace_name))
-                    # Pass file_data_bytes directly, use sqlite3.Binary if needed but raw bytes often work
-                    local_cursor_train.execute("""
-                        INSERT INTO datasets (user_email, workspace_name, filename, data) 
-                        VALUES (?, ?, ?, ?)
-                    """, (user_email, workspace_name, file.name, Binary(file_data_bytes))) 
-                    local_cursor_train.execute("UPDATE workspaces SET last_modified=CURRENT_TIMESTAMP WHERE user_email=? AND workspace_name=?", (user_email, workspace_name))
-                    conn.commit()
+                    file.seek(0)
+                    with st.spinner("Extracting sentences..."):
+                        stats = ingestion.ingest_csv(file, file.name, workspace_name, user_email)
                     
-                    # CRITICAL: Invalidate sentence cache and reset index if new data is uploaded/saved
-                    st.session_state.sentences_df = None 
+                    # CRITICAL: Invalidate the loaded dataset and reset index if new data is uploaded/saved
+                    st.session_state.annotation_dataset = None 
                     st.session_state.annotation_index = 0
-                    st.success(f"✅ Success! Data for **{workspace_name}** saved. Now **Annotate** or **Train**.")
+                    st.success(f"✅ Success! {stats['sentence_count']} distinct sentences from {stats['row_count']} rows saved for **{workspace_name}**. Now **Annotate** or **Train**.")
+                    if not stats["text_column"]:
+                        st.warning("Could not find a 'text', 'sentence', or 'utterance' column in the uploaded dataset. Using all columns as one string.")
                     st.rerun() # Rerun to refresh the success message and clear the file uploader
             except Exception as e:
                 st.error(f"Error processing or saving dataset: {e}")
 
+        show_bulk_annotation_io(workspace_name, user_email)
 
         # --- START OF MODIFIED SECTION 2 ---
         st.subheader("2. Train NLU Model")
         
-        # Check for annotated data before allowing training
-        # Assuming pd.read_sql is available
-        annotated_data = pd.read_sql("SELECT * FROM annotations WHERE user_email=? AND workspace_name=?", conn, params=(user_email, workspace_name))
-        annotation_count = len(annotated_data)
+        # Check for annotated data before allowing training (counter lookup; rows are loaded only to train)
+        annotation_count = annotation_store.count_annotations(workspace_name, user_email)
         
-        if dataset_is_saved:
+        # Imported annotations can be trained on without an uploaded dataset
+        if dataset_is_saved or annotation_count > 0:
             if annotation_count > 0:
                 st.info(f"Ready to train with **{annotation_count}** labeled examples.")
                 
                 # 1. Training Button (Visible if annotations exist)
+                full_retrain = st.checkbox(
+                    "Retrain from scratch", key="full_retrain_checkbox",
+                    help="By default only annotations changed since the last training run are applied to the current model."
+                )
                 if st.button(f"Start Model Training", use_container_width=True, type="primary", key="train_model_btn"):
-                    train_nlu_model(workspace_name, annotated_data)
+                    train_nlu_model(workspace_name, user_email, full_retrain)
+                show_training_job_status(workspace_name)
                     
                 st.markdown("<br>", unsafe_allow_html=True)
                 # 2. Annotation Button (Visible if dataset is saved, even if training is possible)
-                if st.button("Continue Annotation →", use_container_width=True, key="go_to_annotate_continue", type="secondary"):
+                if dataset_is_saved and st.button("Continue Annotation →", use_container_width=True, key="go_to_annotate_continue", type="secondary"):
                     set_workspace_action("Annotate")
                     st.rerun()
 
@@ -1159,35 +1036,44 @@ def show_workspace_page():
             # Dataset not saved. Cannot annotate or train.
             st.warning("Please upload and **Save Data to Workspace** in step 1 before attempting to Annotate or Train.")
         # --- END OF MODIFIED SECTION 2 ---
+
+        st.subheader("3. Keyword Trigger Phrases")
+        st.caption("Used when no model is trained yet, or the model is not confident. Matched on whole words.")
+        show_trigger_phrase_editor(workspace_name, domain)
+
+        st.subheader("4. Entity Types")
+        st.caption("Lookup tables and regular expressions the bot extracts entities with, next to the domain's defaults.")
+        show_entity_editor(workspace_name, domain)
             
     elif action == "Test":
         # --- TEST MODE: Show only Chat Interface ---
         st.subheader("Chat and Test Bot Response")
         with st.container(height=550):
-            display_chat_messages()
+            display_chat_messages(workspace_name)
         handle_chat_input(workspace_name)
+        show_batch_scoring(workspace_name, domain)
         
     elif action == "Evaluate":
         # --- EVALUATE MODE: Show Metrics ---
         st.subheader("Bot Evaluation Metrics")
+        show_training_job_status(workspace_name)
         
-        local_cursor = conn.cursor()
-        local_cursor.execute("SELECT model_engine, model_version, training_date FROM models WHERE workspace_name=?", (workspace_name,))
-        model_meta = local_cursor.fetchone()
+        model_meta = get_model_meta(workspace_name)
 
         if model_meta:
             st.info(f"**Current Model:** {model_meta[0]} ({model_meta[1]}) trained on {model_meta[2][:10]}")
             st.metric("Last Training Date", f"{model_meta[2][:10]}")
-            st.metric("Test Accuracy (Simulated)", "85%", "4%")
+            show_evaluation_report(workspace_name, user_email, parse_version(model_meta[1]))
             
-            local_cursor.execute("SELECT COUNT(*) FROM annotations WHERE workspace_name=?", (workspace_name,))
-            total_examples = local_cursor.fetchone()[0]
-            st.metric("Total Labeled Examples", f"{total_examples}")
+            label_counts = annotation_store.get_label_counts(workspace_name)
+            st.metric("Total Labeled Examples", f"{sum(label_counts.values())}")
+            if label_counts:
+                st.bar_chart(pd.Series(label_counts, name="examples"))
 
         else:
             st.warning("No model has been trained for this workspace yet. Use the **Upload & Train** page.")
             st.metric("Last Training Date", "N/A")
-            st.metric("Test Accuracy (Simulated)", "N/A")
+            st.metric("Cross-validated Accuracy", "N/A")
 
     else:
         st.error("Invalid action selected. Please navigate back and try again.")
@@ -1198,12 +1084,199 @@ def show_workspace_page():
         st.session_state.current_workspace = None
         st.session_state.current_domain = None
         st.session_state.workspace_action = None
-        st.session_state.messages = [] 
+        st.session_state.chat_window = None
         navigate_to_home()
         st.rerun()
 
-# Note: This requires 'conn', 'DOMAINS', 'navigate_to_home', 'navigate_to_action_choice', 'set_workspace_action', 
-# 'train_nlu_model', 'display_chat_messages', and 'handle_chat_input' to be defined elsewhere in your script.
+def show_bulk_annotation_io(workspace_name, user_email):
+    with st.expander("📦 Bulk Import / Export Labeled Data"):
+        st.caption("Import CSV, JSONL or Parquet rows with a text and an intent column (entities optional). "
+                   "Existing labels for the same sentences are overwritten.")
+        labeled_file = st.file_uploader("Labeled data file", type=["csv", "jsonl", "ndjson", "parquet"], key="labeled_uploader")
+        if labeled_file is not None and st.button("Import Labeled Data", use_container_width=True, key="import_labels_btn"):
+            try:
+                with st.spinner("Importing annotations..."):
+                    stats = annotation_io.import_annotations(labeled_file, labeled_file.name, workspace_name, user_email)
+            except Exception as e:
+                # Chunks imported before the error are kept
+                st.session_state.annotation_window = None
+                st.error(f"Error importing labeled data (rows before the error were imported): {e}")
+            else:
+                # The prefetched annotation window may hold labels the import just replaced
+                st.session_state.annotation_window = None
+                st.success(f"✅ Imported **{stats['imported']}** labeled examples.")
+                if stats["skipped"]:
+                    st.warning(f"⚠️ {stats['skipped']} rows were skipped (missing text or intent, or malformed entities).")
+
+        st.markdown("**Export**")
+        export_format = st.radio("Format", ["JSONL", "Parquet"], horizontal=True, key="export_format_radio")
+        if st.button("Prepare Export", use_container_width=True, key="prepare_export_btn"):
+            out = BytesIO()
+            exporter = annotation_io.export_jsonl if export_format == "JSONL" else annotation_io.export_parquet
+            with st.spinner("Exporting annotations..."):
+                count = exporter(out, workspace_name, user_email)
+            st.session_state.annotation_export = (workspace_name, export_format, count, out.getvalue())
+        export = st.session_state.get("annotation_export")
+        if export and export[0] == workspace_name:
+            _, export_format, count, data = export
+            extension = "jsonl" if export_format == "JSONL" else "parquet"
+            st.download_button(
+                f"⬇️ Download {count} annotations ({export_format})", data, file_name=f"{workspace_name}_annotations.{extension}",
+                mime="application/jsonl" if extension == "jsonl" else "application/octet-stream",
+                use_container_width=True, key="download_export_btn"
+            )
+
+def show_evaluation_report(workspace_name, user_email, version_number):
+    """Shows the stored cross-validation report for the current model version, or offers to compute it."""
+    if version_number is None:
+        st.info("This model was trained before evaluation reports existed. Retrain it to evaluate.")
+        return
+
+    report = evaluation.get_cached_report(workspace_name, version_number)
+    run_label = "Re-run Evaluation" if report else "Run Evaluation"
+    if st.button(run_label, key="run_evaluation_btn", type="secondary" if report else "primary"):
+        with st.spinner(f"⏳ Running {evaluation.K_FOLDS}-fold cross-validation..."):
+            report = evaluation.evaluate_workspace(workspace_name, user_email, refresh=True)
+        if report is None:
+            st.warning("Evaluation needs at least two labeled examples across at least two intents.")
+    if not report:
+        st.metric("Cross-validated Accuracy", "Not evaluated")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Cross-validated Accuracy", f"{report['accuracy']:.1%}")
+    col2.metric("Macro F1", f"{report['macro_f1']:.3f}")
+    col3.metric("Entity F1", f"{report['entities']['f1']:.3f}")
+    st.caption(
+        f"{report['k_folds']}-fold stratified cross-validation on {report['n_examples']} examples "
+        f"(model v{report['model_version']}, {report['elapsed_seconds']:.2f}s)."
+    )
+
+    st.markdown("**Per-intent scores**")
+    st.dataframe(pd.DataFrame(report["per_intent"]).set_index("intent"), use_container_width=True)
+    st.markdown("**Confusion matrix** (rows: annotated intent, columns: predicted intent)")
+    st.dataframe(pd.DataFrame(report["confusion"], index=report["labels"], columns=report["labels"]), use_container_width=True)
+    if report["entities"]["per_entity"]:
+        st.markdown("**Entity scores** (exact type and value matches)")
+        st.dataframe(pd.DataFrame(report["entities"]["per_entity"]).set_index("entity"), use_container_width=True)
+
+def show_trigger_phrase_editor(workspace_name, domain):
+    """Lists and adds the workspace's own keyword trigger phrases."""
+    intents = DOMAINS.get(domain, {}).get("intents", [])
+    existing_phrases = inference.load_trigger_phrases(db.get_connection(), workspace_name)
+
+    with st.expander(f"Custom trigger phrases ({len(existing_phrases)})"):
+        if existing_phrases:
+            st.dataframe(pd.DataFrame(existing_phrases, columns=["intent", "phrase"]), use_container_width=True)
+
+        with st.form(key="trigger_phrase_form", clear_on_submit=True):
+            phrase_intent = st.selectbox("Intent", intents, key="trigger_phrase_intent")
+            phrase_input = st.text_input("Phrases (comma-separated)", key="trigger_phrase_input")
+            if st.form_submit_button("Add Trigger Phrases", use_container_width=True):
+                phrases = [phrase.strip() for phrase in phrase_input.split(",") if phrase.strip()]
+                if not phrases:
+                    st.error("Please enter at least one phrase.")
+                else:
+                    db.execute_many(
+                        "INSERT OR IGNORE INTO trigger_phrases (workspace_name, intent, phrase) VALUES (?, ?, ?)",
+                        [(workspace_name, phrase_intent, phrase) for phrase in phrases]
+                    )
+                    invalidate_intent_matcher(workspace_name)
+                    st.success(f"Added {len(phrases)} phrase(s) for **{phrase_intent}**.")
+
+def show_entity_editor(workspace_name, domain):
+    """Lists, adds and removes the workspace's gazetteer and regex entity types."""
+    entity_types = entities.list_entity_types(workspace_name)
+    default_entries, default_patterns = entities.default_definitions(domain)
+    default_types = sorted({entity_type for entity_type, _ in default_entries} | {entity_type for entity_type, _ in default_patterns})
+
+    with st.expander(f"Custom entity types ({len(entity_types)})"):
+        if default_types:
+            st.caption(f"Domain defaults: {', '.join(default_types)}")
+        if entity_types:
+            st.dataframe(
+                pd.DataFrame([(t, kind, str(detail)) for t, kind, detail in entity_types], columns=["entity", "kind", "entries / pattern"]),
+                use_container_width=True
+            )
+
+        with st.form(key="gazetteer_form", clear_on_submit=True):
+            gazetteer_type = st.text_input("Entity type (e.g. city, product)", key="gazetteer_type_input")
+            gazetteer_text = st.text_area("Entries (one per line)", key="gazetteer_entries_input")
+            gazetteer_file = st.file_uploader("...or a text file with one entry per line", type=["txt", "csv"], key="gazetteer_uploader")
+            if st.form_submit_button("Add Lookup Entries", use_container_width=True):
+                phrases = gazetteer_text.splitlines()
+                if gazetteer_file is not None:
+                    phrases += gazetteer_file.getvalue().decode("utf-8", errors="ignore").splitlines()
+                if not gazetteer_type.strip():
+                    st.error("Please enter an entity type.")
+                else:
+                    added = entities.add_gazetteer_entries(workspace_name, gazetteer_type.strip(), phrases)
+                    if added:
+                        st.success(f"Added {added} entr{'y' if added == 1 else 'ies'} for **{gazetteer_type.strip()}**.")
+                    else:
+                        st.error("Please enter at least one entry.")
+
+        with st.form(key="entity_pattern_form", clear_on_submit=True):
+            builtin_options = ["-- Custom pattern --"] + sorted(entities.BUILTIN_ENTITY_PATTERNS)
+            builtin_choice = st.selectbox("Built-in pattern", builtin_options, key="entity_pattern_builtin")
+            pattern_type = st.text_input("Entity type (defaults to the built-in name)", key="entity_pattern_type")
+            pattern_input = st.text_input("Regular expression (for a custom pattern)", key="entity_pattern_input")
+            if st.form_submit_button("Save Pattern", use_container_width=True):
+                is_builtin = builtin_choice != "-- Custom pattern --"
+                entity_type = pattern_type.strip() or (builtin_choice if is_builtin else "")
+                pattern = entities.BUILTIN_ENTITY_PATTERNS[builtin_choice] if is_builtin else pattern_input.strip()
+                if not entity_type or not pattern:
+                    st.error("Please enter an entity type and a pattern.")
+                else:
+                    try:
+                        entities.set_entity_pattern(workspace_name, entity_type, pattern)
+                        st.success(f"Saved pattern for **{entity_type}**.")
+                    except ValueError as e:
+                        st.error(str(e))
+
+        if entity_types:
+            col_type, col_delete = st.columns([3, 1])
+            with col_type:
+                delete_type = st.selectbox("Entity type", sorted({row[0] for row in entity_types}), key="delete_entity_type_select")
+            with col_delete:
+                if st.button("Delete", use_container_width=True, key="delete_entity_type_btn"):
+                    entities.delete_entity_type(workspace_name, delete_type)
+                    st.rerun()
+
+# ==============================
+# PERFORMANCE PAGE (ADMIN ONLY)
+# ==============================
+def is_admin(user_email):
+    return bool(user_email) and user_email.lower() in ADMIN_EMAILS
+
+def show_performance_page():
+    st.markdown("<div class='title'>📊 Performance</div>", unsafe_allow_html=True)
+    if not is_admin(st.session_state.logged_in_email):
+        st.error("⚠️ The Performance page is only available to administrators.")
+        return
+
+    st.caption("Timing histograms for this server process since it started (or since the last reset), slowest total first.")
+    rows = perf.snapshot()
+    if rows:
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+    else:
+        st.info("No timings recorded yet.")
+
+    st.markdown("#### Caches")
+    st.dataframe(pd.DataFrame(perf.cache_snapshot()), use_container_width=True, hide_index=True)
+
+    metrics_text = perf.prometheus_text()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.download_button("⬇️ Download Prometheus Export", metrics_text, file_name="metrics.txt", mime="text/plain", use_container_width=True)
+    with col2:
+        if st.button("♻️ Reset Timings", key="reset_perf_btn", use_container_width=True):
+            perf.reset()
+            st.rerun()
+    with col3:
+        st.button("← Back to Home", key="perf_back_home_btn", use_container_width=True, on_click=navigate_to_home)
+    with st.expander("Prometheus text export"):
+        st.code(metrics_text, language="text")
 
 # ==============================
 # AUTH & REGISTRATION PAGES
@@ -1223,17 +1296,19 @@ def show_register_page():
         agree = st.checkbox("I confirm I have read and agree to the policy.", key="register_agree_checkbox")
 
         if st.form_submit_button("Sign Up", type="primary", use_container_width=True):
-            local_cursor = conn.cursor()
             if name and email and password and agree:
-                hashed_pw = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
                 try:
-                    local_cursor.execute("INSERT INTO users (name, email, password) VALUES (?, ?, ?)", (name, email, hashed_pw))
-                    conn.commit()
+                    # Sign-ups share the login throttle and the bounded hashing pool
+                    auth.check_attempt(email, client_ip())
+                    hashed_pw = auth.hash_password(password)
+                    db.execute("INSERT INTO users (name, email, password) VALUES (?, ?, ?)", (name, email, hashed_pw))
                     st.success("🎉 Registration successful! Please login.")
                     navigate_to_login()
                     st.rerun()
                 except sqlite3.IntegrityError:
                     st.error("⚠️ Email already exists.")
+                except (auth.AuthThrottled, auth.AuthBusy) as e:
+                    st.error(f"⚠️ {e}")
             else:
                 st.warning("⚠️ Fill all fields and confirm agreement to terms to continue.")
 
@@ -1251,17 +1326,21 @@ def show_login_page():
         password = st.text_input("Enter your password", type="password", key="log_password")
 
         if st.form_submit_button("Sign In", type="primary", use_container_width=True):
-            local_cursor = conn.cursor()
-            local_cursor.execute("SELECT password, email FROM users WHERE email=?", (email,))
-            user_data = local_cursor.fetchone()
-            
-            if user_data and bcrypt.checkpw(password.encode('utf-8'), user_data[0]):
-                st.success("✅ Login successful! Redirecting to Home...")
-                st.session_state.logged_in_email = user_data[1] 
-                navigate_to_home() 
-                st.rerun()
+            try:
+                # Throttled per email and IP; the bcrypt check runs on the hashing pool
+                logged_in_email = auth.authenticate(email, password, client_ip())
+            except (auth.AuthThrottled, auth.AuthBusy) as e:
+                st.error(f"⚠️ {e}")
             else:
-                st.error("❌ Invalid email or password.")
+                if logged_in_email:
+                    st.success("✅ Login successful! Redirecting to Home...")
+                    st.session_state.logged_in_email = logged_in_email 
+                    # Keeps the login across browser reloads (see sessions.py)
+                    st.query_params[sessions.SESSION_QUERY_PARAM] = sessions.create_session(logged_in_email)
+                    navigate_to_home() 
+                    st.rerun()
+                else:
+                    st.error("❌ Invalid email or password.")
 
     st.markdown('<div style="text-align:center;">Don\'t have an account?</div>', unsafe_allow_html=True)
     if st.button("Sign Up", use_container_width=True, key="go_to_register_btn"):
@@ -1300,35 +1379,47 @@ def show_policy_page():
 # CALL SIDEBAR ONCE HERE - IT WILL RUN ON EVERY PAGE EXCEPT 'register'
 show_sidebar_content()
 
-if st.session_state.page == 'workspace':
-    show_workspace_page()
-elif st.session_state.page == 'annotate': 
-    show_annotation_page()
-elif st.session_state.page == 'action_choice':
-    show_action_choice_page()
-elif st.session_state.page == 'home':
-    show_home_page()
-elif st.session_state.page == 'create_workspace':
-    show_create_workspace_page()
-else:
-    # Landing page for Register/Login/Policy
-    col1, col2 = st.columns([1.2, 1])
-
-    with col1:
-        st.markdown('<div class="logo-container"><img src="https://cdn-icons-png.flaticon.com/512/4712/4712100.png" width="150"></div>', unsafe_allow_html=True)
-        st.markdown("""
-            <div class='chat-bubble-container'>
-                <div class='chat-bubble'>Hello, can you help me?</div><br>
-                <div class='chat-bubble'>Of course! Buddy is ready to assist.</div>
-            </div>
-        """, unsafe_allow_html=True)
+# Buffered annotations are committed as soon as the annotator leaves the annotation page
+if st.session_state.page != 'annotate':
+    flush_annotation_buffer()
+
+# Timed in a finally block: st.rerun() ends a run by raising
+_rendered_page = st.session_state.page
+try:
+    with perf.span("page_render", page=_rendered_page):
+        if st.session_state.page == 'workspace':
+            show_workspace_page()
+        elif st.session_state.page == 'annotate': 
+            show_annotation_page()
+        elif st.session_state.page == 'action_choice':
+            show_action_choice_page()
+        elif st.session_state.page == 'home':
+            show_home_page()
+        elif st.session_state.page == 'create_workspace':
+            show_create_workspace_page()
+        elif st.session_state.page == 'performance':
+            show_performance_page()
+        else:
+            # Landing page for Register/Login/Policy
+            col1, col2 = st.columns([1.2, 1])
+
+            with col1:
+                st.markdown('<div class="logo-container"><img src="https://cdn-icons-png.flaticon.com/512/4712/4712100.png" width="150"></div>', unsafe_allow_html=True)
+                st.markdown("""
+                    <div class='chat-bubble-container'>
+                        <div class='chat-bubble'>Hello, can you help me?</div><br>
+                        <div class='chat-bubble'>Of course! Buddy is ready to assist.</div>
+                    </div>
+                """, unsafe_allow_html=True)
 
-    with col2:
-        st.markdown("<div class='main-card'>", unsafe_allow_html=True)
-        if st.session_state.page == 'register':
-            show_register_page()
-        elif st.session_state.page == 'login':
-            show_login_page()
-        elif st.session_state.page == 'policy':
-            show_policy_page() 
-        st.markdown("</div>", unsafe_allow_html=True)
\ No newline at end of file
+            with col2:
+                st.markdown("<div class='main-card'>", unsafe_allow_html=True)
+                if st.session_state.page == 'register':
+                    show_register_page()
+                elif st.session_state.page == 'login':
+                    show_login_page()
+                elif st.session_state.page == 'policy':
+                    show_policy_page() 
+                st.markdown("</div>", unsafe_allow_html=True)
+finally:
+    perf.observe("rerun", time.perf_counter() - _rerun_started, page=_rendered_page)
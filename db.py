@@ -0,0 +1,150 @@
+"""
+SQLite data access layer for BuddyBot.
+
+Each thread gets its own connection, leased from a small pool of tuned
+connections (WAL journaling, NORMAL sync, a larger page cache), so sessions
+never share cursors or interleave transactions. Streamlit runs every rerun on
+a fresh thread; when that thread ends its connection goes back to the pool
+instead of being reopened on the next rerun.
+
+The helpers below execute parameterized statements, which sqlite3 keeps in
+each connection's prepared-statement cache.
+"""
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+
+import perf
+
+DB_PATH = "users.db"
+POOL_MAX_IDLE = 8
+STATEMENT_CACHE_SIZE = 256
+BUSY_TIMEOUT_SECONDS = 5.0
+
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",      # readers no longer block behind the writer
+    "PRAGMA synchronous=NORMAL",    # durable at checkpoints; safe with WAL
+    "PRAGMA cache_size=-16000",     # ~16 MB page cache per connection
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA recursive_triggers=ON", # REPLACE deletes fire triggers, keeping annotation_counts exact
+)
+
+def configure(db_path):
+    """Points the data access layer at a different database file (CLI tools, servers)."""
+    global DB_PATH, _pool
+    DB_PATH = db_path
+    _pool = ConnectionPool(db_path)
+
+def connect(db_path=None):
+    """Opens a new, tuned connection. Most callers want get_connection() instead."""
+    conn = sqlite3.connect(
+        db_path or DB_PATH,
+        timeout=BUSY_TIMEOUT_SECONDS,
+        check_same_thread=False,  # pooled connections move between threads, but only one uses them at a time
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+class ConnectionPool:
+    """Keeps up to max_idle open connections for reuse by later threads."""
+
+    def __init__(self, db_path, max_idle=POOL_MAX_IDLE):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return connect(self.db_path)
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+class _Lease:
+    """Thread-local holder; when the thread ends, the lease is collected and the connection released."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.conn = pool.acquire()
+        self.transaction_depth = 0
+        weakref.finalize(self, pool.release, self.conn)
+
+_pool = ConnectionPool(DB_PATH)
+_local = threading.local()
+
+def _lease():
+    lease = getattr(_local, "lease", None)
+    if lease is None or lease.pool is not _pool:
+        lease = _local.lease = _Lease(_pool)
+    return lease
+
+def get_connection():
+    """Returns the calling thread's connection."""
+    return _lease().conn
+
+# ==============================
+# STATEMENT HELPERS
+# ==============================
+
+@contextmanager
+def transaction():
+    """
+    Runs the enclosed statements as one write transaction (BEGIN IMMEDIATE), committing on success.
+    Nested uses join the outer transaction.
+    """
+    lease = _lease()
+    conn = lease.conn
+    if lease.transaction_depth == 0:
+        # Waiting here means another connection holds the write lock
+        with perf.span("db_query", op="begin_immediate"):
+            conn.execute("BEGIN IMMEDIATE")
+    lease.transaction_depth += 1
+    try:
+        yield conn
+    except BaseException:
+        lease.transaction_depth -= 1
+        if lease.transaction_depth == 0:
+            conn.rollback()
+        raise
+    lease.transaction_depth -= 1
+    if lease.transaction_depth == 0:
+        conn.commit()
+
+def fetch_one(sql, params=()):
+    with perf.span("db_query", op="fetch_one"):
+        return get_connection().execute(sql, params).fetchone()
+
+def fetch_all(sql, params=()):
+    with perf.span("db_query", op="fetch_all"):
+        return get_connection().execute(sql, params).fetchall()
+
+def fetch_value(sql, params=(), default=None):
+    """Returns the first column of the first row, or default."""
+    row = fetch_one(sql, params)
+    return row[0] if row else default
+
+def execute(sql, params=()):
+    """Executes one write statement in its own transaction (or the enclosing one). Returns the cursor."""
+    with perf.span("db_query", op="execute"), transaction() as conn:
+        return conn.execute(sql, params)
+
+def execute_many(sql, rows):
+    """Executes a write statement for every parameter tuple in a single transaction."""
+    with perf.span("db_query", op="execute_many"), transaction() as conn:
+        return conn.executemany(sql, rows)
@@ -0,0 +1,160 @@
+"""
+Domain catalogue for BuddyBot workspaces: display data, intents and keyword trigger phrases.
+"""
+
+# ==============================
+# DOMAIN DATA & NLU INTENTS
+# ==============================
+DOMAINS = {
+    "Sports": {
+        "icon": "⚽",
+        "description": "Analyze team stats, game history, and player performance.",
+        "intents": ["request_score", "query_player_stat", "book_ticket", "greeting"]
+    },
+    "Education": {
+        "icon": "📚",
+        "description": "Create learning assistants from textbooks, notes, or research papers.",
+        "intents": ["query_definition", "request_summary", "schedule_study", "greeting"]
+    },
+    "Art & Design": {
+        "icon": "🎨",
+        "description": "Interpret artistic styles, history, or design principles.",
+        "intents": ["query_artist", "describe_style", "find_gallery", "greeting"]
+    },
+    "Entertainment": {
+        "icon": "🎬",
+        "description": "Discuss movies, music, celebrities, and pop culture trends.",
+        "intents": ["recommend_movie", "query_actor", "buy_merch", "greeting"]
+    },
+    "Finance": {
+        "icon": "💰",
+        "description": "Manage bank account queries, fund transfers, and fraud reporting.",
+        "intents": ["query_balance", "transfer_funds", "report_fraud", "greeting"]
+    },
+    "Travel & Booking": {
+        "icon": "✈️",
+        "description": "Handle flight, hotel, and general ticket reservations and inquiries.",
+        "intents": ["book_flight", "check_inquiry", "cancel_reservation", "greeting"]
+    },
+    "Business": {
+        "icon": "💼",
+        "description": "Handle general customer FAQs, submit help desk tickets, or analyze operations.",
+        "intents": ["query_hours", "submit_complaint", "request_report", "greeting"]
+    },
+    "Healthcare": {
+        "icon": "🏥",
+        "description": "Provide information on symptoms, book appointments, or answer medical FAQs.",
+        "intents": ["book_appointment", "query_symptom", "refill_prescription", "greeting"]
+    },
+    "IT Support": {
+        "icon": "💻",
+        "description": "Assist with troubleshooting, password resets, and software installation guides.",
+        "intents": ["reset_password", "troubleshoot_login", "request_software", "greeting"]
+    },
+    "Real Estate": {
+        "icon": "🏠",
+        "description": "Search property listings, schedule viewings, and answer mortgage questions.",
+        "intents": ["search_property", "schedule_viewing", "query_mortgage", "greeting"]
+    },
+    "E-commerce": {
+        "icon": "🛒",
+        "description": "Track orders, process returns, and handle product inventory questions.",
+        "intents": ["track_order", "process_return", "query_inventory", "greeting"]
+    }
+}
+
+# ==============================
+# KEYWORD TRIGGER PHRASES
+# ==============================
+# Declarative rule table used by intent_rules. Every intent also triggers on its own
+# name with underscores as spaces (e.g. "book_flight" -> "book flight"); the phrases
+# below add the common wordings. Workspaces can extend these with their own phrases.
+
+GLOBAL_TRIGGER_PHRASES = {
+    "greeting": ["hello", "hi", "hey", "good morning", "good afternoon", "good evening"],
+    "meta_query_training": ["trained the model"],
+}
+
+DOMAIN_TRIGGER_PHRASES = {
+    "Sports": {
+        "request_score": ["score", "final score", "who won", "result of the game"],
+        "query_player_stat": ["stats", "statistics", "how many goals", "player stats"],
+        "book_ticket": ["book", "ticket", "tickets", "seats"],
+    },
+    "Education": {
+        "query_definition": ["define", "definition", "what is", "meaning of"],
+        "request_summary": ["summary", "summarize", "overview"],
+        "schedule_study": ["schedule", "study plan", "study session", "remind me to study"],
+    },
+    "Art & Design": {
+        "query_artist": ["artist", "painter", "who painted"],
+        "describe_style": ["style", "describe", "movement"],
+        "find_gallery": ["gallery", "museum", "exhibition"],
+    },
+    "Entertainment": {
+        "recommend_movie": ["recommend", "movie", "film", "what should i watch"],
+        "query_actor": ["actor", "actress", "who starred", "cast"],
+        "buy_merch": ["merch", "merchandise", "buy", "shirt", "poster"],
+    },
+    "Finance": {
+        "query_balance": ["balance", "how much", "account balance"],
+        "transfer_funds": ["transfer", "send money", "pay", "wire"],
+        "report_fraud": ["fraud", "stolen", "unauthorized", "suspicious"],
+    },
+    "Travel & Booking": {
+        "book_flight": ["book", "flight", "plane", "ticket", "tickets", "reservation"],
+        "check_inquiry": ["check", "status", "inquiry", "is my flight"],
+        "cancel_reservation": ["cancel", "cancel my reservation", "cancel my booking"],
+    },
+    "Business": {
+        "query_hours": ["hours", "open", "opening hours", "when do you close"],
+        "submit_complaint": ["complaint", "complain", "not happy", "problem with"],
+        "request_report": ["report", "analysis", "sales report"],
+    },
+    "Healthcare": {
+        "book_appointment": ["appointment", "book", "see a doctor", "schedule a visit"],
+        "query_symptom": ["symptom", "symptoms", "pain", "fever", "headache"],
+        "refill_prescription": ["refill", "prescription", "medication"],
+    },
+    "IT Support": {
+        "reset_password": ["password", "reset", "forgot my password"],
+        "troubleshoot_login": ["login", "log in", "troubleshoot", "cannot sign in"],
+        "request_software": ["install", "software", "license"],
+    },
+    "Real Estate": {
+        "search_property": ["property", "house", "apartment", "listing", "for sale"],
+        "schedule_viewing": ["viewing", "visit", "tour", "see the house"],
+        "query_mortgage": ["mortgage", "loan", "interest rate", "down payment"],
+    },
+    "E-commerce": {
+        "track_order": ["track", "where is my order", "order status", "delivery"],
+        "process_return": ["return", "refund", "exchange"],
+        "query_inventory": ["in stock", "available", "inventory"],
+    },
+}
+
+# ==============================
+# DEFAULT ENTITY TYPES
+# ==============================
+# Gazetteers and built-in regex entity types (see entities.BUILTIN_ENTITY_PATTERNS) every
+# workspace of a domain starts with. Workspaces add their own on the Train page.
+
+DOMAIN_GAZETTEERS = {
+    "Travel & Booking": {
+        "city": [
+            "Paris", "London", "New York", "Tokyo", "Rome", "Berlin", "Madrid", "Barcelona", "Amsterdam",
+            "Dubai", "Singapore", "Hong Kong", "Bangkok", "Sydney", "Los Angeles", "San Francisco",
+            "Chicago", "Toronto", "Mumbai", "Delhi", "Chennai", "Bangalore", "Istanbul", "Lisbon",
+            "Vienna", "Prague", "Zurich", "Cairo", "Cape Town", "Rio de Janeiro", "Mexico City", "Seoul",
+        ],
+    },
+}
+
+DOMAIN_ENTITY_PATTERNS = {
+    "Finance": ["money", "percent"],
+    "Travel & Booking": ["date", "time"],
+    "E-commerce": ["money"],
+    "IT Support": ["email"],
+    "Healthcare": ["date", "time"],
+    "Real Estate": ["money"],
+}
@@ -0,0 +1,221 @@
+"""
+Entity extraction with gazetteers, regex entity types and character offsets.
+
+A workspace's gazetteer entries (lookup tables such as city or product lists,
+plus its domain's defaults from domains.py) are compiled into one token-level
+Aho-Corasick automaton (phrase_matcher.PhraseMatcher), so extraction is a
+single pass over the utterance however many entries the tables hold. Regex
+entity types (built-in ones such as email or money, or a workspace's own
+patterns) run next to it. Where candidates overlap, the longest span wins.
+
+Spans are dicts {"entity", "value", "start", "end"}. Annotations keep them in
+entity_spans_json next to the flat {entity: value} summary in entities_json,
+which training, evaluation and the UI read.
+
+Compiled extractors are cached per domain and workspace; the storage helpers
+below drop a workspace's extractor (and its stale pre-labels) when its entity
+definitions change.
+"""
+import bisect
+import json
+import re
+
+import db
+import perf
+from cache import BoundedLRUCache
+from domains import DOMAIN_ENTITY_PATTERNS, DOMAIN_GAZETTEERS
+from phrase_matcher import PhraseMatcher
+from prediction_cache import invalidate_predictions
+
+BUILTIN_ENTITY_PATTERNS = {
+    "email": r"\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b",
+    "money": r"[$€£₹]\s?\d[\d,]*(?:\.\d+)?|\b\d[\d,]*(?:\.\d+)?\s?(?:usd|eur|gbp|inr|dollars?|euros?|pounds?|rupees?)\b",
+    "percent": r"\b\d+(?:\.\d+)?\s?(?:%|percent\b)",
+    "date": r"\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}[/.]\d{1,2}[/.]\d{2,4}\b|\b(?:today|tomorrow|tonight|yesterday)\b",
+    "time": r"\b\d{1,2}(?::\d{2})?\s?(?:am|pm|a\.m\.|p\.m\.)|\b\d{1,2}:\d{2}\b",
+    "phone": r"\+?\d[\d -]{7,}\d\b",
+    "number": r"\b\d+(?:\.\d+)?\b",
+}
+
+EXTRACTOR_CACHE = BoundedLRUCache(max_entries=64)
+perf.register_cache("entity_extractor", EXTRACTOR_CACHE)
+
+def compile_pattern(pattern):
+    """Compiles an entity regex case-insensitively, raising ValueError for an invalid one."""
+    try:
+        return re.compile(pattern, re.IGNORECASE)
+    except re.error as e:
+        raise ValueError(f"Invalid regular expression: {e}")
+
+class EntityExtractor:
+    """Gazetteer automaton plus regex entity types; extract() returns non-overlapping spans."""
+
+    def __init__(self, gazetteer_entries=(), patterns=()):
+        """gazetteer_entries: (entity_type, phrase) pairs. patterns: (entity_type, regex) pairs."""
+        gazetteer_entries = list(gazetteer_entries)
+        self._matcher = PhraseMatcher()
+        for entity_type, phrase in gazetteer_entries:
+            self._matcher.add(phrase, entity_type)
+        self._matcher.compile()
+        self._patterns = [(entity_type, compile_pattern(pattern)) for entity_type, pattern in patterns]
+        self.entity_types = sorted(
+            {entity_type for entity_type, _ in gazetteer_entries} | {entity_type for entity_type, _ in self._patterns}
+        )
+
+    def extract(self, text):
+        """Returns [{"entity", "value", "start", "end"}] in text order; overlaps go to the longest span."""
+        text = str(text)
+        candidates = [(start, end, entity_type, phrase) for start, end, phrase, entity_type in self._matcher.find(text)]
+        for entity_type, regex in self._patterns:
+            for match in regex.finditer(text):
+                if match.end() > match.start():
+                    candidates.append((match.start(), match.end(), entity_type, match.group()))
+        if not candidates:
+            return []
+
+        # Longest first, then leftmost; accepted spans are kept sorted for the overlap check
+        candidates.sort(key=lambda c: (c[0] - c[1], c[0]))
+        starts, ends, accepted = [], [], []
+        for start, end, entity_type, value in candidates:
+            i = bisect.bisect_left(starts, start)
+            if (i < len(starts) and starts[i] < end) or (i > 0 and ends[i - 1] > start):
+                continue
+            starts.insert(i, start)
+            ends.insert(i, end)
+            accepted.insert(i, {"entity": entity_type, "value": value, "start": start, "end": end})
+        return accepted
+
+    def extract_json(self, text):
+        """Returns (entities_json, entity_spans_json) for a text."""
+        spans = self.extract(text)
+        return json.dumps(spans_to_entities(spans)), json.dumps(spans)
+
+def spans_to_entities(spans):
+    """Flat {entity: value} summary of spans (the first occurrence of each entity type)."""
+    entities = {}
+    for span in spans:
+        entities.setdefault(span["entity"], span["value"])
+    return entities
+
+def locate_spans(sentence, entities):
+    """
+    Builds spans for a flat {entity: value} dict by finding each value in the sentence (case-insensitive).
+    Values that do not occur in the sentence get start/end None.
+    """
+    lowered = str(sentence).lower()
+    spans = []
+    for entity_type, value in entities.items():
+        value = str(value)
+        start = lowered.find(value.lower()) if value else -1
+        spans.append({
+            "entity": entity_type,
+            "value": value,
+            "start": start if start >= 0 else None,
+            "end": start + len(value) if start >= 0 else None,
+        })
+    return spans
+
+def spans_json_for(sentence, entities_json):
+    """entity_spans_json for an annotation that only has the flat entities_json."""
+    try:
+        entities = json.loads(entities_json) if entities_json else {}
+    except ValueError:
+        return None
+    return json.dumps(locate_spans(sentence, entities)) if isinstance(entities, dict) else None
+
+# ==============================
+# PER-WORKSPACE EXTRACTORS
+# ==============================
+
+def default_definitions(domain):
+    """The domain's default (gazetteer entries, patterns) from domains.py."""
+    entries = [
+        (entity_type, phrase)
+        for entity_type, phrases in DOMAIN_GAZETTEERS.get(domain, {}).items() for phrase in phrases
+    ]
+    patterns = [(name, BUILTIN_ENTITY_PATTERNS[name]) for name in DOMAIN_ENTITY_PATTERNS.get(domain, [])]
+    return entries, patterns
+
+def load_entity_definitions(workspace_name):
+    """Returns the workspace's own (gazetteer entries, patterns)."""
+    entries = db.fetch_all("SELECT entity_type, phrase FROM gazetteer_entries WHERE workspace_name=?", (workspace_name,))
+    patterns = db.fetch_all(
+        "SELECT entity_type, pattern FROM entity_patterns WHERE workspace_name=? ORDER BY entity_type", (workspace_name,)
+    )
+    return entries, patterns
+
+def build_extractor(domain, workspace_name=None):
+    entries, patterns = default_definitions(domain)
+    if workspace_name:
+        workspace_entries, workspace_patterns = load_entity_definitions(workspace_name)
+        entries += workspace_entries
+        # A workspace pattern replaces a default one of the same entity type
+        overridden = {entity_type for entity_type, _ in workspace_patterns}
+        patterns = [p for p in patterns if p[0] not in overridden] + list(workspace_patterns)
+    return EntityExtractor(entries, patterns)
+
+def get_entity_extractor(domain, workspace_name=None, rules_version=0):
+    """
+    Returns the cached compiled extractor for a domain/workspace at a rules version (see migrations.py),
+    building it on first use. Extractors for other versions are dropped when a new one is built.
+    """
+    key = (domain, workspace_name, rules_version)
+
+    def load():
+        EXTRACTOR_CACHE.discard_where(lambda k: k[:2] == key[:2] and k != key)
+        return build_extractor(domain, workspace_name)
+
+    return EXTRACTOR_CACHE.get_or_load(key, load)
+
+def invalidate_entity_extractor(workspace_name):
+    """
+    Drops the workspace's cached extractor, plus its cached predictions, pre-labels and stored evaluation report,
+    whose entities came from the old definitions.
+    """
+    EXTRACTOR_CACHE.discard_where(lambda key: key[1] == workspace_name)
+    invalidate_predictions(workspace_name)
+    with db.transaction() as conn:
+        conn.execute(
+            "DELETE FROM prelabels WHERE dataset_id IN (SELECT id FROM datasets WHERE workspace_name=?)", (workspace_name,)
+        )
+        conn.execute("DELETE FROM evaluations WHERE workspace_name=?", (workspace_name,))
+
+# ==============================
+# DEFINITION STORAGE
+# ==============================
+
+def add_gazetteer_entries(workspace_name, entity_type, phrases):
+    """Adds lookup-table entries for an entity type (duplicates ignored). Returns the number of phrases given."""
+    rows = [(workspace_name, entity_type, phrase.strip()) for phrase in phrases if phrase and phrase.strip()]
+    db.execute_many(
+        "INSERT OR IGNORE INTO gazetteer_entries (workspace_name, entity_type, phrase) VALUES (?, ?, ?)", rows
+    )
+    invalidate_entity_extractor(workspace_name)
+    return len(rows)
+
+def set_entity_pattern(workspace_name, entity_type, pattern):
+    """Defines (or replaces) a regex entity type; raises ValueError for an invalid expression."""
+    compile_pattern(pattern)
+    db.execute(
+        """INSERT INTO entity_patterns (workspace_name, entity_type, pattern) VALUES (?, ?, ?)
+           ON CONFLICT(workspace_name, entity_type) DO UPDATE SET pattern = excluded.pattern""",
+        (workspace_name, entity_type, pattern)
+    )
+    invalidate_entity_extractor(workspace_name)
+
+def delete_entity_type(workspace_name, entity_type):
+    """Removes a workspace's gazetteer entries and pattern for an entity type."""
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM gazetteer_entries WHERE workspace_name=? AND entity_type=?", (workspace_name, entity_type))
+        conn.execute("DELETE FROM entity_patterns WHERE workspace_name=? AND entity_type=?", (workspace_name, entity_type))
+    invalidate_entity_extractor(workspace_name)
+
+def list_entity_types(workspace_name):
+    """Returns [(entity_type, kind, entry count or pattern)] for the workspace's own definitions."""
+    return db.fetch_all(
+        """SELECT entity_type, 'gazetteer', COUNT(*) FROM gazetteer_entries WHERE workspace_name=? GROUP BY entity_type
+           UNION ALL
+           SELECT entity_type, 'regex', pattern FROM entity_patterns WHERE workspace_name=?
+           ORDER BY 1""",
+        (workspace_name, workspace_name)
+    )
@@ -0,0 +1,207 @@
+"""
+Model evaluation by stratified k-fold cross-validation.
+
+Naive Bayes counts are additive, so the folds never need k separate
+trainings: each fold's examples are counted once, and the model for fold f
+is simply (all counts - fold f's counts). Counting and scoring the folds are
+spread over the training worker pool for large workspaces.
+
+Reports hold accuracy, macro F1, a per-intent precision/recall/F1 table, a
+confusion matrix and entity-level scores (exact type + value matches between
+the annotated entities and the workspace's entity extractor's output).
+They are stored in the evaluations table per workspace and model version, so
+reopening the Evaluate page only reads the stored report.
+"""
+import json
+import time
+
+import numpy as np
+
+import db
+import inference
+import perf
+from model_store import get_current_version
+from nlu_engine import N_FEATURES, HashedIntentClassifier, count_features
+from training import MAX_TRAINING_WORKERS, PARALLEL_MIN_EXAMPLES, get_training_pool
+
+K_FOLDS = 5
+FOLD_SEED = 13
+
+# ==============================
+# FOLDS
+# ==============================
+
+def stratified_folds(y, k=K_FOLDS, seed=FOLD_SEED):
+    """Assigns every example a fold 0..k-1 so that each intent is spread evenly across folds."""
+    rng = np.random.default_rng(seed)
+    folds = np.empty(len(y), dtype=np.int64)
+    for label in np.unique(y):
+        members = rng.permutation(np.flatnonzero(y == label))
+        # Start each intent's round-robin at a random fold so small intents don't all land in fold 0
+        folds[members] = (np.arange(len(members)) + rng.integers(k)) % k
+    return folds
+
+def _count_fold(texts, y, n_classes):
+    return count_features(texts, y, n_classes, N_FEATURES)
+
+def _predict_fold(texts, feature_counts, class_counts):
+    model = HashedIntentClassifier.from_counts(range(len(class_counts)), feature_counts, class_counts)
+    return model.predict_proba(texts).argmax(axis=1)
+
+def cross_validate(texts, y, n_classes, k=K_FOLDS):
+    """Returns out-of-fold predicted label indices for every example."""
+    folds = stratified_folds(y, k)
+    fold_members = [np.flatnonzero(folds == f) for f in range(k)]
+    fold_texts = [[texts[i] for i in members] for members in fold_members]
+    parallel = MAX_TRAINING_WORKERS > 1 and len(texts) >= PARALLEL_MIN_EXAMPLES
+    pool = get_training_pool() if parallel else None
+
+    def run(fn, argument_lists):
+        if pool is None:
+            return [fn(*arguments) for arguments in argument_lists]
+        return list(pool.map(fn, *zip(*argument_lists)))
+
+    fold_counts = run(_count_fold, [(fold_texts[f], y[fold_members[f]], n_classes) for f in range(k)])
+    total_features = sum(counts[0] for counts in fold_counts)
+    total_classes = sum(counts[1] for counts in fold_counts)
+
+    jobs = []
+    for f in range(k):
+        train_classes = total_classes - fold_counts[f][1]
+        # An intent with no training examples in this fold would get log(0) priors; +1 keeps it scorable
+        train_classes = np.maximum(train_classes, 1.0)
+        jobs.append((fold_texts[f], total_features - fold_counts[f][0], train_classes))
+    predicted = np.empty(len(texts), dtype=np.int64)
+    for members, fold_predictions in zip(fold_members, run(_predict_fold, jobs)):
+        predicted[members] = fold_predictions
+    return predicted
+
+# ==============================
+# METRICS
+# ==============================
+
+def _prf(true_positive, predicted_total, actual_total):
+    precision = true_positive / predicted_total if predicted_total else 0.0
+    recall = true_positive / actual_total if actual_total else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return round(precision, 4), round(recall, 4), round(f1, 4)
+
+def intent_metrics(labels, y, predicted):
+    """Returns (accuracy, macro_f1, per-intent rows, confusion matrix as nested lists)."""
+    n_classes = len(labels)
+    confusion = np.bincount(y * n_classes + predicted, minlength=n_classes * n_classes).reshape(n_classes, n_classes)
+    rows = []
+    for i, label in enumerate(labels):
+        precision, recall, f1 = _prf(int(confusion[i, i]), int(confusion[:, i].sum()), int(confusion[i].sum()))
+        rows.append({"intent": label, "precision": precision, "recall": recall, "f1": f1,
+                     "support": int(confusion[i].sum())})
+    accuracy = float(np.trace(confusion) / max(len(y), 1))
+    macro_f1 = float(np.mean([row["f1"] for row in rows])) if rows else 0.0
+    return round(accuracy, 4), round(macro_f1, 4), rows, confusion.tolist()
+
+def _entity_pairs(entities_json):
+    try:
+        entities = json.loads(entities_json) if entities_json else {}
+    except ValueError:
+        return set()
+    if not isinstance(entities, dict):
+        return set()
+    return {(str(name).strip().lower(), str(value).strip().lower()) for name, value in entities.items()}
+
+def entity_metrics(texts, gold_entities, extractor):
+    """Entity-level precision/recall/F1 overall and per entity type, on exact (type, value) matches."""
+    counts = {}  # type -> [true_positive, predicted, actual]
+    for text, gold_json in zip(texts, gold_entities):
+        gold = _entity_pairs(gold_json)
+        predicted = _entity_pairs(extractor.extract_json(text)[0])
+        for name, _ in gold | predicted:
+            counts.setdefault(name, [0, 0, 0])
+        for name, _ in gold & predicted:
+            counts[name][0] += 1
+        for name, _ in predicted:
+            counts[name][1] += 1
+        for name, _ in gold:
+            counts[name][2] += 1
+    rows = []
+    for name in sorted(counts):
+        precision, recall, f1 = _prf(*counts[name])
+        rows.append({"entity": name, "precision": precision, "recall": recall, "f1": f1, "support": counts[name][2]})
+    totals = [sum(column) for column in zip(*counts.values())] if counts else [0, 0, 0]
+    precision, recall, f1 = _prf(*totals)
+    return {"precision": precision, "recall": recall, "f1": f1, "per_entity": rows}
+
+# ==============================
+# REPORTS
+# ==============================
+
+@perf.timed("evaluation")
+def evaluate_examples(texts, intents, entities_json, extractor, k=K_FOLDS):
+    """
+    Cross-validates the classifier on labeled examples and scores the entity extractor against their
+    annotated entities. Returns the report dict (None if too few examples).
+    """
+    labels = sorted(set(intents))
+    if len(texts) < 2 or len(labels) < 2:
+        return None
+    k = min(k, len(texts))
+    start = time.perf_counter()
+    label_index = {label: i for i, label in enumerate(labels)}
+    y = np.fromiter((label_index[intent] for intent in intents), dtype=np.int64, count=len(intents))
+    predicted = cross_validate(texts, y, len(labels), k)
+    accuracy, macro_f1, per_intent, confusion = intent_metrics(labels, y, predicted)
+    entities = entity_metrics(texts, entities_json, extractor)
+    return {
+        "n_examples": len(texts),
+        "k_folds": k,
+        "labels": labels,
+        "accuracy": accuracy,
+        "macro_f1": macro_f1,
+        "per_intent": per_intent,
+        "confusion": confusion,
+        "entities": entities,
+        "elapsed_seconds": round(time.perf_counter() - start, 3),
+    }
+
+def load_evaluation_examples(workspace_name, user_email):
+    rows = db.fetch_all(
+        """SELECT sentence, intent, entities_json FROM annotations
+           WHERE workspace_name=? AND user_email=? AND sentence IS NOT NULL AND intent IS NOT NULL AND intent<>''""",
+        (workspace_name, user_email)
+    )
+    return [row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows]
+
+def get_cached_report(workspace_name, version_number):
+    """Returns the stored report for a model version, or None."""
+    report_json = db.fetch_value(
+        "SELECT report_json FROM evaluations WHERE workspace_name=? AND model_version=?",
+        (workspace_name, version_number)
+    )
+    return json.loads(report_json) if report_json else None
+
+def evaluate_workspace(workspace_name, user_email, refresh=False):
+    """
+    Returns the evaluation report for the workspace's current model version, computing and storing it
+    on first use. Returns None when there is no model or too few labeled examples.
+    """
+    version_number = get_current_version(db.get_connection(), workspace_name)
+    if version_number is None:
+        return None
+    if not refresh:
+        report = get_cached_report(workspace_name, version_number)
+        if report is not None:
+            return report
+
+    conn = db.get_connection()
+    extractor = inference.get_workspace_extractor(inference.get_workspace_domain(conn, workspace_name), workspace_name)
+    report = evaluate_examples(*load_evaluation_examples(workspace_name, user_email), extractor)
+    if report is None:
+        return None
+    report["model_version"] = version_number
+    with db.transaction() as conn:
+        # Only the current version's report is ever shown
+        conn.execute("DELETE FROM evaluations WHERE workspace_name=?", (workspace_name,))
+        conn.execute(
+            "INSERT INTO evaluations (workspace_name, model_version, report_json) VALUES (?, ?, ?)",
+            (workspace_name, version_number, json.dumps(report))
+        )
+    return report
@@ -0,0 +1,218 @@
+"""
+Headless NLU inference for BuddyBot workspaces.
+
+Shared by the Streamlit app and by offline scoring. predict_batch() scores a
+whole list of utterances with one vectorized model call; utterances the model
+is not confident about fall back to the compiled keyword rules. Results are
+kept in the prediction cache (prediction_cache.py), so repeated utterances
+are a lookup.
+
+Offline scoring of a logged-utterance CSV:
+
+    python inference.py --workspace "Ticket to Paris" --input logs.csv --output scored.csv
+"""
+import argparse
+import logging
+import sys
+import time
+
+import pandas as pd
+
+import db
+import migrations
+import perf
+from entities import get_entity_extractor
+from intent_rules import get_intent_matcher, match_intent
+from model_store import get_current_version, load_model
+from prediction_cache import PREDICTION_CACHE, prediction_key
+
+# Below this confidence the trained model defers to the keyword rules
+MODEL_CONFIDENCE_THRESHOLD = 0.5
+TEXT_COLUMN_NAMES = ['text', 'sentence', 'utterance']
+SCORING_CHUNK_SIZE = 50_000
+
+logger = logging.getLogger(__name__)
+
+# ==============================
+# RULES & ENTITIES
+# ==============================
+
+def find_text_column(columns):
+    """Returns the first column named text/sentence/utterance (case-insensitive), or None."""
+    for col in columns:
+        if str(col).lower() in TEXT_COLUMN_NAMES:
+            return col
+    return None
+
+def load_trigger_phrases(conn, workspace_name):
+    """Returns the workspace's user-supplied (intent, phrase) trigger pairs."""
+    local_cursor = conn.cursor()
+    local_cursor.execute("SELECT intent, phrase FROM trigger_phrases WHERE workspace_name=? ORDER BY id", (workspace_name,))
+    return local_cursor.fetchall()
+
+def get_rules_version(conn, workspace_name):
+    """Returns the workspace's rules version, bumped on every trigger phrase or entity definition write."""
+    if not workspace_name:
+        return 0
+    result = conn.execute("SELECT version FROM rule_versions WHERE workspace_name=?", (workspace_name,)).fetchone()
+    return result[0] if result else 0
+
+def get_workspace_matcher(conn, domain, workspace_name=None, rules_version=None):
+    """Returns the cached compiled keyword matcher for a domain/workspace at its current rules version."""
+    if rules_version is None:
+        rules_version = 0
+    return get_intent_matcher(
+        domain, workspace_name, lambda: load_trigger_phrases(conn, workspace_name) if workspace_name else (), rules_version
+    )
+
+def get_workspace_extractor(domain, workspace_name=None, rules_version=None):
+    """Returns the cached entity extractor (domain defaults plus the workspace's gazetteers and patterns)."""
+    if rules_version is None:
+        rules_version = get_rules_version(db.get_connection(), workspace_name)
+    return get_entity_extractor(domain, workspace_name, rules_version)
+
+# ==============================
+# PREDICTION
+# ==============================
+
+def load_workspace_model(conn, workspace_name):
+    """Returns the workspace's current classifier (from the shared model cache), or None if untrained."""
+    try:
+        return load_model(conn, workspace_name)
+    except ValueError as e:
+        # An artifact written in an incompatible format is treated as "not trained"
+        logger.warning("Error loading model for workspace %r: %s", workspace_name, e)
+        return None
+
+def _predict(conn, workspace_name, domain, texts):
+    """Returns (intent, confidence, source, (entities_json, entity_spans_json)) per text, through the prediction cache."""
+    version_number = get_current_version(conn, workspace_name) if workspace_name else None
+    rules_version = get_rules_version(conn, workspace_name)
+    keys = [prediction_key(workspace_name, domain, version_number, rules_version, text) for text in texts]
+    # Cached: (text, intent, confidence, source, (entities_json, entity_spans_json))
+    cached = [PREDICTION_CACHE.get(key) for key in keys]
+    # Repeats within the batch are scored once
+    first_miss = {}
+    for i, hit in enumerate(cached):
+        if hit is None:
+            first_miss.setdefault(keys[i], i)
+    missing = list(first_miss.values())
+    extractor = get_workspace_extractor(domain, workspace_name, rules_version)
+
+    if missing:
+        missing_texts = [texts[i] for i in missing]
+        intents = [None] * len(missing)
+        confidences = [None] * len(missing)
+        sources = ["rules"] * len(missing)
+
+        model = load_workspace_model(conn, workspace_name) if workspace_name else None
+        if model is not None:
+            probs = model.predict_proba(missing_texts)
+            best = probs.argmax(axis=1)
+            best_conf = probs[range(len(missing_texts)), best]
+            for j in (best_conf >= MODEL_CONFIDENCE_THRESHOLD).nonzero()[0]:
+                intents[j] = model.labels[best[j]]
+                confidences[j] = float(best_conf[j])
+                sources[j] = "model"
+
+        matcher = get_workspace_matcher(conn, domain, workspace_name, rules_version)
+        for j, text in enumerate(missing_texts):
+            if intents[j] is None:
+                intents[j], _ = match_intent(matcher, text)
+
+        for j, i in enumerate(missing):
+            cached[i] = (texts[i], intents[j], confidences[j], sources[j], extractor.extract_json(texts[i]))
+            PREDICTION_CACHE.put(keys[i], cached[i])
+        for i, hit in enumerate(cached):
+            if hit is None:
+                cached[i] = cached[first_miss[keys[i]]]
+
+    # Entity offsets depend on the exact text, so a hit for a differently written utterance re-extracts them
+    return [
+        (intent, confidence, source, extracted if cached_text == text else extractor.extract_json(text))
+        for text, (cached_text, intent, confidence, source, extracted) in zip(texts, cached)
+    ]
+
+@perf.timed("prediction")
+def predict_batch(conn, workspace_name, domain, utterances):
+    """
+    Scores many utterances at once.
+    Accepts a list/Series of strings or a DataFrame with a text column; returns a DataFrame with
+    utterance, intent, entities_json, entity_spans_json, confidence (None for rule predictions) and source.
+    """
+    if isinstance(utterances, pd.DataFrame):
+        text_col = find_text_column(utterances.columns)
+        if text_col is None:
+            raise ValueError("DataFrame needs a 'text', 'sentence' or 'utterance' column.")
+        utterances = utterances[text_col]
+    texts = ["" if pd.isna(u) else str(u) for u in utterances]
+    results = _predict(conn, workspace_name, domain, texts)
+    return pd.DataFrame({
+        "utterance": texts,
+        "intent": [intent for intent, _, _, _ in results],
+        "entities_json": [extracted[0] for _, _, _, extracted in results],
+        "entity_spans_json": [extracted[1] for _, _, _, extracted in results],
+        "confidence": [confidence for _, confidence, _, _ in results],
+        "source": [source for _, _, source, _ in results],
+    })
+
+@perf.timed("prediction", batch="single")
+def predict_intent_and_entities(conn, prompt, domain, workspace_name=None):
+    """Predicts (intent, entities_json, confidence) for a single prompt; confidence is None for rule matches."""
+    intent, confidence, _, (entities_json, _) = _predict(conn, workspace_name, domain, [str(prompt)])[0]
+    return intent, entities_json, confidence
+
+# ==============================
+# OFFLINE SCORING (CLI)
+# ==============================
+
+def get_workspace_domain(conn, workspace_name):
+    local_cursor = conn.cursor()
+    local_cursor.execute("SELECT domain FROM workspaces WHERE workspace_name=?", (workspace_name,))
+    result = local_cursor.fetchone()
+    return result[0] if result else None
+
+def score_csv(conn, workspace_name, input_path, output_path, text_column=None, chunksize=SCORING_CHUNK_SIZE):
+    """Scores a CSV of utterances chunk by chunk, appending results to output_path. Returns the row count."""
+    domain = get_workspace_domain(conn, workspace_name)
+    if domain is None:
+        raise ValueError(f"Workspace '{workspace_name}' does not exist.")
+
+    total = 0
+    for chunk_number, chunk in enumerate(pd.read_csv(input_path, chunksize=chunksize)):
+        column = text_column or find_text_column(chunk.columns)
+        if column is None or column not in chunk.columns:
+            raise ValueError("Input CSV needs a 'text', 'sentence' or 'utterance' column (or pass --column).")
+        scored = predict_batch(conn, workspace_name, domain, chunk[column])
+        scored.to_csv(output_path, mode="w" if chunk_number == 0 else "a", header=chunk_number == 0, index=False)
+        total += len(scored)
+        logger.info("Scored chunk %d (%d utterances so far)", chunk_number + 1, total)
+    return total
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a CSV of utterances with a trained BuddyBot workspace.")
+    parser.add_argument("--workspace", required=True, help="Workspace name")
+    parser.add_argument("--input", required=True, help="CSV with a text/sentence/utterance column")
+    parser.add_argument("--output", required=True, help="Where to write the scored CSV")
+    parser.add_argument("--column", help="Name of the text column, if not text/sentence/utterance")
+    parser.add_argument("--db", default="users.db", help="Path to the BuddyBot database")
+    parser.add_argument("--chunksize", type=int, default=SCORING_CHUNK_SIZE, help="Rows scored per batch")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    db.configure(args.db)
+    migrations.ensure_schema()
+    start = time.perf_counter()
+    try:
+        total = score_csv(db.get_connection(), args.workspace, args.input, args.output, args.column, args.chunksize)
+    except ValueError as e:
+        logger.error("%s", e)
+        return 1
+    elapsed = time.perf_counter() - start
+    logger.info(
+        "Scored %d utterances in %.1fs (%.0f rows/sec) -> %s", total, elapsed, total / elapsed if elapsed else 0, args.output
+    )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
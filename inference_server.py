@@ -0,0 +1,253 @@
+"""
+Headless HTTP inference server for trained BuddyBot workspaces.
+
+Serves predictions from the same users.db the Streamlit app writes, without a
+UI rerun per message. Concurrent requests are micro-batched: requests arriving
+within a few milliseconds of each other are scored with one predict_batch()
+call per workspace. Only the standard library (asyncio) is used for HTTP.
+
+    python inference_server.py --port 8000
+
+    POST /workspaces/{name}/parse   {"text": "book a flight to paris"}
+                                    {"texts": ["hi", "check my balance"]}
+    GET  /health
+    GET  /metrics                   timing histograms in the Prometheus text format
+"""
+import argparse
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+import db
+import migrations
+import perf
+from inference import get_workspace_domain, predict_batch
+
+MAX_BATCH_SIZE = 256
+MAX_BATCH_WAIT_SECONDS = 0.005
+MAX_BODY_BYTES = 1024 * 1024
+PREDICTION_THREADS = 2
+
+logger = logging.getLogger(__name__)
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+# ==============================
+# PREDICTION BACKEND
+# ==============================
+
+class PredictionBackend:
+    """Runs predict_batch on a small thread pool; each thread uses its own db connection."""
+
+    def __init__(self, db_path, threads=PREDICTION_THREADS):
+        db.configure(db_path)
+        migrations.ensure_schema()
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="buddybot-predict")
+
+    def _predict(self, workspace_name, texts):
+        conn = db.get_connection()
+        # One indexed lookup per batch; not cached, so deleted or recreated workspaces are seen immediately
+        domain = get_workspace_domain(conn, workspace_name)
+        if domain is None:
+            raise HTTPError(404, f"Workspace '{workspace_name}' does not exist.")
+        scored = predict_batch(conn, workspace_name, domain, texts)
+        return [
+            {
+                "text": row.utterance,
+                "intent": row.intent,
+                "entities": json.loads(row.entities_json),
+                "entity_spans": json.loads(row.entity_spans_json),
+                "confidence": None if row.confidence != row.confidence else row.confidence,  # NaN -> null
+                "source": row.source,
+            }
+            for row in scored.itertuples(index=False)
+        ]
+
+    async def predict(self, workspace_name, texts):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._predict, workspace_name, texts)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+class MicroBatcher:
+    """Collects single-utterance requests for up to max_wait seconds and scores them together."""
+
+    def __init__(self, backend, max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_BATCH_WAIT_SECONDS):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, workspace_name, texts):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((workspace_name, texts, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0][1])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[1])
+
+            by_workspace = {}
+            for item in batch:
+                by_workspace.setdefault(item[0], []).append(item)
+            await asyncio.gather(*(self._flush(name, items) for name, items in by_workspace.items()))
+
+    async def _flush(self, workspace_name, items):
+        texts = [text for _, item_texts, _ in items for text in item_texts]
+        try:
+            results = await self.backend.predict(workspace_name, texts)
+        except Exception as e:
+            for _, _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        offset = 0
+        for _, item_texts, future in items:
+            if not future.done():
+                future.set_result(results[offset:offset + len(item_texts)])
+            offset += len(item_texts)
+
+# ==============================
+# HTTP HANDLING
+# ==============================
+
+async def read_request(reader):
+    """Parses one HTTP/1.1 request. Returns (method, path, headers, body) or None on EOF."""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line.")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length", 0) or 0)
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "Request body too large.")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target.split("?", 1)[0], headers, body
+
+def write_response(writer, status, payload, keep_alive):
+    # Plain strings (the /metrics export) go out as text, everything else as JSON
+    if isinstance(payload, str):
+        body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+    else:
+        body, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+    head = (
+        f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+
+async def route(batcher, method, path, body):
+    parts = [unquote(part) for part in path.strip("/").split("/")]
+    if parts == ["health"]:
+        return 200, {"status": "ok"}
+    if parts == ["metrics"]:
+        return 200, perf.prometheus_text()
+    if len(parts) == 3 and parts[0] == "workspaces" and parts[2] == "parse":
+        if method != "POST":
+            raise HTTPError(405, "Use POST.")
+        try:
+            payload = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            raise HTTPError(400, "Body must be JSON.")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "Body must be a JSON object.")
+        if isinstance(payload.get("texts"), list):
+            results = await batcher.submit(parts[1], [str(text) for text in payload["texts"]])
+            return 200, {"workspace": parts[1], "results": results}
+        if isinstance(payload.get("text"), str):
+            results = await batcher.submit(parts[1], [payload["text"]])
+            return 200, dict(workspace=parts[1], **results[0])
+        raise HTTPError(400, "Body needs a 'text' string or a 'texts' list.")
+    raise HTTPError(404, "Not found.")
+
+def make_handler(batcher):
+    async def handle_connection(reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    method, path, headers, body = request
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    status, payload = await route(batcher, method, path, body)
+                except HTTPError as e:
+                    status, payload, keep_alive = e.status, {"error": e.message}, False
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as e:
+                    logger.exception("Request failed")
+                    status, payload, keep_alive = 500, {"error": str(e)}, False
+                write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+    return handle_connection
+
+async def serve(host, port, db_path):
+    backend = PredictionBackend(db_path)
+    batcher = MicroBatcher(backend)
+    batcher.start()
+    server = await asyncio.start_server(make_handler(batcher), host, port)
+    logger.info("BuddyBot inference server listening on http://%s:%d (db: %s)", host, port, db_path)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        backend.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve BuddyBot workspace predictions over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--db", default="users.db", help="Path to the BuddyBot database")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    try:
+        asyncio.run(serve(args.host, args.port, args.db))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
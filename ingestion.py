@@ -0,0 +1,183 @@
+"""
+Streaming dataset ingestion.
+
+Uploaded CSVs are read in fixed-size row chunks; only the text column is kept,
+segmented row by row (see segmenter.py), deduplicated and written to the
+sentences table as it goes, so peak memory is bounded by the chunk size (plus
+one hash per distinct sentence) rather than the file size. The annotation
+page then reads sentences by position and never reparses the raw CSV.
+
+A new upload is written under a fresh dataset id and only replaces the previous
+dataset (in one short transaction) once it has been fully ingested.
+
+Legacy datasets (a whole-CSV BLOB split on '.' by the old annotation page) are
+converted on first use; annotations made on the old sentences, which had no
+terminal periods, are re-keyed to the segmenter's sentences so no label is lost.
+"""
+from io import BytesIO
+
+import pandas as pd
+
+import db
+import perf
+from annotation_store import MAX_IN_PARAMS
+from entities import spans_json_for
+from inference import find_text_column
+from segmenter import SentenceSegmenter, segment_rows, sentence_key
+
+INGEST_CHUNK_ROWS = 20_000
+REMAP_WINDOW_ROWS = 5_000
+
+INSERT_SENTENCE_SQL = "INSERT INTO sentences (dataset_id, position, source_row, sentence) VALUES (?, ?, ?, ?)"
+
+def _row_texts(chunk, text_column):
+    if text_column:
+        return chunk[text_column]
+    # No text/sentence/utterance column: use all columns of the row as one string
+    return chunk.astype(str).agg(' '.join, axis=1)
+
+@perf.timed("ingestion")
+def ingest_csv(source, filename, workspace_name, user_email, chunksize=INGEST_CHUNK_ROWS):
+    """
+    Streams a CSV (path or file-like) into the sentences table and makes it the workspace's dataset.
+    Returns a dict with dataset_id, text_column, row_count and sentence_count (distinct sentences).
+    """
+    dataset_id = db.execute(
+        "INSERT INTO datasets (user_email, workspace_name, filename) VALUES (?, ?, ?)",
+        (user_email, workspace_name, filename)
+    ).lastrowid
+
+    text_column = None
+    row_count = 0
+    position = 0
+    segmenter = SentenceSegmenter()
+    seen = set()
+    try:
+        for chunk in pd.read_csv(source, chunksize=chunksize, dtype=str, keep_default_na=False):
+            if text_column is None:
+                text_column = find_text_column(chunk.columns) or ""
+            rows = []
+            for source_row, sentence in segment_rows(_row_texts(chunk, text_column), row_count, seen, segmenter):
+                rows.append((dataset_id, position, source_row, sentence))
+                position += 1
+            row_count += len(chunk)
+            db.execute_many(INSERT_SENTENCE_SQL, rows)
+    except BaseException:
+        with db.transaction() as conn:
+            conn.execute("DELETE FROM sentences WHERE dataset_id=?", (dataset_id,))
+            conn.execute("DELETE FROM datasets WHERE id=?", (dataset_id,))
+        raise
+
+    # Swap the new dataset in and drop the previous one(s) in a single transaction
+    with db.transaction() as conn:
+        conn.execute(
+            "UPDATE datasets SET text_column=?, row_count=?, sentence_count=? WHERE id=?",
+            (text_column, row_count, position, dataset_id)
+        )
+        old_ids = [row[0] for row in conn.execute(
+            "SELECT id FROM datasets WHERE user_email=? AND workspace_name=? AND id<>?",
+            (user_email, workspace_name, dataset_id)
+        )]
+        conn.executemany("DELETE FROM sentences WHERE dataset_id=?", [(old_id,) for old_id in old_ids])
+        conn.executemany("DELETE FROM prelabels WHERE dataset_id=?", [(old_id,) for old_id in old_ids])
+        conn.executemany("DELETE FROM datasets WHERE id=?", [(old_id,) for old_id in old_ids])
+        conn.execute(
+            "UPDATE workspaces SET last_modified=CURRENT_TIMESTAMP WHERE user_email=? AND workspace_name=?",
+            (user_email, workspace_name)
+        )
+
+    return {"dataset_id": dataset_id, "text_column": text_column, "row_count": row_count, "sentence_count": position}
+
+# ==============================
+# READS
+# ==============================
+
+def find_dataset(workspace_name, user_email):
+    """
+    Returns the workspace's current dataset as a dict, or None.
+    Ingestions still in progress (no sentence_count and no legacy BLOB) are ignored.
+    """
+    row = db.fetch_one(
+        """SELECT id, filename, text_column, row_count, sentence_count, data IS NOT NULL FROM datasets
+           WHERE user_email=? AND workspace_name=? AND (sentence_count IS NOT NULL OR data IS NOT NULL)
+           ORDER BY id DESC LIMIT 1""",
+        (user_email, workspace_name)
+    )
+    if not row:
+        return None
+    keys = ("id", "filename", "text_column", "row_count", "sentence_count", "has_blob")
+    return dict(zip(keys, row))
+
+def ensure_sentences(workspace_name, user_email):
+    """
+    Returns the current dataset, first converting a legacy whole-CSV BLOB into sentence rows if needed.
+    """
+    dataset = find_dataset(workspace_name, user_email)
+    if dataset is None or dataset["sentence_count"] is not None:
+        return dataset
+    blob = db.fetch_value("SELECT data FROM datasets WHERE id=?", (dataset["id"],))
+    stats = ingest_csv(BytesIO(blob), dataset["filename"], workspace_name, user_email)
+    remap_legacy_annotations(stats["dataset_id"], workspace_name, user_email)
+    return find_dataset(workspace_name, user_email)
+
+def remap_legacy_annotations(dataset_id, workspace_name, user_email):
+    """
+    Re-keys annotations whose sentence no longer occurs in the dataset to the dataset sentence with the same
+    sentence_key() (e.g. "book a ticket" -> "book a ticket."). Annotations whose new key is already labeled
+    are left as they are. Returns the number of annotations re-keyed.
+    """
+    annotated = db.fetch_all(
+        "SELECT sentence, entities_json FROM annotations WHERE workspace_name=? AND user_email=? AND sentence IS NOT NULL",
+        (workspace_name, user_email)
+    )
+    labeled = {sentence for sentence, _ in annotated}
+    candidates = {}
+    for sentence, entities_json in annotated:
+        candidates.setdefault(sentence_key(sentence), (sentence, entities_json))
+
+    rows = []
+    start = 0
+    while candidates:
+        window = get_sentence_window(dataset_id, start, REMAP_WINDOW_ROWS)
+        if not window:
+            break
+        for _, sentence in window:
+            if sentence in labeled:
+                candidates.pop(sentence_key(sentence), None)
+                continue
+            match = candidates.pop(sentence_key(sentence), None)
+            if match is not None and match[0] != sentence:
+                old_sentence, entities_json = match
+                rows.append((sentence, spans_json_for(sentence, entities_json), workspace_name, user_email, old_sentence))
+        start += REMAP_WINDOW_ROWS
+
+    # OR IGNORE: a sentence labeled under both forms keeps the label already saved for the new form
+    db.execute_many(
+        """UPDATE OR IGNORE annotations SET sentence=?, entity_spans_json=?
+           WHERE workspace_name=? AND user_email=? AND sentence=?""",
+        rows
+    )
+    return len(rows)
+
+def get_sentence(dataset_id, position):
+    """Returns the sentence text at a 0-based position, or None."""
+    return db.fetch_value("SELECT sentence FROM sentences WHERE dataset_id=? AND position=?", (dataset_id, position))
+
+def get_sentence_window(dataset_id, start, size):
+    """Returns [(position, sentence)] for positions start .. start+size-1."""
+    return db.fetch_all(
+        "SELECT position, sentence FROM sentences WHERE dataset_id=? AND position>=? AND position<? ORDER BY position",
+        (dataset_id, start, start + size)
+    )
+
+def get_sentences(dataset_id, positions):
+    """Returns {position: sentence} for arbitrary positions, in one IN (...) query per 500 positions."""
+    positions = list(positions)
+    found = {}
+    for start in range(0, len(positions), MAX_IN_PARAMS):
+        chunk = positions[start:start + MAX_IN_PARAMS]
+        found.update(db.fetch_all(
+            f"SELECT position, sentence FROM sentences WHERE dataset_id=? AND position IN ({', '.join('?' * len(chunk))})",
+            (dataset_id, *chunk)
+        ))
+    return found
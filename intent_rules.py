@@ -0,0 +1,86 @@
+"""
+Table-driven keyword intent matcher.
+
+Each domain's rule table (its intents, the phrases in domains.py and any
+trigger phrases a workspace adds) is compiled once into a PhraseMatcher and
+cached, so matching cost stays flat as the table grows. Workspace matchers are
+cached per rules version (see migrations.py), so a phrase added by any process
+is picked up on the next lookup.
+"""
+import threading
+
+from domains import DOMAINS, DOMAIN_TRIGGER_PHRASES, GLOBAL_TRIGGER_PHRASES
+from phrase_matcher import PhraseMatcher
+from prediction_cache import invalidate_predictions
+
+FALLBACK_INTENT = "default_fallback"
+
+_matcher_cache = {}
+_cache_lock = threading.Lock()
+
+def build_rule_table(domain, extra_phrases=()):
+    """
+    Returns {intent: [phrases]} for a domain.
+    extra_phrases is an iterable of (intent, phrase) pairs, e.g. workspace trigger phrases.
+    """
+    table = {}
+    for intent in DOMAINS.get(domain, {}).get("intents", []):
+        table.setdefault(intent, []).append(intent.replace("_", " "))
+    for intent, phrases in DOMAIN_TRIGGER_PHRASES.get(domain, {}).items():
+        table.setdefault(intent, []).extend(phrases)
+    for intent, phrases in GLOBAL_TRIGGER_PHRASES.items():
+        table.setdefault(intent, []).extend(phrases)
+    for intent, phrase in extra_phrases:
+        table.setdefault(intent, []).append(phrase)
+    return table
+
+def compile_rule_table(table):
+    """Compiles a rule table into a PhraseMatcher whose payloads are (intent, table order)."""
+    matcher = PhraseMatcher()
+    for order, (intent, phrases) in enumerate(table.items()):
+        for phrase in phrases:
+            matcher.add(phrase, (intent, order))
+    return matcher.compile()
+
+def get_intent_matcher(domain, workspace_name=None, load_extra_phrases=None, rules_version=0):
+    """
+    Returns the compiled matcher for a domain (and workspace) at a rules version, building it on first use
+    and dropping the ones built for other versions.
+    load_extra_phrases is only called on a cache miss and returns (intent, phrase) pairs.
+    """
+    key = (domain, workspace_name, rules_version)
+    matcher = _matcher_cache.get(key)
+    if matcher is None:
+        with _cache_lock:
+            matcher = _matcher_cache.get(key)
+            if matcher is None:
+                extra = load_extra_phrases() if load_extra_phrases else ()
+                matcher = compile_rule_table(build_rule_table(domain, extra))
+                for stale in [k for k in _matcher_cache if k[:2] == key[:2]]:
+                    del _matcher_cache[stale]
+                _matcher_cache[key] = matcher
+    return matcher
+
+def invalidate_intent_matcher(workspace_name=None):
+    """Drops cached matchers (and the predictions made with them) for a workspace, or all of them, after its phrases change."""
+    with _cache_lock:
+        for key in list(_matcher_cache):
+            if workspace_name is None or key[1] == workspace_name:
+                del _matcher_cache[key]
+    invalidate_predictions(workspace_name)
+
+def match_intent(matcher, text):
+    """
+    Scores every intent by the number of matched phrase tokens (longer phrases win)
+    and returns (intent, matches). Ties go to the intent listed first in the table.
+    """
+    matches = matcher.find(text)
+    if not matches:
+        return FALLBACK_INTENT, []
+
+    scores = {}
+    for start, end, phrase, (intent, order) in matches:
+        score, _ = scores.get(intent, (0, order))
+        scores[intent] = (score + len(phrase.split()), order)
+    best_intent = max(scores, key=lambda intent: (scores[intent][0], -scores[intent][1]))
+    return best_intent, matches
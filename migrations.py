@@ -0,0 +1,319 @@
+"""
+Versioned schema migrations for users.db.
+
+Each migration is a numbered list of statements applied once, inside a single
+transaction, and recorded in schema_version. ensure_schema() runs the pending
+ones at most once per process and database file, so Streamlit reruns no longer
+execute any DDL.
+"""
+import threading
+
+import db
+
+MIGRATIONS = [
+    (1, "base tables", [
+        """CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            email TEXT UNIQUE,
+            password TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS workspaces (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_email TEXT,
+            workspace_name TEXT UNIQUE,
+            domain TEXT,
+            last_modified TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+        # Stores the original CSV BLOB
+        """CREATE TABLE IF NOT EXISTS datasets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            workspace_name TEXT,
+            user_email TEXT,
+            filename TEXT,
+            data BLOB
+        )""",
+        """CREATE TABLE IF NOT EXISTS annotations (
+            user_email TEXT,
+            workspace_name TEXT,
+            sentence TEXT,
+            intent TEXT,
+            entities_json TEXT,
+            last_modified TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_email, workspace_name, sentence)
+        )""",
+        # Metadata about each workspace's current model
+        """CREATE TABLE IF NOT EXISTS models (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            workspace_name TEXT UNIQUE,
+            model_engine TEXT,
+            model_version TEXT,
+            training_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+    ]),
+    (2, "model artifacts and trigger phrases", [
+        """CREATE TABLE IF NOT EXISTS model_artifacts (
+            workspace_name TEXT,
+            model_version INTEGER,
+            model_engine TEXT,
+            size_bytes INTEGER,
+            data BLOB,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (workspace_name, model_version)
+        )""",
+        """CREATE TABLE IF NOT EXISTS trigger_phrases (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            workspace_name TEXT,
+            intent TEXT,
+            phrase TEXT,
+            UNIQUE (workspace_name, intent, phrase)
+        )""",
+    ]),
+    (3, "secondary indexes", [
+        # Evaluate page / annotation footer filter by workspace only; the primary key starts with user_email
+        "CREATE INDEX IF NOT EXISTS idx_annotations_workspace_intent ON annotations (workspace_name, intent)",
+        "CREATE INDEX IF NOT EXISTS idx_annotations_workspace_modified ON annotations (workspace_name, last_modified)",
+        "CREATE INDEX IF NOT EXISTS idx_workspaces_user ON workspaces (user_email)",
+        "CREATE INDEX IF NOT EXISTS idx_datasets_user_workspace ON datasets (user_email, workspace_name)",
+        "ANALYZE",
+    ]),
+    (4, "per-intent annotation counters", [
+        """CREATE TABLE IF NOT EXISTS annotation_counts (
+            workspace_name TEXT,
+            user_email TEXT,
+            intent TEXT,
+            label_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (workspace_name, user_email, intent)
+        )""",
+        "DELETE FROM annotation_counts",
+        """INSERT INTO annotation_counts (workspace_name, user_email, intent, label_count)
+           SELECT workspace_name, user_email, COALESCE(intent, ''), COUNT(*) FROM annotations
+           GROUP BY workspace_name, user_email, COALESCE(intent, '')""",
+        # Triggers keep the counters exact inside the same transaction as every annotation write
+        """CREATE TRIGGER IF NOT EXISTS trg_annotation_counts_insert AFTER INSERT ON annotations
+           BEGIN
+               INSERT INTO annotation_counts (workspace_name, user_email, intent, label_count)
+               VALUES (NEW.workspace_name, NEW.user_email, COALESCE(NEW.intent, ''), 1)
+               ON CONFLICT (workspace_name, user_email, intent) DO UPDATE SET label_count = label_count + 1;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_annotation_counts_update
+           AFTER UPDATE OF workspace_name, user_email, intent ON annotations
+           WHEN OLD.workspace_name IS NOT NEW.workspace_name OR OLD.user_email IS NOT NEW.user_email
+                OR OLD.intent IS NOT NEW.intent
+           BEGIN
+               UPDATE annotation_counts SET label_count = label_count - 1
+               WHERE workspace_name = OLD.workspace_name AND user_email = OLD.user_email
+                 AND intent = COALESCE(OLD.intent, '');
+               INSERT INTO annotation_counts (workspace_name, user_email, intent, label_count)
+               VALUES (NEW.workspace_name, NEW.user_email, COALESCE(NEW.intent, ''), 1)
+               ON CONFLICT (workspace_name, user_email, intent) DO UPDATE SET label_count = label_count + 1;
+               DELETE FROM annotation_counts WHERE label_count <= 0;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_annotation_counts_delete AFTER DELETE ON annotations
+           BEGIN
+               UPDATE annotation_counts SET label_count = label_count - 1
+               WHERE workspace_name = OLD.workspace_name AND user_email = OLD.user_email
+                 AND intent = COALESCE(OLD.intent, '');
+               DELETE FROM annotation_counts WHERE label_count <= 0;
+           END""",
+    ]),
+    (5, "normalized dataset sentences", [
+        "ALTER TABLE datasets ADD COLUMN text_column TEXT",
+        "ALTER TABLE datasets ADD COLUMN row_count INTEGER",
+        "ALTER TABLE datasets ADD COLUMN sentence_count INTEGER",
+        # One row per extracted sentence; id is stable, position is the 0-based order within the dataset
+        """CREATE TABLE IF NOT EXISTS sentences (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dataset_id INTEGER,
+            position INTEGER,
+            source_row INTEGER,
+            sentence TEXT
+        )""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_sentences_dataset_position ON sentences (dataset_id, position)",
+    ]),
+    (6, "training job queue", [
+        # status: queued -> running -> succeeded | failed | cancelled; heartbeat_at lets workers reclaim abandoned jobs
+        """CREATE TABLE IF NOT EXISTS training_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            workspace_name TEXT,
+            user_email TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            progress REAL NOT NULL DEFAULT 0,
+            message TEXT,
+            model_version TEXT,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            heartbeat_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_training_jobs_status ON training_jobs (status, id)",
+        "CREATE INDEX IF NOT EXISTS idx_training_jobs_workspace ON training_jobs (workspace_name, id)",
+    ]),
+    (7, "incremental training jobs", [
+        # 'incremental' updates the current model from changed annotations when possible; 'full' always retrains;
+        # 'prelabel' only scores the annotator's dataset with the current model (see training_jobs.py)
+        "ALTER TABLE training_jobs ADD COLUMN mode TEXT NOT NULL DEFAULT 'incremental'",
+    ]),
+    (8, "evaluation reports", [
+        # Cross-validation report (JSON) for a workspace's current model version
+        """CREATE TABLE IF NOT EXISTS evaluations (
+            workspace_name TEXT,
+            model_version INTEGER,
+            report_json TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (workspace_name, model_version)
+        )""",
+    ]),
+    (9, "model pre-labels", [
+        # The current model's suggestion for every sentence of a dataset, computed once per model version
+        """CREATE TABLE IF NOT EXISTS prelabels (
+            dataset_id INTEGER,
+            model_version INTEGER,
+            position INTEGER,
+            intent TEXT,
+            confidence REAL,
+            entities_json TEXT,
+            PRIMARY KEY (dataset_id, model_version, position)
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_prelabels_confidence ON prelabels (dataset_id, model_version, confidence)",
+    ]),
+    (10, "entity gazetteers, patterns and span offsets", [
+        # [{"entity", "value", "start", "end"}] next to the flat {entity: value} summary in entities_json
+        "ALTER TABLE annotations ADD COLUMN entity_spans_json TEXT",
+        """CREATE TABLE IF NOT EXISTS gazetteer_entries (
+            workspace_name TEXT,
+            entity_type TEXT,
+            phrase TEXT,
+            PRIMARY KEY (workspace_name, entity_type, phrase)
+        )""",
+        # A regular expression per entity type (built-in types are stored as their expression)
+        """CREATE TABLE IF NOT EXISTS entity_patterns (
+            workspace_name TEXT,
+            entity_type TEXT,
+            pattern TEXT,
+            PRIMARY KEY (workspace_name, entity_type)
+        )""",
+    ]),
+    (11, "chat transcripts", [
+        # Append-only; pages are read newest first by id
+        """CREATE TABLE IF NOT EXISTS chat_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_email TEXT,
+            workspace_name TEXT,
+            role TEXT,
+            content TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_chat_messages_workspace ON chat_messages (user_email, workspace_name, id)",
+    ]),
+    (12, "login sessions", [
+        # Keyed by a SHA-256 of the token's session id, so the table alone cannot be used to sign in
+        """CREATE TABLE IF NOT EXISTS sessions (
+            token_hash TEXT PRIMARY KEY,
+            user_email TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)",
+        # Token signing key, generated once unless BUDDYBOT_SESSION_SECRET is set
+        """CREATE TABLE IF NOT EXISTS app_secrets (
+            name TEXT PRIMARY KEY,
+            value TEXT
+        )""",
+    ]),
+    (13, "rule version counters", [
+        # Bumped by triggers on every trigger phrase and entity definition write, from any process, so the
+        # compiled matchers, extractors and predictions cached in each process can be keyed on it
+        """CREATE TABLE IF NOT EXISTS rule_versions (
+            workspace_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS trg_rule_versions_trigger_phrases_insert AFTER INSERT ON trigger_phrases
+           BEGIN
+               INSERT INTO rule_versions (workspace_name, version) VALUES (NEW.workspace_name, 1)
+               ON CONFLICT (workspace_name) DO UPDATE SET version = version + 1;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_rule_versions_trigger_phrases_update AFTER UPDATE ON trigger_phrases
+           BEGIN
+               INSERT INTO rule_versions (workspace_name, version) VALUES (NEW.workspace_name, 1)
+               ON CONFLICT (workspace_name) DO UPDATE SET version = version + 1;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_rule_versions_trigger_phrases_delete AFTER DELETE ON trigger_phrases
+           BEGIN
+               INSERT INTO rule_versions (workspace_name, version) VALUES (OLD.workspace_name, 1)
+               ON CONFLICT (workspace_name) DO UPDATE SET version = version + 1;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_rule_versions_gazetteer_entries_insert AFTER INSERT ON gazetteer_entries
+           BEGIN
+               INSERT INTO rule_versions (workspace_name, version) VALUES (NEW.workspace_name, 1)
+               ON CONFLICT (workspace_name) DO UPDATE SET version = version + 1;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_rule_versions_gazetteer_entries_update AFTER UPDATE ON gazetteer_entries
+           BEGIN
+               INSERT INTO rule_versions (workspace_name, version) VALUES (NEW.workspace_name, 1)
+               ON CONFLICT (workspace_name) DO UPDATE SET version = version + 1;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_rule_versions_gazetteer_entries_delete AFTER DELETE ON gazetteer_entries
+           BEGIN
+               INSERT INTO rule_versions (workspace_name, version) VALUES (OLD.workspace_name, 1)
+               ON CONFLICT (workspace_name) DO UPDATE SET version = version + 1;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_rule_versions_entity_patterns_insert AFTER INSERT ON entity_patterns
+           BEGIN
+               INSERT INTO rule_versions (workspace_name, version) VALUES (NEW.workspace_name, 1)
+               ON CONFLICT (workspace_name) DO UPDATE SET version = version + 1;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_rule_versions_entity_patterns_update AFTER UPDATE ON entity_patterns
+           BEGIN
+               INSERT INTO rule_versions (workspace_name, version) VALUES (NEW.workspace_name, 1)
+               ON CONFLICT (workspace_name) DO UPDATE SET version = version + 1;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_rule_versions_entity_patterns_delete AFTER DELETE ON entity_patterns
+           BEGIN
+               INSERT INTO rule_versions (workspace_name, version) VALUES (OLD.workspace_name, 1)
+               ON CONFLICT (workspace_name) DO UPDATE SET version = version + 1;
+           END""",
+    ]),
+]
+
+_applied_paths = set()
+_lock = threading.Lock()
+
+def current_version(conn):
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )"""
+    )
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+def run_migrations():
+    """Applies every pending migration in order. Returns the list of versions applied."""
+    applied = []
+    with db.transaction() as conn:
+        version = current_version(conn)
+    for number, name, statements in MIGRATIONS:
+        if number <= version:
+            continue
+        with db.transaction() as conn:
+            # Re-check inside the write lock in case another process got here first
+            if current_version(conn) >= number:
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute("INSERT INTO schema_version (version, name) VALUES (?, ?)", (number, name))
+        applied.append(number)
+    return applied
+
+def ensure_schema():
+    """Runs pending migrations once per process for the configured database."""
+    if db.DB_PATH in _applied_paths:
+        return
+    with _lock:
+        if db.DB_PATH not in _applied_paths:
+            run_migrations()
+            _applied_paths.add(db.DB_PATH)
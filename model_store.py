@@ -0,0 +1,97 @@
+"""
+Versioned model artifact storage.
+
+Every training run writes a new serialized model into model_artifacts, keyed
+by (workspace_name, model_version); the models table points at the current
+version. Loaded models are kept in one process-wide, memory-capped LRU so that
+sessions testing the same workspace share a single deserialized copy.
+"""
+from sqlite3 import Binary
+
+import db
+import perf
+from cache import BoundedLRUCache
+from nlu_engine import ENGINE_NAME, HashedIntentClassifier
+from prediction_cache import invalidate_predictions
+
+# Older versions beyond this many are pruned after each training run
+ARTIFACT_VERSIONS_TO_KEEP = 3
+MODEL_CACHE_MAX_ENTRIES = 32
+MODEL_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+MODEL_CACHE = BoundedLRUCache(
+    max_entries=MODEL_CACHE_MAX_ENTRIES,
+    max_bytes=MODEL_CACHE_MAX_BYTES,
+    sizeof=lambda model: model.memory_bytes,
+)
+perf.register_cache("model", MODEL_CACHE)
+
+def format_version(version_number):
+    return f"v{version_number}"
+
+def parse_version(model_version):
+    """'v3' -> 3. Returns None for legacy versions such as 'v1.0'."""
+    if model_version and model_version.startswith("v") and model_version[1:].isdigit():
+        return int(model_version[1:])
+    return None
+
+def save_model_artifact(workspace_name, model):
+    """
+    Stores a trained model as the workspace's next version and makes it current.
+    Returns the new version string (e.g. 'v4').
+    """
+    data = model.to_bytes()
+    # The version is read and claimed under one write lock, so concurrent saves get distinct versions
+    with db.transaction() as conn:
+        version_number = conn.execute(
+            "SELECT COALESCE(MAX(model_version), 0) FROM model_artifacts WHERE workspace_name=?",
+            (workspace_name,)
+        ).fetchone()[0] + 1
+        conn.execute(
+            """INSERT INTO model_artifacts (workspace_name, model_version, model_engine, size_bytes, data)
+               VALUES (?, ?, ?, ?, ?)""",
+            (workspace_name, version_number, ENGINE_NAME, len(data), Binary(data))
+        )
+        conn.execute("DELETE FROM models WHERE workspace_name=?", (workspace_name,))
+        conn.execute(
+            "INSERT INTO models (workspace_name, model_engine, model_version) VALUES (?, ?, ?)",
+            (workspace_name, ENGINE_NAME, format_version(version_number))
+        )
+        conn.execute(
+            "DELETE FROM model_artifacts WHERE workspace_name=? AND model_version <= ?",
+            (workspace_name, version_number - ARTIFACT_VERSIONS_TO_KEEP)
+        )
+
+    # Older versions of this workspace can no longer be current
+    MODEL_CACHE.discard_where(lambda key: key[0] == workspace_name and key[1] != version_number)
+    invalidate_predictions(workspace_name, keep_version=version_number)
+    return format_version(version_number)
+
+def get_current_version(conn, workspace_name):
+    """Returns the workspace's current artifact version number, or None if untrained."""
+    local_cursor = conn.cursor()
+    local_cursor.execute("SELECT model_version FROM models WHERE workspace_name=?", (workspace_name,))
+    result = local_cursor.fetchone()
+    return parse_version(result[0]) if result else None
+
+def load_model_artifact(conn, workspace_name, version_number):
+    """Reads and deserializes one artifact straight from the database (no caching)."""
+    local_cursor = conn.cursor()
+    local_cursor.execute(
+        "SELECT data FROM model_artifacts WHERE workspace_name=? AND model_version=?",
+        (workspace_name, version_number)
+    )
+    result = local_cursor.fetchone()
+    if not result:
+        return None
+    return HashedIntentClassifier.from_bytes(result[0])
+
+def load_model(conn, workspace_name):
+    """Returns the workspace's current model through the shared LRU, or None if untrained."""
+    version_number = get_current_version(conn, workspace_name)
+    if version_number is None:
+        return None
+    return MODEL_CACHE.get_or_load(
+        (workspace_name, version_number),
+        lambda: load_model_artifact(conn, workspace_name, version_number)
+    )
@@ -0,0 +1,303 @@
+"""
+BuddyBot NLU engine: a small, CPU-only intent classifier.
+
+Utterances are tokenized into word unigrams and bigrams, hashed into a fixed
+feature space (the "hashing trick", so no vocabulary has to be stored) and
+scored by a multinomial Naive Bayes model, which is a linear classifier over
+those hashed counts. Training is a single counting pass, so tens of thousands
+of annotations train in a fraction of a second.
+
+Because the model is nothing but counts, it can also be updated in place:
+each fitted model remembers a 64-bit key and the label of every training
+utterance, so partial_fit() can subtract a relabeled example's old
+contribution before adding the new one.
+"""
+import hashlib
+import json
+import re
+import zlib
+from io import BytesIO
+
+import numpy as np
+
+ENGINE_NAME = "HashedNB"
+ARTIFACT_FORMAT = 2
+# Format 1 artifacts (no example index) still load; they just cannot be updated incrementally
+SUPPORTED_ARTIFACT_FORMATS = (1, 2)
+N_FEATURES = 2 ** 16
+DEFAULT_ALPHA = 0.1
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# ==============================
+# FEATURIZATION
+# ==============================
+
+def tokenize(text):
+    """Lowercases and splits an utterance into word tokens."""
+    return _TOKEN_RE.findall(str(text).lower())
+
+def _ngrams(text):
+    """Word unigrams followed by word bigrams."""
+    tokens = tokenize(text)
+    tokens.extend(map(" ".join, zip(tokens, tokens[1:])))
+    return tokens
+
+class _HashMemo(dict):
+    """Memoizes gram -> hashed index; crc32 is stable across processes, unlike hash()."""
+
+    def __init__(self, n_features):
+        super().__init__()
+        self.n_features = n_features
+
+    def __missing__(self, gram):
+        index = self[gram] = zlib.crc32(gram.encode("utf-8")) % self.n_features
+        return index
+
+def hash_features(text, n_features=N_FEATURES):
+    """Returns the hashed unigram + bigram feature indices for one utterance."""
+    return [zlib.crc32(g.encode("utf-8")) % n_features for g in _ngrams(text)]
+
+def featurize_batch(texts, n_features=N_FEATURES):
+    """
+    Featurizes many utterances at once.
+    Returns (flat feature index array, per-utterance lengths).
+    """
+    lookup = _HashMemo(n_features).__getitem__
+    flat = []
+    lengths = np.empty(len(texts), dtype=np.int64)
+    for i, text in enumerate(texts):
+        grams = _ngrams(text)
+        flat.extend(map(lookup, grams))
+        lengths[i] = len(grams)
+    return np.asarray(flat, dtype=np.int64), lengths
+
+def example_keys(texts):
+    """Stable 64-bit keys identifying training utterances (exact text)."""
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(str(text).encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+         for text in texts),
+        dtype=np.int64, count=len(texts)
+    )
+
+def count_features(texts, y, n_classes, n_features=N_FEATURES):
+    """
+    Counts hashed features per class for utterances with integer labels y.
+    Returns (feature_counts (n_classes, n_features) float32, class_counts float64).
+    """
+    flat, lengths = featurize_batch(texts, n_features)
+    y = np.asarray(y, dtype=np.int64)
+    rows = np.repeat(y, lengths)
+    # One bincount over (class, feature) pairs is far cheaper than np.add.at
+    counts = np.bincount(rows * n_features + flat, minlength=n_classes * n_features)
+    feature_counts = counts.reshape(n_classes, n_features).astype(np.float32)
+    class_counts = np.bincount(y, minlength=n_classes).astype(np.float64)
+    return feature_counts, class_counts
+
+# ==============================
+# CLASSIFIER
+# ==============================
+
+class HashedIntentClassifier:
+    """Multinomial Naive Bayes over hashed n-gram counts."""
+
+    def __init__(self, n_features=N_FEATURES, alpha=DEFAULT_ALPHA):
+        self.n_features = n_features
+        self.alpha = alpha
+        self.labels = []
+        self.class_counts = np.zeros(0, dtype=np.float64)
+        self.feature_counts = np.zeros((0, n_features), dtype=np.float32)
+        # Sorted keys of the training utterances and their label indices (None for format 1 artifacts)
+        self.example_keys = None
+        self.example_labels = None
+        # Newest annotation timestamp fully reflected in the counts (set by the training pipeline)
+        self.trained_through = None
+        self._log_prior = None
+        self._log_prob = None
+
+    @property
+    def is_fitted(self):
+        return len(self.labels) > 0
+
+    @property
+    def supports_partial_fit(self):
+        return self.is_fitted and self.example_keys is not None
+
+    @property
+    def memory_bytes(self):
+        """Approximate in-memory footprint, used to cap the model cache."""
+        arrays = (self.feature_counts, self.class_counts, self._log_prob, self._log_prior,
+                  self.example_keys, self.example_labels)
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    def fit(self, texts, labels):
+        """Trains the model from scratch on parallel lists of utterances and intents."""
+        texts = list(texts)
+        labels = [str(label) for label in labels]
+        if not texts or len(texts) != len(labels):
+            raise ValueError("fit() needs the same non-zero number of texts and labels")
+
+        self.labels = sorted(set(labels))
+        label_index = {label: i for i, label in enumerate(self.labels)}
+        y = [label_index[label] for label in labels]
+        self.feature_counts, self.class_counts = count_features(texts, y, len(self.labels), self.n_features)
+        self._set_examples(example_keys(texts), np.asarray(y, dtype=np.int32))
+        self._update_log_probs()
+        return self
+
+    @classmethod
+    def from_counts(cls, labels, feature_counts, class_counts, keys=None, y=None,
+                    n_features=N_FEATURES, alpha=DEFAULT_ALPHA):
+        """
+        Builds a fitted model from pre-aggregated counts (e.g. summed across worker processes).
+        Pass the training utterances' keys and label indices to allow partial_fit() later.
+        """
+        model = cls(n_features=n_features, alpha=alpha)
+        model.labels = list(labels)
+        model.feature_counts = np.asarray(feature_counts, dtype=np.float32)
+        model.class_counts = np.asarray(class_counts, dtype=np.float64)
+        if keys is not None:
+            model._set_examples(np.asarray(keys, dtype=np.int64), np.asarray(y, dtype=np.int32))
+        model._update_log_probs()
+        return model
+
+    def _set_examples(self, keys, y):
+        order = np.argsort(keys, kind="stable")
+        self.example_keys = keys[order]
+        self.example_labels = y[order]
+
+    def partial_fit(self, texts, labels):
+        """
+        Applies new and relabeled examples to a fitted model in place; unchanged examples are skipped.
+        Returns the number of examples whose counts changed.
+        Raises ValueError (leaving the model untouched) when the update needs a full retrain:
+        an unknown intent, an intent left without examples, or a model without an example index.
+        """
+        if not self.supports_partial_fit:
+            raise ValueError("This model has no example index; retrain it from scratch.")
+        label_index = {label: i for i, label in enumerate(self.labels)}
+        # The last occurrence of an utterance wins
+        latest = dict(zip((str(text) for text in texts), (str(label) for label in labels)))
+        unknown = set(latest.values()) - set(label_index)
+        if unknown:
+            raise ValueError(f"New intents need a full retrain: {', '.join(sorted(unknown))}")
+        if not latest:
+            return 0
+
+        texts = list(latest)
+        keys = example_keys(texts)
+        new_y = np.fromiter((label_index[latest[text]] for text in texts), dtype=np.int32, count=len(texts))
+        positions = np.searchsorted(self.example_keys, keys)
+        in_range = positions < len(self.example_keys)
+        known = np.zeros(len(keys), dtype=bool)
+        known[in_range] = self.example_keys[positions[in_range]] == keys[in_range]
+        old_y = np.full(len(keys), -1, dtype=np.int32)
+        old_y[known] = self.example_labels[positions[known]]
+
+        changed = old_y != new_y
+        relabeled = changed & known
+        n_classes = len(self.labels)
+        added_features, added_classes = count_features(
+            [text for text, flag in zip(texts, changed) if flag], new_y[changed], n_classes, self.n_features
+        )
+        removed_features, removed_classes = count_features(
+            [text for text, flag in zip(texts, relabeled) if flag], old_y[relabeled], n_classes, self.n_features
+        )
+        class_counts = self.class_counts + added_classes - removed_classes
+        if (class_counts <= 0).any():
+            raise ValueError("An intent has no examples left; retrain from scratch.")
+
+        self.feature_counts += added_features
+        self.feature_counts -= removed_features
+        self.class_counts = class_counts
+        self.example_labels[positions[relabeled]] = new_y[relabeled]
+        fresh = ~known
+        if fresh.any():
+            self._set_examples(
+                np.concatenate([self.example_keys, keys[fresh]]),
+                np.concatenate([self.example_labels, new_y[fresh]])
+            )
+        self._update_log_probs()
+        return int(changed.sum())
+
+    def _update_log_probs(self):
+        smoothed = self.feature_counts.astype(np.float64) + self.alpha
+        self._log_prob = (np.log(smoothed) - np.log(smoothed.sum(axis=1, keepdims=True))).astype(np.float32)
+        self._log_prior = np.log(self.class_counts / self.class_counts.sum())
+
+    def predict_proba(self, texts):
+        """Returns an (n_texts, n_labels) array of class probabilities."""
+        if not self.is_fitted:
+            raise ValueError("Model has not been trained yet.")
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, len(self.labels)))
+
+        flat, lengths = featurize_batch(texts, self.n_features)
+        # Gather per-class log-likelihoods for every feature occurrence, then sum per utterance.
+        # A trailing zero column keeps reduceat offsets valid when the last utterance is empty.
+        gathered = np.concatenate([self._log_prob[:, flat], np.zeros((len(self.labels), 1), dtype=np.float32)], axis=1)
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        sums = np.add.reduceat(gathered, offsets, axis=1)
+        sums[:, lengths == 0] = 0.0
+
+        scores = sums.T.astype(np.float64) + self._log_prior
+        scores -= scores.max(axis=1, keepdims=True)
+        probs = np.exp(scores)
+        probs /= probs.sum(axis=1, keepdims=True)
+        return probs
+
+    def predict(self, text):
+        """Returns (intent, confidence) for a single utterance."""
+        probs = self.predict_proba([text])[0]
+        best = int(probs.argmax())
+        return self.labels[best], float(probs[best])
+
+    # ==============================
+    # SERIALIZATION
+    # ==============================
+
+    def to_bytes(self):
+        """Serializes the model into a compact, pickle-free .npz payload."""
+        class_idx, feature_idx = np.nonzero(self.feature_counts)
+        meta = {
+            "engine": ENGINE_NAME,
+            "format": ARTIFACT_FORMAT,
+            "n_features": self.n_features,
+            "alpha": self.alpha,
+            "labels": self.labels,
+            "trained_through": self.trained_through,
+        }
+        arrays = {}
+        if self.example_keys is not None:
+            arrays = {"example_keys": self.example_keys, "example_labels": self.example_labels}
+        buffer = BytesIO()
+        np.savez_compressed(
+            buffer,
+            meta=np.array(json.dumps(meta)),
+            class_counts=self.class_counts,
+            class_idx=class_idx.astype(np.int32),
+            feature_idx=feature_idx.astype(np.int32),
+            values=self.feature_counts[class_idx, feature_idx],
+            **arrays,
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Restores a model serialized with to_bytes()."""
+        with np.load(BytesIO(data), allow_pickle=False) as payload:
+            meta = json.loads(str(payload["meta"]))
+            if meta.get("engine") != ENGINE_NAME or meta.get("format") not in SUPPORTED_ARTIFACT_FORMATS:
+                raise ValueError(f"Unsupported model artifact: {meta.get('engine')} format {meta.get('format')}")
+            model = cls(n_features=meta["n_features"], alpha=meta["alpha"])
+            model.labels = list(meta["labels"])
+            model.class_counts = payload["class_counts"]
+            model.feature_counts = np.zeros((len(model.labels), model.n_features), dtype=np.float32)
+            model.feature_counts[payload["class_idx"], payload["feature_idx"]] = payload["values"]
+            model.trained_through = meta.get("trained_through")
+            if "example_keys" in payload:
+                model.example_keys = payload["example_keys"]
+                model.example_labels = payload["example_labels"]
+        model._update_log_probs()
+        return model
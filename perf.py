@@ -0,0 +1,176 @@
+"""
+Lightweight in-process timing instrumentation.
+
+Code paths wrap themselves in span("name", label=value): the elapsed time
+is recorded into a fixed-bucket histogram per (name, labels), so memory stays
+constant no matter how many calls are made and recording costs a couple of
+microseconds. Histograms are process-wide (Streamlit sessions share them) and
+are read by the admin "Performance" page, or exported in the Prometheus text
+format by prometheus_text() (served at /metrics by inference_server.py).
+
+Process-wide caches register themselves with register_cache() so their hit
+rates appear next to the timings.
+"""
+import bisect
+import math
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+METRIC_PREFIX = "buddybot"
+# Upper bounds in seconds; one more overflow bucket (+Inf) is implicit
+BUCKET_BOUNDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Histogram:
+    """Fixed-bucket latency histogram (seconds)."""
+
+    __slots__ = ("bucket_counts", "count", "total", "max")
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.bucket_counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        return _quantile(self.bucket_counts, self.count, self.max, q)
+
+def _quantile(bucket_counts, count, maximum, q):
+    """Estimates a quantile by linear interpolation inside the bucket that contains it."""
+    if not count:
+        return 0.0
+    rank = q * count
+    cumulative = 0
+    for i, bucket_count in enumerate(bucket_counts):
+        if bucket_count and cumulative + bucket_count >= rank:
+            lower = BUCKET_BOUNDS[i - 1] if i > 0 else 0.0
+            upper = BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else maximum
+            return min(lower + (upper - lower) * (rank - cumulative) / bucket_count, maximum)
+        cumulative += bucket_count
+    return maximum
+
+_histograms = {}
+_caches = {}  # name -> cache with a stats() method
+_lock = threading.Lock()
+
+def observe(name, seconds, **labels):
+    """Records one duration for a span name and label set."""
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+@contextmanager
+def span(name, **labels):
+    """Times the enclosed block (also when it raises, e.g. Streamlit's rerun exceptions)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+def timed(name, **labels):
+    """Decorator form of span()."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def count(name, **labels):
+    """Returns how many durations have been recorded for a span name and label set."""
+    with _lock:
+        histogram = _histograms.get((name, tuple(sorted(labels.items()))))
+        return histogram.count if histogram else 0
+
+def register_cache(name, cache):
+    """Reports a cache's stats() (entries, hits, misses, hit rate...) on the Performance page and in the export."""
+    with _lock:
+        _caches[name] = cache
+
+def cache_snapshot():
+    """Returns one stats dict per registered cache, by name."""
+    with _lock:
+        caches = sorted(_caches.items())
+    return [{"cache": name, **cache.stats()} for name, cache in caches]
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+def snapshot():
+    """Returns one summary dict per (name, labels), slowest total time first."""
+    with _lock:
+        items = [(name, labels, list(h.bucket_counts), h.count, h.total, h.max) for (name, labels), h in _histograms.items()]
+    rows = []
+    for name, labels, bucket_counts, count, total, maximum in items:
+        rows.append({
+            "span": name,
+            "labels": ", ".join(f"{key}={value}" for key, value in labels),
+            "count": count,
+            "total_s": round(total, 4),
+            "mean_ms": round(total / count * 1000, 3) if count else 0.0,
+            "p50_ms": round(_quantile(bucket_counts, count, maximum, 0.50) * 1000, 3),
+            "p95_ms": round(_quantile(bucket_counts, count, maximum, 0.95) * 1000, 3),
+            "p99_ms": round(_quantile(bucket_counts, count, maximum, 0.99) * 1000, 3),
+            "max_ms": round(maximum * 1000, 3),
+        })
+    rows.sort(key=lambda row: row["total_s"], reverse=True)
+    return rows
+
+# ==============================
+# PROMETHEUS EXPORT
+# ==============================
+
+def _metric_name(name):
+    return f"{METRIC_PREFIX}_{re.sub(r'[^a-zA-Z0-9_]', '_', name)}_seconds"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+def prometheus_text():
+    """Renders every histogram in the Prometheus text exposition format."""
+    with _lock:
+        items = sorted(((name, labels, list(h.bucket_counts), h.count, h.total) for (name, labels), h in _histograms.items()))
+    lines = []
+    current = None
+    for name, labels, bucket_counts, count, total in items:
+        metric = _metric_name(name)
+        if metric != current:
+            lines.append(f"# TYPE {metric} histogram")
+            current = metric
+        cumulative = 0
+        for bound, bucket_count in zip(list(BUCKET_BOUNDS) + [math.inf], bucket_counts):
+            cumulative += bucket_count
+            le = "+Inf" if bound == math.inf else repr(bound)
+            lines.append(f"{metric}_bucket{_label_text(labels, [('le', le)])} {cumulative}")
+        lines.append(f"{metric}_sum{_label_text(labels)} {total}")
+        lines.append(f"{metric}_count{_label_text(labels)} {count}")
+
+    cache_rows = cache_snapshot()
+    for stat in sorted({stat for row in cache_rows for stat in row if stat != "cache"}):
+        metric = f"{METRIC_PREFIX}_cache_{stat}"
+        lines.append(f"# TYPE {metric} gauge")
+        for row in cache_rows:
+            if stat in row:
+                lines.append(f"{metric}{_label_text([('cache', row['cache'])])} {row[stat]}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,84 @@
+"""
+Token-level Aho-Corasick phrase matcher.
+
+Phrases are matched on whole word tokens, so "hi" never fires inside "this",
+and a compiled matcher scans an utterance in a single left-to-right pass no
+matter how many phrases it holds.
+"""
+import re
+
+_TOKEN_RE = re.compile(r"\w+")
+
+def tokenize_with_offsets(text):
+    """Returns a list of (lowercased token, start, end) character spans."""
+    return [(m.group().lower(), m.start(), m.end()) for m in _TOKEN_RE.finditer(str(text))]
+
+class PhraseMatcher:
+    """Aho-Corasick automaton over word tokens; each phrase carries an arbitrary payload."""
+
+    def __init__(self):
+        # Node 0 is the root. goto[n] maps token -> child node.
+        self._goto = [{}]
+        self._fail = [0]
+        self._phrases = [[]]  # phrases ending at each node
+        self._output = [[]]   # the same plus those of its suffixes, filled in by compile()
+        self._compiled = False
+        self.phrase_count = 0
+
+    def add(self, phrase, payload):
+        """Adds a phrase (matched case-insensitively on word boundaries)."""
+        tokens = [token for token, _, _ in tokenize_with_offsets(phrase)]
+        if not tokens:
+            return
+        node = 0
+        for token in tokens:
+            child = self._goto[node].get(token)
+            if child is None:
+                child = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._phrases.append([])
+                self._output.append([])
+                self._goto[node][token] = child
+            node = child
+        self._phrases[node].append((len(tokens), phrase, payload))
+        self.phrase_count += 1
+        self._compiled = False
+
+    def compile(self):
+        """Builds the failure links (breadth-first). Called lazily by find(), again after more phrases are added."""
+        self._output = [list(phrases) for phrases in self._phrases]
+        queue = list(self._goto[0].values())
+        for child in queue:
+            self._fail[child] = 0
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for token, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(token, 0)
+                self._fail[child] = target if target != child else 0
+                # Inherit the matches of the longest proper suffix
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+        self._compiled = True
+        return self
+
+    def find(self, text):
+        """Returns every match as (start, end, phrase, payload), with character offsets into text."""
+        if not self._compiled:
+            self.compile()
+        goto, fail, output = self._goto, self._fail, self._output
+        spans = tokenize_with_offsets(text)
+        matches = []
+        node = 0
+        for i, (token, _, end) in enumerate(spans):
+            while node and token not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(token, 0)
+            for n_tokens, phrase, payload in output[node]:
+                matches.append((spans[i - n_tokens + 1][1], end, phrase, payload))
+        return matches
@@ -0,0 +1,36 @@
+"""
+Process-wide cache of prediction results.
+
+Chat and batch traffic repeats the same utterances ("hi", "check my
+balance"), so predictions are kept in a bounded TTL+LRU cache keyed by
+(workspace, domain, model version, rules version, normalized utterance). The
+classifier and the keyword rules are case-insensitive and split on whitespace,
+so utterances that differ only in case or spacing share an entry.
+
+Both versions are read from the database on every prediction call: a new model
+artifact or a trigger phrase/entity definition write (which bumps the
+workspace's rule_versions row, see migrations.py) changes the key, so every
+process, including inference_server.py and the CLI, stops using older entries
+straight away. The writing process also drops those entries to free their
+slots; elsewhere they age out of the TTL/LRU cache.
+"""
+import perf
+from cache import TTLCache
+
+PREDICTION_CACHE_MAX_ENTRIES = 10_000
+PREDICTION_CACHE_TTL_SECONDS = 300
+
+PREDICTION_CACHE = TTLCache(ttl_seconds=PREDICTION_CACHE_TTL_SECONDS, max_entries=PREDICTION_CACHE_MAX_ENTRIES)
+perf.register_cache("prediction", PREDICTION_CACHE)
+
+def normalize_utterance(text):
+    return " ".join(text.lower().split())
+
+def prediction_key(workspace_name, domain, version_number, rules_version, text):
+    return (workspace_name, domain, version_number, rules_version, normalize_utterance(text))
+
+def invalidate_predictions(workspace_name=None, keep_version=None):
+    """Drops cached predictions for a workspace (or all of them), except those of keep_version."""
+    PREDICTION_CACHE.discard_where(
+        lambda key: (workspace_name is None or key[0] == workspace_name) and (keep_version is None or key[2] != keep_version)
+    )
@@ -0,0 +1,113 @@
+"""
+Model-assisted pre-labeling for the annotation queue.
+
+The workspace's current model scores every sentence of a dataset in
+vectorized batches; the top intent, its probability and the entities
+extracted for it are stored in the prelabels table under (dataset, model
+version), so they are computed once per model version rather than per
+render. The annotation page pre-fills its fields from these suggestions and
+can walk the unlabeled sentences least confident first, which puts annotator
+time where the model is most unsure.
+
+Suggestions are written in PRELABEL_BATCH_ROWS chunks, each in its own short
+transaction, so a large dataset never holds the write lock for the whole pass.
+A version's suggestions count as ready once the dataset's last sentence has
+one. Training jobs refresh them right after saving a new version; for datasets
+uploaded later the annotation page queues a pre-labeling job on the same
+background workers (see training_jobs.py).
+"""
+import db
+import perf
+from annotation_store import MAX_IN_PARAMS
+from inference import get_workspace_domain, get_workspace_extractor
+from ingestion import find_dataset, get_sentence_window
+from model_store import MODEL_CACHE, get_current_version, load_model_artifact
+
+PRELABEL_BATCH_ROWS = 5_000
+
+INSERT_PRELABEL_SQL = """INSERT OR REPLACE INTO prelabels (dataset_id, model_version, position, intent, confidence, entities_json)
+                          VALUES (?, ?, ?, ?, ?, ?)"""
+
+def has_prelabels(dataset_id, version_number, sentence_count):
+    """True once every sentence has a suggestion (chunks are written in position order, so the last one is enough)."""
+    return db.fetch_value(
+        "SELECT 1 FROM prelabels WHERE dataset_id=? AND model_version=? AND position=?",
+        (dataset_id, version_number, sentence_count - 1)
+    ) is not None
+
+@perf.timed("prelabeling")
+def compute_prelabels(dataset_id, workspace_name, batch_size=PRELABEL_BATCH_ROWS, progress=None):
+    """
+    Scores every sentence of the dataset with the workspace's current model and stores the suggestions one chunk
+    per transaction, then drops those of older versions. progress(done, total) is called after each chunk.
+    Returns the model version number, or None if there is no model.
+    """
+    conn = db.get_connection()
+    version_number = get_current_version(conn, workspace_name)
+    if version_number is None:
+        return None
+    model = MODEL_CACHE.get_or_load(
+        (workspace_name, version_number),
+        lambda: load_model_artifact(conn, workspace_name, version_number)
+    )
+    if model is None:
+        return None
+    extractor = get_workspace_extractor(get_workspace_domain(conn, workspace_name), workspace_name)
+    total = db.fetch_value("SELECT sentence_count FROM datasets WHERE id=?", (dataset_id,)) or 0
+
+    start = 0
+    while True:
+        window = get_sentence_window(dataset_id, start, batch_size)
+        if not window:
+            break
+        positions, texts = zip(*window)
+        probs = model.predict_proba(list(texts))
+        best = probs.argmax(axis=1)
+        confidences = probs[range(len(texts)), best]
+        rows = []
+        for position, text, label_index, confidence in zip(positions, texts, best, confidences):
+            entities_json, _ = extractor.extract_json(text)
+            rows.append((dataset_id, version_number, position, model.labels[label_index], float(confidence), entities_json))
+        db.execute_many(INSERT_PRELABEL_SQL, rows)
+        start += batch_size
+        if progress:
+            progress(min(start, total), max(total, 1))
+
+    db.execute("DELETE FROM prelabels WHERE dataset_id=? AND model_version<>?", (dataset_id, version_number))
+    return version_number
+
+def refresh_workspace_prelabels(workspace_name, user_email, progress=None):
+    """
+    Recomputes the suggestions for the annotator's current dataset (run by the training job workers).
+    Returns the model version number, or None if there was no dataset or model.
+    """
+    dataset = find_dataset(workspace_name, user_email)
+    if dataset is not None and dataset["sentence_count"]:
+        return compute_prelabels(dataset["id"], workspace_name, progress=progress)
+    return None
+
+def get_prelabels(dataset_id, version_number, positions):
+    """Returns {position: (intent, confidence, entities_json)} for the given positions."""
+    positions = list(positions)
+    found = {}
+    for start in range(0, len(positions), MAX_IN_PARAMS):
+        chunk = positions[start:start + MAX_IN_PARAMS]
+        rows = db.fetch_all(
+            f"""SELECT position, intent, confidence, entities_json FROM prelabels
+                WHERE dataset_id=? AND model_version=? AND position IN ({', '.join('?' * len(chunk))})""",
+            (dataset_id, version_number, *chunk)
+        )
+        found.update((position, (intent, confidence, entities_json)) for position, intent, confidence, entities_json in rows)
+    return found
+
+def uncertainty_queue(dataset_id, version_number, workspace_name, user_email):
+    """Returns the positions of the dataset's unlabeled sentences, least confident suggestion first."""
+    rows = db.fetch_all(
+        """SELECT p.position FROM prelabels p
+           JOIN sentences s ON s.dataset_id = p.dataset_id AND s.position = p.position
+           LEFT JOIN annotations a ON a.workspace_name=? AND a.user_email=? AND a.sentence = s.sentence
+           WHERE p.dataset_id=? AND p.model_version=? AND a.sentence IS NULL
+           ORDER BY p.confidence, p.position""",
+        (workspace_name, user_email, dataset_id, version_number)
+    )
+    return [row[0] for row in rows]
@@ -0,0 +1,83 @@
+"""
+Rule-based sentence segmentation for uploaded datasets.
+
+Works one row at a time. A sentence ends at '.', '?' or '!' (optionally
+followed by closing quotes/brackets) when whitespace follows, so decimals
+("3.14"), URLs and e-mail addresses are never split. A period after a known
+abbreviation ("Dr.", "e.g.") or a single-letter initial does not end a
+sentence. Rows without any boundary, which is most chat-style data, take a
+single regex search.
+"""
+import re
+
+DEFAULT_ABBREVIATIONS = frozenset({
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "mt", "vs", "etc", "e.g", "i.e", "cf", "al",
+    "inc", "ltd", "co", "corp", "dept", "approx", "est", "no", "fig", "vol", "p", "pp", "ft",
+    "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+    "mon", "tue", "wed", "thu", "fri", "sat", "sun", "a.m", "p.m", "u.s", "u.k",
+})
+
+# Terminal punctuation, optional closing quotes/brackets, then the whitespace that separates sentences
+_BOUNDARY_RE = re.compile(r"""([.!?]+)["')\]]*\s+""")
+
+class SentenceSegmenter:
+    """Splits text into sentences; see the module docstring for the rules."""
+
+    def __init__(self, abbreviations=DEFAULT_ABBREVIATIONS):
+        self.abbreviations = frozenset(abbreviation.lower() for abbreviation in abbreviations)
+
+    def _is_abbreviation(self, text, start, punct_start):
+        """True if the word ending at punct_start (followed by a single '.') is an abbreviation or initial."""
+        word_start = max(text.rfind(" ", start, punct_start), text.rfind("\n", start, punct_start)) + 1
+        word = text[word_start:punct_start].lstrip("(\"'[").lower()
+        if len(word) == 1 and word.isalpha():
+            return True
+        return word in self.abbreviations
+
+    def split(self, text):
+        """Returns the whitespace-normalized, non-empty sentences of one text."""
+        text = str(text).strip()
+        if not text:
+            return []
+        # Cheap substring checks skip the regex for rows with no terminal punctuation at all
+        match = _BOUNDARY_RE.search(text) if ("." in text or "?" in text or "!" in text) else None
+        if match is None:
+            return [" ".join(text.split())]
+
+        sentences = []
+        start = 0
+        while match is not None:
+            punct = match.group(1)
+            if not (punct == "." and self._is_abbreviation(text, start, match.start(1))):
+                sentence = text[start:match.end()].strip()
+                if sentence:
+                    sentences.append(" ".join(sentence.split()))
+                start = match.end()
+            match = _BOUNDARY_RE.search(text, match.end())
+        tail = text[start:].strip()
+        if tail:
+            sentences.append(" ".join(tail.split()))
+        return sentences
+
+def sentence_key(sentence):
+    """
+    Case- and spacing-insensitive form of a sentence without trailing terminal punctuation, for matching
+    sentences split by older code (which split on '.' and dropped the periods) to segmenter output.
+    """
+    return " ".join(str(sentence).lower().split()).rstrip(".!? ")
+
+def segment_rows(texts, start_row=0, seen=None, segmenter=None):
+    """
+    Yields (source_row, sentence) for an iterable of row texts.
+    Identical sentences (case-insensitive) are emitted only once; pass the same
+    `seen` set across calls to deduplicate over a whole chunked dataset.
+    """
+    segmenter = segmenter or SentenceSegmenter()
+    seen = set() if seen is None else seen
+    for source_row, text in enumerate(texts, start=start_row):
+        for sentence in segmenter.split(text):
+            key = hash(sentence.lower())
+            if key in seen:
+                continue
+            seen.add(key)
+            yield source_row, sentence
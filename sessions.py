@@ -0,0 +1,101 @@
+"""
+Server-side login sessions.
+
+A successful login creates a row in the sessions table and hands the
+browser a signed token ("<session id>.<HMAC-SHA256 signature>"), which the
+app keeps in the page URL's sid query parameter. When a reload starts a new
+Streamlit session, the token is verified and looked up once instead of
+asking for the password again (and paying for another bcrypt check).
+Tokens with a bad signature are rejected without touching the database;
+the table stores only a hash of the session id. Because the token sits in
+the URL, each one is single-use: restoring a session replaces it with a new
+token. Sessions expire SESSION_TTL_HOURS after the last restore and are
+deleted on logout.
+
+The signing key comes from BUDDYBOT_SESSION_SECRET, or is generated once and
+kept in the app_secrets table so tokens survive restarts.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+
+import db
+
+SESSION_TTL_HOURS = 12
+SESSION_QUERY_PARAM = "sid"
+
+_secret = None
+
+def get_session_secret():
+    global _secret
+    if _secret is None:
+        secret = os.environ.get("BUDDYBOT_SESSION_SECRET")
+        if not secret:
+            with db.transaction() as conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO app_secrets (name, value) VALUES ('session_secret', ?)", (secrets.token_hex(32),)
+                )
+                secret = conn.execute("SELECT value FROM app_secrets WHERE name='session_secret'").fetchone()[0]
+        _secret = secret.encode("utf-8")
+    return _secret
+
+def _sign(session_id):
+    digest = hmac.new(get_session_secret(), session_id.encode("utf-8"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+def _token_hash(session_id):
+    return hashlib.sha256(session_id.encode("utf-8")).hexdigest()
+
+def _insert_session(conn, user_email):
+    session_id = secrets.token_urlsafe(24)
+    conn.execute(
+        "INSERT INTO sessions (token_hash, user_email, expires_at) VALUES (?, ?, datetime('now', ?))",
+        (_token_hash(session_id), user_email, f"+{SESSION_TTL_HOURS} hours")
+    )
+    return f"{session_id}.{_sign(session_id)}"
+
+def create_session(user_email):
+    """Stores a new session for the user (pruning expired ones) and returns its signed token."""
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM sessions WHERE expires_at <= CURRENT_TIMESTAMP")
+        return _insert_session(conn, user_email)
+
+def _session_id(token):
+    """The token's session id if its signature is valid, else None."""
+    session_id, _, signature = str(token or "").partition(".")
+    if not session_id or not hmac.compare_digest(signature, _sign(session_id)):
+        return None
+    return session_id
+
+def resolve_session(token):
+    """Returns the email of the token's unexpired session, or None."""
+    session_id = _session_id(token)
+    if session_id is None:
+        return None
+    return db.fetch_value(
+        "SELECT user_email FROM sessions WHERE token_hash=? AND expires_at > CURRENT_TIMESTAMP", (_token_hash(session_id),)
+    )
+
+def rotate_session(token):
+    """
+    Exchanges a valid token for a new one in one transaction, so the old token stops working.
+    Returns (email, new token), or (None, None) for an invalid or expired token.
+    """
+    session_id = _session_id(token)
+    if session_id is None:
+        return None, None
+    with db.transaction() as conn:
+        row = conn.execute(
+            "SELECT user_email FROM sessions WHERE token_hash=? AND expires_at > CURRENT_TIMESTAMP", (_token_hash(session_id),)
+        ).fetchone()
+        if row is None:
+            return None, None
+        conn.execute("DELETE FROM sessions WHERE token_hash=?", (_token_hash(session_id),))
+        return row[0], _insert_session(conn, row[0])
+
+def revoke_session(token):
+    session_id = _session_id(token)
+    if session_id is not None:
+        db.execute("DELETE FROM sessions WHERE token_hash=?", (_token_hash(session_id),))
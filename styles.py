@@ -0,0 +1,139 @@
+"""
+Static page styling for the BuddyBot app.
+
+Kept out of chatbot_login_app.py to keep the page script readable. The app
+still sends it with every rerun: Streamlit drops elements a run does not
+render, so the styles would disappear if it were injected only once.
+"""
+
+APP_CSS = """
+    <style>
+        /* Base Styling */
+        [data-testid="stAppViewContainer"] {
+            background: linear-gradient(135deg, #0b1a37 0%, #1c2b4d 100%);
+            color: white;
+            animation: fadeIn 1s ease-in-out;
+        }
+        .title {
+            text-align: center;
+            font-size: 36px;
+            font-weight: 800;
+            color: #6EC6FF;
+            margin-bottom: 20px;
+        }
+        
+        /* Sidebar Bot Avatar */
+        .sidebar-bot-avatar {
+            text-align: center;
+            margin-bottom: 20px;
+        }
+        .sidebar-bot-avatar img {
+            width: 80px;
+            height: 80px;
+            border-radius: 50%;
+            background-color: #6EC6FF;
+            padding: 5px;
+            box-shadow: 0 0 10px rgba(110, 198, 255, 0.5);
+        }
+        .sidebar-bot-avatar p {
+            font-size: 18px;
+            font-weight: bold;
+            color: white;
+            margin-top: 10px;
+        }
+            
+        /* Logo & Chat Bubbles */
+        .logo-container {
+            text-align: center;
+            margin-top: 30px;
+            animation: slideUp 1s ease-in-out;
+        }
+        @keyframes slideUp {
+            from { opacity: 0; transform: translateY(40px); }
+            to { opacity: 1; transform: translateY(0); }
+        }
+        .chat-bubble {
+            background-color: #2b70f0;
+            border-radius: 15px;
+            padding: 10px 15px;
+            display: inline-block;
+            margin: 10px 0;
+            color: white;
+            max-width: 90%;
+            text-align: left;
+        }
+        .chat-bubble-container {
+            margin-top: 20px;
+            width: 100%;
+            text-align: center;
+        }
+
+        /* Input & Auth Button Styles */
+        .stTextInput > div > div > input, .stSelectbox > div > div > div > input {
+            background-color: #1c2b4d;
+            border: 1px solid #334466;
+            color: white;
+            transition: all 0.2s ease;
+        }
+        .stTextInput > div > div > input:focus, .stTextInput > div > div > input:hover {
+            border-color: #6EC6FF !important;
+            box-shadow: 0 0 0 1px #6EC6FF;
+        }
+        div.stButton button[kind="primary"] {
+            background-color: white !important;
+            color: #2b70f0 !important;
+            border: 1px solid #2b70f0;
+            font-weight: bold;
+            box-shadow: 0 4px 10px rgba(0,0,0,0.3);
+            transition: all 0.3s ease-in-out;
+        }
+        div.stButton button[kind="primary"]:hover {
+            background-color: #f0f0f0 !important;
+            transform: scale(1.02);
+            border-color: #1748b0;
+        }
+        
+        /* Custom Styling for Simple Domain Cards/Buttons */
+        .domain-card {
+            background-color: #1c2b4d;
+            border: 2px solid #334466;
+            border-radius: 10px;
+            padding: 20px;
+            margin-bottom: 15px;
+            transition: all 0.3s ease;
+            box-shadow: 0 4px 8px rgba(0, 0, 0, 0.3);
+            text-align: center;
+        }
+        .domain-card:hover {
+            border-color: #6EC6FF;
+            box-shadow: 0 6px 12px rgba(0, 0, 0, 0.5);
+            transform: translateY(-3px);
+        }
+        .domain-card h3 {
+            color: #6EC6FF;
+            margin-top: 0;
+            font-size: 20px;
+        }
+        .domain-card p {
+            font-size: 14px;
+            color: #ccc;
+        }
+        
+        /* Sidebar styling for better appearance */
+        [data-testid="stSidebar"] {
+            background-color: #1c2b4d !important;
+            color: white;
+        }
+        
+        /* New: Entity Tagging Style Simulation */
+        .sentence-display {
+            font-size: 1.2em;
+            padding: 15px;
+            margin: 10px 0;
+            background-color: #1c2b4d;
+            border-radius: 8px;
+            border: 1px solid #334466;
+            min-height: 50px;
+        }
+    </style>
+"""
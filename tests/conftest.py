@@ -0,0 +1,24 @@
+import pytest
+
+import db
+import migrations
+import training_jobs
+
+@pytest.fixture(autouse=True, scope="session")
+def keep_off_app_database(tmp_path_factory):
+    """
+    Keeps tests (and any background workers they start, which outlive a test) away from the repo's users.db.
+    """
+    db.configure(str(tmp_path_factory.mktemp("db") / "users.db"))
+
+@pytest.fixture
+def database(tmp_path):
+    """Points db at a fresh, fully migrated database file for one test."""
+    db.configure(str(tmp_path / "users.db"))
+    migrations.ensure_schema()
+    return db.DB_PATH
+
+@pytest.fixture(autouse=True)
+def no_background_workers(monkeypatch):
+    """Worker threads outlive a test and would claim the next tests' jobs; tests run jobs themselves."""
+    monkeypatch.setattr(training_jobs, "start_workers", lambda *args, **kwargs: None)
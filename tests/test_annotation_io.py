@@ -0,0 +1,53 @@
+import sqlite3
+from io import BytesIO
+
+import pytest
+
+import annotation_io
+import db
+
+USER = "a@example.com"
+
+def _workspace():
+    db.execute("INSERT INTO workspaces (user_email, workspace_name, domain) VALUES (?, ?, ?)", (USER, "ws", "Travel & Booking"))
+
+def test_import_skips_bad_rows_and_round_trips_through_export(database):
+    _workspace()
+    source = BytesIO(
+        b'{"text": "Fly to Paris", "intent": "book_flight", "entities": "city:Paris"}\n'
+        b'not json\n'
+        b'{"text": "no intent"}\n'
+        b'{"utterance": "Cancel it", "label": "cancel", "entities": "oops"}\n'
+        b'{"sentence": "hello", "intent": "greet"}\n'
+    )
+
+    stats = annotation_io.import_annotations(source, "labels.jsonl", "ws", USER, chunksize=2)
+
+    assert stats == {"imported": 2, "skipped": 3}
+    out = BytesIO()
+    assert annotation_io.export_jsonl(out, "ws", USER) == 2
+    assert b'"entity_spans": [{"entity": "city", "value": "Paris", "start": 7, "end": 12}]' in out.getvalue()
+
+def test_each_chunk_is_committed_on_its_own(database, monkeypatch):
+    _workspace()
+    chunks = [[{"text": f"sentence {i}", "intent": "x"} for i in range(3)], [{"text": "last", "intent": "x"}]]
+
+    def read_records(source, file_format, chunksize):
+        yield chunks[0]
+        # The first chunk is visible to other connections and the write lock is free again
+        other = sqlite3.connect(database, timeout=0)
+        try:
+            assert other.execute("SELECT COUNT(*) FROM annotations").fetchone()[0] == 3
+            other.execute("BEGIN IMMEDIATE")
+            other.rollback()
+        finally:
+            other.close()
+        yield chunks[1]
+        raise OSError("upload interrupted")
+
+    monkeypatch.setattr(annotation_io, "_read_records", read_records)
+    with pytest.raises(OSError):
+        annotation_io.import_annotations(BytesIO(), "labels.csv", "ws", USER)
+
+    # Not atomic: chunks written before the failure stay imported
+    assert db.fetch_value("SELECT COUNT(*) FROM annotations") == 4
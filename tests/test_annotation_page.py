@@ -0,0 +1,51 @@
+from io import BytesIO
+from pathlib import Path
+
+from streamlit.testing.v1 import AppTest
+
+import db
+import training_jobs
+from ingestion import ingest_csv
+from model_store import save_model_artifact
+from nlu_engine import HashedIntentClassifier
+
+APP = str(Path(__file__).resolve().parent.parent / "chatbot_login_app.py")
+USER = "a@example.com"
+
+def _annotation_page():
+    db.execute("INSERT INTO workspaces (user_email, workspace_name, domain) VALUES (?, 'ws', 'Finance')", (USER,))
+    ingest_csv(BytesIO(b"text\ncheck my balance.\nbook a flight.\n"), "d.csv", "ws", USER)
+    save_model_artifact("ws", HashedIntentClassifier().fit(["check my balance", "book a flight"], ["balance", "book_flight"]))
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.session_state.logged_in_email = USER
+    at.session_state.current_workspace = "ws"
+    at.session_state.current_domain = "Finance"
+    at.query_params["page"] = "annotate"
+    return at
+
+def _prelabel_jobs():
+    return db.fetch_all("SELECT id, status FROM training_jobs WHERE mode=?", (training_jobs.PRELABEL,))
+
+def test_failed_prelabel_job_is_shown_not_requeued(database):
+    at = _annotation_page()
+    db.execute(
+        "INSERT INTO training_jobs (workspace_name, user_email, mode, model_version, status, message) VALUES (?, ?, ?, ?, ?, ?)",
+        ("ws", USER, training_jobs.PRELABEL, "v1", training_jobs.FAILED, "boom")
+    )
+
+    for _ in range(3):
+        at.run()
+
+    assert not at.exception
+    assert _prelabel_jobs() == [(1, training_jobs.FAILED)]
+    assert any("boom" in error.value for error in at.error)
+
+def test_prelabel_job_is_queued_once_per_dataset_and_version(database):
+    at = _annotation_page()
+
+    for _ in range(3):
+        at.run()
+
+    assert not at.exception
+    assert _prelabel_jobs() == [(1, training_jobs.QUEUED)]
+    assert db.fetch_value("SELECT model_version FROM training_jobs") == "v1"
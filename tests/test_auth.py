@@ -0,0 +1,36 @@
+import pytest
+
+import auth
+
+@pytest.fixture(autouse=True)
+def fresh_throttles(monkeypatch):
+    monkeypatch.setattr(auth, "EMAIL_THROTTLE", auth.TokenBucketThrottle(*auth.EMAIL_BUCKET))
+    monkeypatch.setattr(auth, "IP_THROTTLE", auth.TokenBucketThrottle(2, 1 / 6))
+
+def test_unknown_ip_only_uses_email_bucket():
+    for i in range(10):
+        auth.check_attempt(f"user{i}@example.com", None)
+    assert auth.IP_THROTTLE._buckets == {}
+
+def test_email_bucket_still_applies_without_ip():
+    for _ in range(auth.EMAIL_BUCKET[0]):
+        auth.check_attempt("a@example.com", None)
+    with pytest.raises(auth.AuthThrottled):
+        auth.check_attempt("a@example.com", None)
+    auth.check_attempt("b@example.com", None)
+
+def test_known_ip_is_throttled():
+    auth.check_attempt("a@example.com", "203.0.113.5")
+    auth.check_attempt("b@example.com", "203.0.113.5")
+    with pytest.raises(auth.AuthThrottled):
+        auth.check_attempt("c@example.com", "203.0.113.5")
+    auth.check_attempt("c@example.com", "203.0.113.6")
+
+def test_client_ip_ignores_forwarded_for_from_untrusted_peers():
+    assert auth.client_ip(None, "203.0.113.5", trusted_proxies=set()) is None
+    assert auth.client_ip("198.51.100.1", "203.0.113.5", trusted_proxies=set()) == "198.51.100.1"
+
+def test_client_ip_uses_nearest_untrusted_forwarded_hop():
+    trusted = {"127.0.0.1", "10.0.0.2"}
+    assert auth.client_ip(None, "1.2.3.4, 203.0.113.5, 10.0.0.2", trusted_proxies=trusted) == "203.0.113.5"
+    assert auth.client_ip(None, None, trusted_proxies=trusted) is None
@@ -0,0 +1,26 @@
+import benchmark
+import db
+import inference
+from prediction_cache import PREDICTION_CACHE
+
+def test_uncached_batches_miss_every_time_they_are_rerun(database):
+    db.execute("INSERT INTO workspaces (user_email, workspace_name, domain) VALUES ('b@example.com', 'ws', 'Finance')")
+    batch = [text for text, _ in benchmark.generate_corpus(50, "Finance")]
+    conn = db.get_connection()
+
+    for _ in range(3):
+        before = PREDICTION_CACHE.stats()
+        benchmark.timed_uncached(inference.predict_batch, conn, "ws", "Finance", batch)
+        after = PREDICTION_CACHE.stats()
+        assert after["hits"] == before["hits"]
+        assert after["misses"] - before["misses"] == len(batch)
+
+    PREDICTION_CACHE.clear()
+    before = PREDICTION_CACHE.stats()
+    benchmark.timed_cached(inference.predict_batch, conn, "ws", "Finance", batch)
+    assert PREDICTION_CACHE.stats()["hits"] - before["hits"] == len(batch)
+
+def test_batch_rows_count_a_short_last_batch_once(tmp_path):
+    results = {r["name"]: r for r in benchmark.run_size(1_500, "Finance", 1, str(tmp_path))}
+    assert results["predict_batch"]["rows"] == 1_500
+    assert results["predict_batch_repeat"]["rows"] == 1_500
@@ -0,0 +1,56 @@
+import threading
+import time
+
+import pytest
+
+from cache import BoundedLRUCache, TTLCache
+
+def _concurrent_misses(cache, threads=8):
+    loads = []
+    start = threading.Barrier(threads)
+
+    def loader():
+        loads.append(1)
+        time.sleep(0.05)
+        return "model"
+
+    def worker(results):
+        start.wait()
+        results.append(cache.get_or_load("key", loader))
+
+    results = []
+    pool = [threading.Thread(target=worker, args=(results,)) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return loads, results
+
+@pytest.mark.parametrize("cache", [BoundedLRUCache(4), TTLCache(ttl_seconds=60, max_entries=4)])
+def test_concurrent_misses_load_once(cache):
+    loads, results = _concurrent_misses(cache)
+    assert len(loads) == 1
+    assert results == ["model"] * 8
+    assert cache._load_locks == {}
+
+def test_failed_load_releases_its_lock():
+    cache = BoundedLRUCache(4)
+
+    def loader():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_load("key", loader)
+    assert cache._load_locks == {}
+    assert cache.get_or_load("key", lambda: "model") == "model"
+
+def test_lru_eviction_by_count_and_bytes():
+    cache = BoundedLRUCache(max_entries=2, max_bytes=10, sizeof=len)
+    cache.put("a", "xxxx")
+    cache.put("b", "xxxx")
+    cache.get("a")
+    cache.put("c", "xxxx")
+    assert cache.get("b") is None and cache.get("a") == "xxxx"
+    cache.put("d", "x" * 11)
+    assert cache.get("d") is None
+    assert cache.total_bytes == 8
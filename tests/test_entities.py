@@ -0,0 +1,77 @@
+import json
+
+import entities
+from entities import EntityExtractor, build_extractor, get_entity_extractor, locate_spans, spans_json_for
+
+def _spans(extractor, text):
+    return [(span["entity"], span["value"], text[span["start"]:span["end"]]) for span in extractor.extract(text)]
+
+def test_gazetteer_and_regex_spans_carry_character_offsets():
+    extractor = EntityExtractor([("city", "Paris"), ("city", "New York")], [("email", entities.BUILTIN_ENTITY_PATTERNS["email"])])
+    text = "Fly from new  york to PARIS, mail jo@example.com."
+
+    spans = extractor.extract(text)
+
+    assert [(s["entity"], s["start"], s["end"]) for s in spans] == [("city", 9, 18), ("city", 22, 27), ("email", 34, 48)]
+    # Gazetteer values are the phrase as defined, regex values the matched text
+    assert [s["value"] for s in spans] == ["New York", "Paris", "jo@example.com"]
+    assert extractor.entity_types == ["city", "email"]
+
+def test_every_occurrence_is_a_span_but_the_summary_keeps_the_first():
+    extractor = EntityExtractor([("city", "Rome"), ("city", "Paris")])
+
+    entities_json, spans_json = extractor.extract_json("Rome, then Paris, then Rome again")
+
+    assert json.loads(entities_json) == {"city": "Rome"}
+    assert [(s["start"], s["end"]) for s in json.loads(spans_json)] == [(0, 4), (11, 16), (23, 27)]
+
+def test_overlapping_candidates_go_to_the_longest_span():
+    extractor = EntityExtractor(
+        [("city", "York"), ("city", "New York"), ("state", "New York State")],
+        [("money", entities.BUILTIN_ENTITY_PATTERNS["money"]), ("number", entities.BUILTIN_ENTITY_PATTERNS["number"])],
+    )
+    text = "New York State costs $1,200.50 or 3 more"
+
+    assert _spans(extractor, text) == [
+        ("state", "New York State", "New York State"),
+        ("money", "$1,200.50", "$1,200.50"),
+        ("number", "3", "3"),
+    ]
+
+def test_gazetteer_matches_whole_words_only():
+    extractor = EntityExtractor([("city", "Rome")])
+    assert extractor.extract("Romeo and Jerome") == []
+    assert extractor.extract("") == []
+
+def test_locate_spans_finds_values_case_insensitively():
+    assert locate_spans("Book a flight to Paris.", {"city": "paris", "date": "today"}) == [
+        {"entity": "city", "value": "paris", "start": 17, "end": 22},
+        {"entity": "date", "value": "today", "start": None, "end": None},
+    ]
+    assert json.loads(spans_json_for("Book a flight to Paris.", '{"city": "Paris"}')) == [
+        {"entity": "city", "value": "Paris", "start": 17, "end": 22}
+    ]
+    assert spans_json_for("x", "not json") is None
+    assert spans_json_for("x", "[1, 2]") is None
+
+def test_workspace_definitions_extend_and_override_domain_defaults(database):
+    entities.add_gazetteer_entries("ws", "airline", ["Air France", "  ", ""])
+    entities.set_entity_pattern("ws", "date", r"\bnext \w+day\b")
+    extractor = build_extractor("Travel & Booking", "ws")
+    text = "Air France to Tokyo next Monday, not 2025-01-02"
+
+    assert _spans(extractor, text) == [
+        ("airline", "Air France", "Air France"),
+        ("city", "Tokyo", "Tokyo"),
+        ("date", "next Monday", "next Monday"),
+    ]
+    assert entities.list_entity_types("ws") == [("airline", "gazetteer", 1), ("date", "regex", r"\bnext \w+day\b")]
+
+def test_cached_extractor_is_rebuilt_for_a_new_rules_version(database):
+    first = get_entity_extractor("Finance", "ws", rules_version=1)
+    assert get_entity_extractor("Finance", "ws", rules_version=1) is first
+
+    second = get_entity_extractor("Finance", "ws", rules_version=2)
+
+    assert second is not first
+    assert ("Finance", "ws", 1) not in entities.EXTRACTOR_CACHE._entries
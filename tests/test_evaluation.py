@@ -0,0 +1,69 @@
+import json
+
+import numpy as np
+
+import evaluation
+from entities import EntityExtractor
+from nlu_engine import HashedIntentClassifier
+
+EXAMPLES = {
+    "balance": ["check my balance", "how much money do I have", "show my account balance", "what is my balance",
+                "balance please", "money left in my account", "account balance today", "remaining balance"],
+    "transfer": ["send money to alice", "transfer 20 dollars", "wire funds to bob", "move money to savings",
+                 "transfer to my friend", "send cash to mom", "make a transfer", "pay back carol"],
+    "card": ["block my card", "lost my credit card", "freeze the card", "card was stolen",
+             "replace my debit card", "new card please", "my card is broken", "cancel card"],
+}
+TEXTS = [text for texts in EXAMPLES.values() for text in texts]
+INTENTS = [intent for intent, texts in EXAMPLES.items() for _ in texts]
+
+def test_stratified_folds_are_deterministic_and_spread_each_intent():
+    y = np.array([0] * 10 + [1] * 7 + [2] * 2)
+
+    folds = evaluation.stratified_folds(y, k=5)
+
+    assert np.array_equal(folds, evaluation.stratified_folds(y, k=5))
+    assert set(folds.tolist()) <= set(range(5))
+    for label, size in [(0, 10), (1, 7), (2, 2)]:
+        per_fold = np.bincount(folds[y == label], minlength=5)
+        assert per_fold.max() - per_fold.min() <= 1 and per_fold.sum() == size
+
+def test_subtracted_counts_match_retraining_on_the_other_folds():
+    labels = sorted(EXAMPLES)
+    y = np.array([labels.index(intent) for intent in INTENTS])
+    k = 4
+
+    predicted = evaluation.cross_validate(TEXTS, y, len(labels), k)
+
+    folds = evaluation.stratified_folds(y, k)
+    for f in range(k):
+        train = np.flatnonzero(folds != f)
+        held_out = np.flatnonzero(folds == f)
+        model = HashedIntentClassifier().fit([TEXTS[i] for i in train], [INTENTS[i] for i in train])
+        expected = model.predict_proba([TEXTS[i] for i in held_out]).argmax(axis=1)
+        assert model.labels == labels
+        assert predicted[held_out].tolist() == expected.tolist()
+
+def test_intent_metrics():
+    accuracy, macro_f1, rows, confusion = evaluation.intent_metrics(["a", "b"], np.array([0, 0, 1, 1]), np.array([0, 1, 1, 1]))
+
+    assert accuracy == 0.75
+    assert confusion == [[1, 1], [0, 2]]
+    assert rows[0] == {"intent": "a", "precision": 1.0, "recall": 0.5, "f1": 0.6667, "support": 2}
+    assert rows[1] == {"intent": "b", "precision": 0.6667, "recall": 1.0, "f1": 0.8, "support": 2}
+    assert macro_f1 == round((0.6667 + 0.8) / 2, 4)
+
+def test_evaluate_examples_report():
+    extractor = EntityExtractor([("person", "alice"), ("person", "bob")])
+    gold = [json.dumps({"person": "Alice"}) if "alice" in text else None for text in TEXTS]
+
+    report = evaluation.evaluate_examples(TEXTS, INTENTS, gold, extractor)
+
+    assert report["n_examples"] == len(TEXTS) and report["k_folds"] == evaluation.K_FOLDS
+    assert report["labels"] == ["balance", "card", "transfer"]
+    assert sum(map(sum, report["confusion"])) == len(TEXTS)
+    # "bob" is extracted but not annotated
+    assert report["entities"]["per_entity"] == [
+        {"entity": "person", "precision": 0.5, "recall": 1.0, "f1": 0.6667, "support": 1}
+    ]
+    assert evaluation.evaluate_examples(["only one"], ["a"], [None], extractor) is None
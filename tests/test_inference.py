@@ -0,0 +1,41 @@
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import db
+import inference
+
+REPO = Path(__file__).resolve().parent.parent
+
+def _in_other_process(database, statements):
+    """Runs SQL writes from a separate Python process, as the app would while a server keeps its caches."""
+    script = textwrap.dedent(f"""
+        import db
+        db.configure({database!r})
+        with db.transaction() as conn:
+            for sql, params in {statements!r}:
+                conn.execute(sql, params)
+    """)
+    subprocess.run([sys.executable, "-c", script], cwd=REPO, check=True)
+
+def _predict(text):
+    return inference.predict_intent_and_entities(db.get_connection(), text, "Sports", "ws")
+
+def test_trigger_phrase_from_other_process_reaches_cached_rules(database):
+    assert _predict("zorblax please")[0] == "default_fallback"
+
+    _in_other_process(database, [(
+        "INSERT INTO trigger_phrases (workspace_name, intent, phrase) VALUES (?, ?, ?)", ("ws", "greeting", "zorblax")
+    )])
+
+    assert _predict("zorblax please")[0] == "greeting"
+
+def test_gazetteer_entry_from_other_process_reaches_cached_extractor(database):
+    assert "team" not in _predict("tickets for the quuxers")[1]
+
+    _in_other_process(database, [(
+        "INSERT INTO gazetteer_entries (workspace_name, entity_type, phrase) VALUES (?, ?, ?)", ("ws", "team", "quuxers")
+    )])
+
+    assert '"team": "quuxers"' in _predict("tickets for the quuxers")[1]
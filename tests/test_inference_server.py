@@ -0,0 +1,17 @@
+import pytest
+
+import db
+from inference_server import HTTPError, PredictionBackend
+
+def test_backend_sees_workspace_changes_without_restart(database):
+    backend = PredictionBackend(database)
+    try:
+        with pytest.raises(HTTPError):
+            backend._predict("ws", ["hello"])
+        db.execute("INSERT INTO workspaces (user_email, workspace_name, domain) VALUES ('a@example.com', 'ws', 'Finance')")
+        assert backend._predict("ws", ["hello"])[0]["intent"]
+        db.execute("DELETE FROM workspaces WHERE workspace_name='ws'")
+        with pytest.raises(HTTPError):
+            backend._predict("ws", ["hello"])
+    finally:
+        backend.close()
@@ -0,0 +1,54 @@
+import json
+
+import db
+from ingestion import ensure_sentences
+from segmenter import sentence_key
+
+USER = "a@example.com"
+# Rows the old annotation page joined with spaces and split on '.', dropping the periods
+CSV = b"text\nBook a flight to Paris.\nCancel my order.\nWhat is my balance?\n"
+
+def _legacy_dataset(workspace="ws"):
+    db.execute(
+        "INSERT INTO datasets (workspace_name, user_email, filename, data) VALUES (?, ?, ?, ?)",
+        (workspace, USER, "legacy.csv", CSV)
+    )
+
+def _annotate(sentence, intent, entities_json=None, workspace="ws"):
+    db.execute(
+        "INSERT INTO annotations (workspace_name, user_email, sentence, intent, entities_json) VALUES (?, ?, ?, ?, ?)",
+        (workspace, USER, sentence, intent, entities_json)
+    )
+
+def _labels():
+    return dict(db.fetch_all("SELECT sentence, intent FROM annotations WHERE workspace_name='ws' AND user_email=?", (USER,)))
+
+def test_sentence_key_ignores_terminal_punctuation_case_and_spacing():
+    assert sentence_key("Book a  flight to Paris.") == sentence_key("book a flight to paris")
+    assert sentence_key("What is my balance?") == "what is my balance"
+
+def test_legacy_conversion_rekeys_annotations(database):
+    _legacy_dataset()
+    _annotate("Book a flight to Paris", "book_flight", '{"city": "Paris"}')
+    _annotate("Cancel my order", "cancel_order")
+
+    dataset = ensure_sentences("ws", USER)
+
+    sentences = [row[0] for row in db.fetch_all(
+        "SELECT sentence FROM sentences WHERE dataset_id=? ORDER BY position", (dataset["id"],)
+    )]
+    assert sentences == ["Book a flight to Paris.", "Cancel my order.", "What is my balance?"]
+    assert _labels() == {"Book a flight to Paris.": "book_flight", "Cancel my order.": "cancel_order"}
+    spans = db.fetch_value("SELECT entity_spans_json FROM annotations WHERE sentence=?", ("Book a flight to Paris.",))
+    assert json.loads(spans) == [{"entity": "city", "value": "Paris", "start": 17, "end": 22}]
+    counts = dict(db.fetch_all("SELECT intent, label_count FROM annotation_counts WHERE workspace_name='ws'"))
+    assert counts == {"book_flight": 1, "cancel_order": 1}
+
+def test_legacy_conversion_keeps_label_already_on_new_sentence(database):
+    _legacy_dataset()
+    _annotate("Book a flight to Paris", "old")
+    _annotate("Book a flight to Paris.", "new")
+
+    ensure_sentences("ws", USER)
+
+    assert _labels() == {"Book a flight to Paris": "old", "Book a flight to Paris.": "new"}
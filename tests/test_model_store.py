@@ -0,0 +1,14 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+from model_store import save_model_artifact
+from nlu_engine import HashedIntentClassifier
+
+def test_concurrent_saves_get_distinct_versions(database):
+    model = HashedIntentClassifier().fit(["book a flight", "check my balance"], ["book_flight", "balance"])
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        versions = list(pool.map(lambda _: save_model_artifact("ws", model), range(4)))
+
+    assert sorted(versions) == ["v1", "v2", "v3", "v4"]
+    assert db.fetch_value("SELECT model_version FROM models WHERE workspace_name='ws'") in versions
@@ -0,0 +1,68 @@
+import numpy as np
+
+import annotation_store
+import db
+import training_jobs
+from model_store import load_model_artifact
+from nlu_engine import HashedIntentClassifier
+
+BASE = [
+    ("book a flight to paris", "book_flight"),
+    ("i need a plane ticket", "book_flight"),
+    ("check my balance", "balance"),
+    ("how much money do i have", "balance"),
+    ("hello there", "greeting"),
+]
+CHANGES = [
+    ("fly me to rome tomorrow", "book_flight"),   # new
+    ("what is left in my account", "balance"),    # new
+    ("hello there", "balance"),                   # relabeled
+    ("check my balance", "balance"),              # unchanged
+    ("hi", "greeting"),                           # new, keeps greeting alive
+]
+PROBES = ["book a flight", "balance please", "hello", "hi there", "plane to rome", "money"]
+
+def _final():
+    final = dict(BASE)
+    final.update(CHANGES)
+    return list(final), list(final.values())
+
+def test_partial_fit_matches_a_full_fit_of_the_final_data():
+    texts, labels = zip(*BASE)
+    incremental = HashedIntentClassifier().fit(texts, labels)
+    changed = incremental.partial_fit(*zip(*CHANGES))
+
+    full = HashedIntentClassifier().fit(*_final())
+
+    assert changed == 4
+    assert incremental.labels == full.labels
+    np.testing.assert_array_equal(incremental.class_counts, full.class_counts)
+    np.testing.assert_array_equal(incremental.feature_counts, full.feature_counts)
+    np.testing.assert_allclose(incremental.predict_proba(PROBES), full.predict_proba(PROBES), rtol=1e-5)
+
+def _annotate(rows):
+    annotation_store.upsert_annotations([("ws", "a@example.com", text, intent, "{}") for text, intent in rows])
+
+def _train(mode):
+    job_id = training_jobs.enqueue_job("ws", "a@example.com", mode)
+    training_jobs.run_job(training_jobs.claim_next_job())
+    job = training_jobs.get_job(job_id)
+    assert job["status"] == training_jobs.SUCCEEDED, job["message"]
+    return job
+
+def test_incremental_job_matches_full_retrain(database):
+    _annotate(BASE)
+    _train(training_jobs.FULL)
+    # Make the watermark older than the changes, as if they were made after the last run
+    db.execute("UPDATE annotations SET last_modified=datetime('now', '-1 hour')")
+    _annotate(CHANGES)
+
+    incremental_job = _train(training_jobs.INCREMENTAL)
+    assert "incrementally" in incremental_job["message"]
+    incremental = load_model_artifact(db.get_connection(), "ws", 2)
+    _train(training_jobs.FULL)
+    full = load_model_artifact(db.get_connection(), "ws", 3)
+
+    np.testing.assert_array_equal(incremental.class_counts, full.class_counts)
+    np.testing.assert_array_equal(incremental.feature_counts, full.feature_counts)
+    np.testing.assert_allclose(incremental.predict_proba(PROBES), full.predict_proba(PROBES), rtol=1e-5)
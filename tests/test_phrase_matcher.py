@@ -0,0 +1,42 @@
+from intent_rules import compile_rule_table, match_intent
+from phrase_matcher import PhraseMatcher
+
+def _matcher(*phrases):
+    matcher = PhraseMatcher()
+    for phrase in phrases:
+        matcher.add(phrase, phrase)
+    return matcher
+
+def test_matches_whole_tokens_case_insensitively_with_offsets():
+    text = "Hi, this is New  York!"
+    matches = _matcher("hi", "new york", "is").find(text)
+    assert [(text[start:end], phrase) for start, end, phrase, _ in matches] == [
+        ("Hi", "hi"), ("is", "is"), ("New  York", "new york")
+    ]
+
+def test_reports_overlapping_and_nested_matches():
+    matches = _matcher("a b c", "b c d", "c").find("a b c d")
+    assert sorted((start, end, phrase) for start, end, phrase, _ in matches) == [
+        (0, 5, "a b c"), (2, 7, "b c d"), (4, 5, "c")
+    ]
+
+def test_follows_failure_links_after_a_partial_match():
+    matches = _matcher("new york city", "york").find("new york state")
+    assert [phrase for _, _, phrase, _ in matches] == ["york"]
+
+def test_phrases_added_after_a_search_do_not_duplicate_matches():
+    matcher = _matcher("new york", "york")
+    matcher.find("new york")
+    matcher.add("city", "city")
+    assert [phrase for _, _, phrase, _ in matcher.find("new york city")] == ["new york", "york", "city"]
+
+def test_empty_phrases_and_texts():
+    matcher = _matcher("", "!!")
+    assert matcher.phrase_count == 0
+    assert matcher.find("") == []
+
+def test_longest_phrase_wins_and_ties_go_to_the_first_intent():
+    matcher = compile_rule_table({"greeting": ["hello"], "book_flight": ["hello book a flight"], "other": ["hello"]})
+    assert match_intent(matcher, "hello book a flight please")[0] == "book_flight"
+    assert match_intent(matcher, "hello there")[0] == "greeting"
+    assert match_intent(matcher, "nothing here")[0] == "default_fallback"
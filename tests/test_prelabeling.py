@@ -0,0 +1,54 @@
+from io import BytesIO
+
+import db
+import prelabeling
+import training_jobs
+from ingestion import ingest_csv
+from model_store import save_model_artifact
+from training import train_classifier
+
+USER = "a@example.com"
+CSV = b"text\n" + b"".join(b"book a flight to city %d.\ncheck my balance %d.\n" % (i, i) for i in range(25))
+
+def _workspace_with_model():
+    db.execute("INSERT INTO workspaces (user_email, workspace_name, domain) VALUES (?, ?, ?)", (USER, "ws", "Finance"))
+    dataset_id = ingest_csv(BytesIO(CSV), "d.csv", "ws", USER)["dataset_id"]
+    model = train_classifier(["book a flight", "fly me to rome", "check my balance", "how much money"],
+                             ["book_flight", "book_flight", "balance", "balance"])
+    save_model_artifact("ws", model)
+    return dataset_id
+
+def test_prelabels_are_written_in_chunks_and_replace_older_versions(database):
+    dataset_id = _workspace_with_model()
+    db.execute("INSERT INTO prelabels (dataset_id, model_version, position, intent) VALUES (?, 0, 0, 'stale')", (dataset_id,))
+    calls = []
+
+    version = prelabeling.compute_prelabels(dataset_id, "ws", batch_size=20, progress=lambda done, total: calls.append((done, total)))
+
+    assert calls == [(20, 50), (40, 50), (50, 50)]
+    assert prelabeling.has_prelabels(dataset_id, version, 50)
+    assert db.fetch_all("SELECT DISTINCT model_version FROM prelabels") == [(version,)]
+    assert db.fetch_value("SELECT COUNT(*) FROM prelabels") == 50
+
+def test_has_prelabels_waits_for_the_last_chunk(database):
+    dataset_id = _workspace_with_model()
+    db.execute("INSERT INTO prelabels (dataset_id, model_version, position, intent) VALUES (?, 1, 0, 'x')", (dataset_id,))
+    assert not prelabeling.has_prelabels(dataset_id, 1, 50)
+
+def test_prelabel_job_runs_on_the_worker(database):
+    dataset_id = _workspace_with_model()
+
+    job_id = training_jobs.enqueue_job("ws", USER, training_jobs.PRELABEL)
+    assert training_jobs.enqueue_job("ws", USER, training_jobs.PRELABEL) == job_id
+    training_jobs.run_job(training_jobs.claim_next_job())
+
+    job = training_jobs.get_job(job_id)
+    assert job["status"] == training_jobs.SUCCEEDED and job["model_version"] == "v1"
+    assert prelabeling.has_prelabels(dataset_id, 1, 50)
+    # Pre-labeling jobs are not shown as training runs
+    assert training_jobs.get_latest_job("ws") is None
+
+def test_training_request_upgrades_a_queued_prelabel_job(database):
+    job_id = training_jobs.enqueue_job("ws", USER, training_jobs.PRELABEL)
+    assert training_jobs.enqueue_job("ws", USER, training_jobs.INCREMENTAL) == job_id
+    assert training_jobs.get_job(job_id)["mode"] == training_jobs.INCREMENTAL
@@ -0,0 +1,40 @@
+import pytest
+
+from segmenter import SentenceSegmenter, segment_rows
+
+split = SentenceSegmenter().split
+
+@pytest.mark.parametrize("text, expected", [
+    ("Book a flight. Cancel it!", ["Book a flight.", "Cancel it!"]),
+    ("Is it open? Yes.", ["Is it open?", "Yes."]),
+    ("no punctuation at all", ["no punctuation at all"]),
+    ("It costs 3.14 dollars. Pay now.", ["It costs 3.14 dollars.", "Pay now."]),
+    ("Mail a.b@example.com or see example.com/x.html today.", ["Mail a.b@example.com or see example.com/x.html today."]),
+    ("Dr. Smith and Mrs. Jones met. They talked.", ["Dr. Smith and Mrs. Jones met.", "They talked."]),
+    ("Bring fruit, e.g. apples. Thanks.", ["Bring fruit, e.g. apples.", "Thanks."]),
+    ("J. R. R. Tolkien wrote it. Read it.", ["J. R. R. Tolkien wrote it.", "Read it."]),
+    ("Meet at 3 p.m. tomorrow.", ["Meet at 3 p.m. tomorrow."]),
+    ('He said "stop." Then left.', ['He said "stop."', "Then left."]),
+    ("Really?! Yes (really.) Ok", ["Really?!", "Yes (really.)", "Ok"]),
+    ("Wait... what", ["Wait...", "what"]),
+    ("  spaced   out.\n\nNext\tline  ", ["spaced out.", "Next line"]),
+    ("Dept.\tof Health. Call us.", ["Dept. of Health.", "Call us."]),
+    ("", []),
+    ("   ", []),
+    ("...", ["..."]),
+])
+def test_split(text, expected):
+    assert split(text) == expected
+
+def test_non_string_rows():
+    assert split(42) == ["42"]
+
+def test_custom_abbreviations():
+    assert SentenceSegmenter(["Approx"]).split("Approx. ten. Done.") == ["Approx. ten.", "Done."]
+
+def test_segment_rows_dedupes_case_insensitively_across_calls():
+    seen = set()
+    first = list(segment_rows(["Hi there. Book a flight.", "hi there."], 0, seen))
+    second = list(segment_rows(["BOOK A FLIGHT. New one."], 2, seen))
+    assert first == [(0, "Hi there."), (0, "Book a flight.")]
+    assert second == [(2, "New one.")]
@@ -0,0 +1,56 @@
+from pathlib import Path
+
+import bcrypt
+from streamlit.testing.v1 import AppTest
+
+import db
+import sessions
+
+APP = str(Path(__file__).resolve().parent.parent / "chatbot_login_app.py")
+
+def test_rotate_session_retires_the_old_token(database):
+    token = sessions.create_session("a@example.com")
+
+    email, rotated = sessions.rotate_session(token)
+
+    assert email == "a@example.com" and rotated != token
+    assert sessions.resolve_session(token) is None
+    assert sessions.resolve_session(rotated) == "a@example.com"
+    assert sessions.rotate_session("forged.signature") == (None, None)
+
+def _logged_in_app():
+    db.execute(
+        "INSERT INTO users (name, email, password) VALUES (?, ?, ?)",
+        ("A", "a@example.com", bcrypt.hashpw(b"pw", bcrypt.gensalt(4)))
+    )
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.query_params["page"] = "login"
+    at.run()
+    at.text_input(key="log_email").input("a@example.com")
+    at.text_input(key="log_password").input("pw")
+    at.button[0].click().run()
+    assert at.session_state.logged_in_email == "a@example.com"
+    return at
+
+def test_logout_saves_pending_labels_and_clears_user_state(database):
+    at = _logged_in_app()
+    token = at.query_params[sessions.SESSION_QUERY_PARAM][0]
+    at.session_state.current_workspace = "ws"
+    at.session_state.annotation_dataset = {"id": 1}
+    at.session_state.annotation_index = 5
+    at.session_state.annotation_queue = (("key",), [3, 1])
+    at.session_state.annotation_export = ("ws", "jsonl", 1, b"{}")
+    at.session_state.polling_job_id = 7
+    at.session_state.annotation_buffer.add("ws", "a@example.com", "hello there", "greeting", "{}")
+
+    at.button(key="logout_sidebar").click().run()
+
+    assert not at.exception
+    assert db.fetch_all("SELECT user_email, sentence, intent FROM annotations") == [("a@example.com", "hello there", "greeting")]
+    state = at.session_state
+    assert state.logged_in_email is None and state.current_workspace is None
+    assert state.annotation_dataset is None and state.annotation_queue is None and state.annotation_index == 0
+    assert len(state.annotation_buffer) == 0
+    assert "annotation_export" not in state and "polling_job_id" not in state
+    assert sessions.SESSION_QUERY_PARAM not in at.query_params
+    assert sessions.resolve_session(token) is None
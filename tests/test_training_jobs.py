@@ -0,0 +1,33 @@
+import sqlite3
+import threading
+
+import training_jobs
+
+def test_worker_survives_a_failing_poll(database, monkeypatch):
+    monkeypatch.setattr(training_jobs, "WORKER_ERROR_BACKOFF_SECONDS", 0.01)
+    monkeypatch.setattr(training_jobs, "WORKER_POLL_SECONDS", 0.01)
+    claim = training_jobs.claim_next_job
+    calls = []
+
+    def flaky_claim():
+        calls.append(1)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return claim()
+
+    monkeypatch.setattr(training_jobs, "claim_next_job", flaky_claim)
+    stop = threading.Event()
+    worker = threading.Thread(target=training_jobs.work, args=(stop,), daemon=True)
+    worker.start()
+    try:
+        # No annotations: the job runs and fails cleanly, which is enough to show the worker picked it up
+        job_id = training_jobs.enqueue_job("ws", "a@example.com", training_jobs.FULL)
+        for _ in range(500):
+            if training_jobs.get_job(job_id)["status"] not in training_jobs.ACTIVE_STATUSES:
+                break
+            stop.wait(0.01)
+        assert training_jobs.get_job(job_id)["status"] == training_jobs.FAILED
+        assert worker.is_alive()
+    finally:
+        stop.set()
+        worker.join(5)
@@ -0,0 +1,118 @@
+"""
+Multi-core training pipeline for the HashedNB intent classifier.
+
+Tokenization and feature hashing dominate training time, and Naive Bayes
+only needs per-class feature counts, which add up across shards. Large
+training sets are therefore split into shards that worker processes count
+independently (see nlu_engine.count_features); the parent sums the shard
+counts and builds the model from them. Small sets are trained in-process,
+where pickling and worker start-up would cost more than they save.
+
+The worker pool is created lazily and reused across runs. It uses the
+"spawn" start method, because forking the multi-threaded Streamlit server
+is not safe.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+import perf
+from nlu_engine import N_FEATURES, HashedIntentClassifier, count_features, example_keys
+
+SHARD_SIZE = 25_000
+PARALLEL_MIN_EXAMPLES = 50_000
+MAX_TRAINING_WORKERS = max(1, min(8, (os.cpu_count() or 1) - 1))
+
+class TrainingCancelled(Exception):
+    """Raised when a training run is cancelled before it finishes."""
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_training_pool():
+    """Returns the shared worker pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=MAX_TRAINING_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+@atexit.register
+def shutdown_training_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def _count_shard(texts, y, n_classes, n_features):
+    """Worker entry point: counts one shard."""
+    return count_features(texts, y, n_classes, n_features)
+
+@perf.timed("training")
+def train_classifier(texts, labels, progress=None, cancel_event=None, workers=None, shard_size=SHARD_SIZE):
+    """
+    Trains a HashedIntentClassifier, sharding feature extraction over worker processes for large inputs.
+
+    progress(done, total) is called as shards finish (always from the calling thread).
+    Setting cancel_event (a threading.Event) stops the run with TrainingCancelled;
+    pending shards are cancelled when the run stops for any reason. workers=1 forces an in-process run.
+    """
+    texts = [str(text) for text in texts]
+    label_names = sorted(set(labels))
+    label_index = {label: i for i, label in enumerate(label_names)}
+    y = np.fromiter((label_index[label] for label in labels), dtype=np.int64, count=len(labels))
+    n_classes = len(label_names)
+
+    starts = range(0, len(texts), shard_size)
+    total = len(starts)
+    workers = MAX_TRAINING_WORKERS if workers is None else workers
+
+    def check_cancelled():
+        if cancel_event is not None and cancel_event.is_set():
+            raise TrainingCancelled("Training was cancelled.")
+
+    feature_counts = np.zeros((n_classes, N_FEATURES), dtype=np.float32)
+    class_counts = np.zeros(n_classes, dtype=np.float64)
+
+    if workers <= 1 or len(texts) < PARALLEL_MIN_EXAMPLES:
+        for done, start in enumerate(starts, start=1):
+            check_cancelled()
+            shard_features, shard_classes = count_features(
+                texts[start:start + shard_size], y[start:start + shard_size], n_classes
+            )
+            feature_counts += shard_features
+            class_counts += shard_classes
+            if progress:
+                progress(done, total)
+    else:
+        pool = get_training_pool()
+        pending = {
+            pool.submit(_count_shard, texts[start:start + shard_size], y[start:start + shard_size], n_classes, N_FEATURES)
+            for start in starts
+        }
+        done = 0
+        try:
+            while pending:
+                check_cancelled()
+                # Wake up periodically so a cancel request is noticed even while shards are running
+                finished, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    shard_features, shard_classes = future.result()
+                    feature_counts += shard_features
+                    class_counts += shard_classes
+                    done += 1
+                if finished and progress:
+                    progress(done, total)
+        finally:
+            for future in pending:
+                future.cancel()
+
+    return HashedIntentClassifier.from_counts(label_names, feature_counts, class_counts, example_keys(texts), y)
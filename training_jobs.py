@@ -0,0 +1,316 @@
+"""
+Background training job queue.
+
+Clicking "Start Model Training" only inserts a row into training_jobs. Worker
+threads (started once per process by start_workers(), or run standalone with
+`python training_jobs.py`) claim queued jobs, train outside the Streamlit
+script thread and write progress, status and the resulting model version back
+to the row, which the Train and Evaluate pages poll. Closing the browser tab
+no longer loses the run, and MAX_CONCURRENT_JOBS bounds how many workspaces
+retrain at once; the rest wait in the queue.
+
+There is at most one open job per workspace: enqueueing while one is
+queued or running returns the existing job. A running job whose heartbeat
+stops (its process died) is requeued after STALE_JOB_SECONDS.
+
+Jobs default to incremental mode: the current model is updated in place
+(HashedIntentClassifier.partial_fit) from the annotations modified since the
+model's trained_through watermark. A full retrain happens instead when there
+is no usable model, the set of intents changed, or the per-intent counters
+show annotations were deleted.
+
+The same workers run pre-labeling jobs (mode PRELABEL), which score the
+annotator's dataset with the current model without retraining it. A queued
+pre-labeling job is turned into a training job if training is requested,
+since every successful training run pre-labels afterwards anyway.
+"""
+import argparse
+import logging
+import sys
+import threading
+import time
+
+import annotation_store
+import db
+import migrations
+import perf
+import prelabeling
+from model_store import format_version, get_current_version, load_model_artifact, save_model_artifact
+from training import TrainingCancelled, train_classifier
+
+MAX_CONCURRENT_JOBS = 1
+WORKER_POLL_SECONDS = 2.0
+# Pause after an unexpected worker error (e.g. "database is locked") before polling again
+WORKER_ERROR_BACKOFF_SECONDS = 5.0
+STALE_JOB_SECONDS = 600
+# Annotations modified this close to a training run's read are processed again by the next incremental run
+WATERMARK_MARGIN_SECONDS = 5
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+PRELABEL = "prelabel"
+INCREMENTAL = "incremental"
+FULL = "full"
+TRAINING_MODES = (INCREMENTAL, FULL)
+# A queued job is upgraded to a requested mode that does more work
+_MODE_RANK = {PRELABEL: 0, INCREMENTAL: 1, FULL: 2}
+
+JOB_COLUMNS = (
+    "id", "workspace_name", "user_email", "status", "progress", "message", "model_version",
+    "cancel_requested", "created_at", "started_at", "finished_at", "mode",
+)
+_SELECT_JOB = f"SELECT {', '.join(JOB_COLUMNS)} FROM training_jobs"
+
+logger = logging.getLogger(__name__)
+
+def _job(row):
+    return dict(zip(JOB_COLUMNS, row)) if row else None
+
+# ==============================
+# QUEUE OPERATIONS
+# ==============================
+
+def enqueue_job(workspace_name, user_email, mode=INCREMENTAL, model_version=None):
+    """
+    Queues a training (or pre-labeling) run for the workspace and returns the job id (an already open job is
+    reused, except that a running pre-labeling job does not stand in for a training request).
+    model_version records the version a pre-labeling job is meant for until the job stores the one it used.
+    """
+    with db.transaction() as conn:
+        existing = conn.execute(
+            "SELECT id, status, mode FROM training_jobs WHERE workspace_name=? AND status IN (?, ?) ORDER BY id DESC LIMIT 1",
+            (workspace_name, *ACTIVE_STATUSES)
+        ).fetchone()
+        if existing and not (existing[1] == RUNNING and existing[2] == PRELABEL and mode != PRELABEL):
+            if existing[1] == QUEUED and _MODE_RANK[mode] > _MODE_RANK.get(existing[2], 0):
+                # Upgrade the still-queued job rather than queueing a second run
+                conn.execute("UPDATE training_jobs SET mode=? WHERE id=? AND status=?", (mode, existing[0], QUEUED))
+            return existing[0]
+        job_id = conn.execute(
+            "INSERT INTO training_jobs (workspace_name, user_email, mode, model_version) VALUES (?, ?, ?, ?)",
+            (workspace_name, user_email, mode, model_version)
+        ).lastrowid
+    _job_available.set()
+    return job_id
+
+def get_job(job_id):
+    return _job(db.fetch_one(f"{_SELECT_JOB} WHERE id=?", (job_id,)))
+
+def get_latest_job(workspace_name, modes=TRAINING_MODES):
+    """Returns the workspace's most recent job of the given modes (training runs by default) as a dict, or None."""
+    return _job(db.fetch_one(
+        f"{_SELECT_JOB} WHERE workspace_name=? AND mode IN ({', '.join('?' * len(modes))}) ORDER BY id DESC LIMIT 1",
+        (workspace_name, *modes)
+    ))
+
+def request_cancel(job_id):
+    """Cancels a queued job immediately; a running job stops at its next progress update."""
+    with db.transaction() as conn:
+        conn.execute(
+            "UPDATE training_jobs SET status=?, finished_at=CURRENT_TIMESTAMP WHERE id=? AND status=?",
+            (CANCELLED, job_id, QUEUED)
+        )
+        conn.execute("UPDATE training_jobs SET cancel_requested=1 WHERE id=? AND status=?", (job_id, RUNNING))
+
+def claim_next_job():
+    """Marks the oldest queued job as running and returns it, or None if the queue is empty."""
+    with db.transaction() as conn:
+        # Jobs whose worker stopped sending heartbeats go back to the queue
+        conn.execute(
+            "UPDATE training_jobs SET status=? WHERE status=? AND heartbeat_at < datetime('now', ?)",
+            (QUEUED, RUNNING, f"-{STALE_JOB_SECONDS} seconds")
+        )
+        row = conn.execute(
+            "SELECT id FROM training_jobs WHERE status=? ORDER BY id LIMIT 1", (QUEUED,)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            """UPDATE training_jobs SET status=?, progress=0, started_at=CURRENT_TIMESTAMP,
+               heartbeat_at=CURRENT_TIMESTAMP WHERE id=?""",
+            (RUNNING, row[0])
+        )
+    return get_job(row[0])
+
+def _finish_job(job_id, status, message, model_version=None):
+    logger.log(logging.WARNING if status == FAILED else logging.INFO, "Job #%d %s: %s", job_id, status, message)
+    db.execute(
+        """UPDATE training_jobs SET status=?, message=?, model_version=COALESCE(?, model_version), progress=COALESCE(?, progress),
+           finished_at=CURRENT_TIMESTAMP WHERE id=?""",
+        (status, message, model_version, 1.0 if status == SUCCEEDED else None, job_id)
+    )
+
+# ==============================
+# RUNNING JOBS
+# ==============================
+
+def load_training_examples(workspace_name, user_email, modified_since=None):
+    """Returns (sentences, intents) for the annotator's labeled examples, optionally only recently modified ones."""
+    sql = """SELECT sentence, intent FROM annotations
+             WHERE workspace_name=? AND user_email=? AND sentence IS NOT NULL AND intent IS NOT NULL AND intent<>''"""
+    params = (workspace_name, user_email)
+    if modified_since is not None:
+        sql += " AND last_modified>=?"
+        params += (modified_since,)
+    rows = db.fetch_all(sql, params)
+    return [row[0] for row in rows], [row[1] for row in rows]
+
+def update_incrementally(workspace_name, user_email):
+    """
+    Applies annotations changed since the current model was trained to a private copy of it.
+    Returns (model, changed_count), or (None, reason) when a full retrain is needed
+    (reason is None for a workspace without a model).
+    """
+    conn = db.get_connection()
+    version_number = get_current_version(conn, workspace_name)
+    if version_number is None:
+        return None, None
+    # Loaded straight from the database: the cached copy is shared with predictions and must not change
+    model = load_model_artifact(conn, workspace_name, version_number)
+    if model is None or not model.supports_partial_fit or not model.trained_through:
+        return None, "the current model predates incremental training"
+
+    label_counts = annotation_store.get_label_counts(workspace_name, user_email)
+    label_counts.pop("", None)
+    if set(label_counts) != set(model.labels):
+        return None, "the set of intents changed"
+
+    texts, labels = load_training_examples(workspace_name, user_email, modified_since=model.trained_through)
+    try:
+        changed = model.partial_fit(texts, labels)
+    except ValueError as e:
+        return None, str(e)
+    # Deleted annotations never show up as modified, but the per-intent counters reveal them
+    if any(model.class_counts[i] != label_counts[label] for i, label in enumerate(model.labels)):
+        return None, "annotations were removed"
+    return model, changed
+
+@perf.timed("training_job")
+def run_job(job):
+    """Trains and saves the model for one claimed job, recording the outcome on the job row."""
+    job_id = job["id"]
+    cancel_event = threading.Event()
+
+    def report_progress(done, total):
+        # Doubles as the heartbeat and the cancellation check
+        db.execute(
+            "UPDATE training_jobs SET progress=?, heartbeat_at=CURRENT_TIMESTAMP WHERE id=?",
+            (done / total, job_id)
+        )
+        if db.fetch_value("SELECT cancel_requested FROM training_jobs WHERE id=?", (job_id,)):
+            cancel_event.set()
+
+    workspace_name, user_email = job["workspace_name"], job["user_email"]
+    logger.info("Job #%d (%s) started for workspace %r", job_id, job["mode"], workspace_name)
+    if job["mode"] == PRELABEL:
+        try:
+            version_number = prelabeling.refresh_workspace_prelabels(workspace_name, user_email, progress=report_progress)
+        except Exception as e:
+            _finish_job(job_id, FAILED, f"{type(e).__name__}: {e}")
+        else:
+            _finish_job(job_id, SUCCEEDED, "Pre-labeled the current dataset.", format_version(version_number) if version_number else None)
+        return
+
+    try:
+        start = time.perf_counter()
+        # Everything modified after this point is picked up again by the next incremental run
+        watermark = db.fetch_value("SELECT datetime('now', ?)", (f"-{WATERMARK_MARGIN_SECONDS} seconds",))
+        model, fallback_reason = None, None
+        if job["mode"] == INCREMENTAL:
+            model, result = update_incrementally(workspace_name, user_email)
+            if model is None:
+                fallback_reason = result
+            elif result == 0:
+                version = format_version(get_current_version(db.get_connection(), workspace_name))
+                _finish_job(job_id, SUCCEEDED, "No annotations changed since the last training run.", version)
+                return
+            else:
+                report_progress(1, 1)
+                message = f"Updated incrementally with {result} changed examples"
+
+        if model is None:
+            texts, labels = load_training_examples(workspace_name, user_email)
+            if not texts:
+                _finish_job(job_id, FAILED, "No labeled annotations found for this workspace.")
+                return
+            model = train_classifier(texts, labels, progress=report_progress, cancel_event=cancel_event)
+            message = f"Trained on {len(texts)} examples"
+            if fallback_reason:
+                message += f" (full retrain: {fallback_reason})"
+
+        model.trained_through = watermark
+        model_version = save_model_artifact(workspace_name, model)
+        elapsed = time.perf_counter() - start
+    except TrainingCancelled:
+        _finish_job(job_id, CANCELLED, "Training was cancelled.")
+    except Exception as e:
+        _finish_job(job_id, FAILED, f"{type(e).__name__}: {e}")
+    else:
+        _finish_job(job_id, SUCCEEDED, f"{message}, {len(model.labels)} intents, in {elapsed:.2f}s.", model_version)
+        try:
+            # Suggestions for the annotation queue; the annotation page queues a pre-labeling job if this fails
+            prelabeling.refresh_workspace_prelabels(workspace_name, user_email)
+        except Exception:
+            logger.exception("Pre-labeling failed for workspace %r", workspace_name)
+
+def work(stop_event=None):
+    """
+    Worker loop: runs queued jobs until stop_event is set.
+    Errors outside a job's own handling are logged and retried after a pause, so the worker never exits early;
+    a job left running by such an error is requeued once its heartbeat goes stale.
+    """
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        try:
+            job = claim_next_job()
+            if job is None:
+                # Woken early by enqueue_job in this process; the timeout picks up jobs queued by other processes
+                _job_available.wait(WORKER_POLL_SECONDS)
+                _job_available.clear()
+                continue
+            run_job(job)
+        except Exception:
+            logger.exception("Training worker error; retrying in %.0fs", WORKER_ERROR_BACKOFF_SECONDS)
+            stop_event.wait(WORKER_ERROR_BACKOFF_SECONDS)
+
+_job_available = threading.Event()
+_started_paths = set()
+_start_lock = threading.Lock()
+
+def start_workers(count=MAX_CONCURRENT_JOBS):
+    """Starts the background worker threads once per process for the configured database."""
+    if db.DB_PATH in _started_paths:
+        return
+    with _start_lock:
+        if db.DB_PATH in _started_paths:
+            return
+        for i in range(count):
+            threading.Thread(target=work, name=f"training-worker-{i}", daemon=True).start()
+        _started_paths.add(db.DB_PATH)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run BuddyBot training workers in the foreground.")
+    parser.add_argument("--db", default="users.db", help="Path to the BuddyBot database")
+    parser.add_argument("--workers", type=int, default=MAX_CONCURRENT_JOBS, help="Jobs to run concurrently")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    db.configure(args.db)
+    migrations.ensure_schema()
+    logger.info("Training workers running on %s (%d concurrent). Ctrl+C to stop.", args.db, args.workers)
+    threads = [threading.Thread(target=work, daemon=True) for _ in range(args.workers)]
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        return 0
+
+if __name__ == "__main__":
+    sys.exit(main())